@@ -5,6 +5,15 @@ from rest_framework.serializers import Serializer, CharField
 
 import google.generativeai as genai
 import os
+import time
+
+
+def time_left(request):
+    """Seconds until the X-Request-Deadline (Unix time) set by the gateway, or None"""
+    try:
+        return float(request.META["HTTP_X_REQUEST_DEADLINE"]) - time.time()
+    except (KeyError, ValueError):
+        return None
 
 # Serializer for input validation
 class AIGenerationSerializer(Serializer):
@@ -54,8 +63,18 @@ Use appropriate HTML5 tags like <article>, <section>, <h1>-<h6>, <p>, <ul>, <ol>
             # Create the model
             model = genai.GenerativeModel('gemini-1.5-flash')
 
+            # Don't start a Gemini call the caller has already given up on,
+            # and don't let it outlive the caller's deadline
+            remaining = time_left(request)
+            if remaining is not None and remaining <= 0:
+                return Response(
+                    {"error": "Request deadline exceeded"},
+                    status=status.HTTP_504_GATEWAY_TIMEOUT
+                )
+            request_options = {"timeout": remaining} if remaining is not None else None
+
             # Generate content
-            response = model.generate_content(prompt)
+            response = model.generate_content(prompt, request_options=request_options)
 
             # Extract HTML from response
             html_output = response.text.strip()
@@ -0,0 +1,162 @@
+"""
+Per-service admission control (concurrency limits and load shedding).
+
+Each service may have at most `limit` upstream calls in flight. Further calls
+wait in a bounded FIFO queue. Once the queue is full, or a call has waited
+longer than `queue_timeout`, the gateway answers 503 at once. A burst of slow
+AI calls then fills the AI queue instead of every gateway connection, and
+auth and content calls keep flowing.
+
+The limit is fixed by default. Two adaptive modes move it with observed latency:
+
+- aimd: add about one per `limit` fast successes, and cut by `backoff`
+  on a failure or a call slower than `latency_target`.
+- gradient: scale the limit by long-term latency / recent latency, so it
+  shrinks as soon as queueing inside the backend makes calls slower, plus
+  headroom of sqrt(limit) to probe for more capacity.
+"""
+import asyncio
+import math
+import os
+from collections import deque
+
+
+# Defaults - override globally with GATEWAY_ADMISSION_* or per service with
+# GATEWAY_ADMISSION_<SERVICE>_* (e.g. GATEWAY_ADMISSION_AI_LIMIT=10)
+ADMISSION_MODE = os.getenv("GATEWAY_ADMISSION_MODE", "fixed")  # fixed, aimd or gradient
+ADMISSION_LIMIT = int(os.getenv("GATEWAY_ADMISSION_LIMIT", "64"))
+ADMISSION_MIN_LIMIT = int(os.getenv("GATEWAY_ADMISSION_MIN_LIMIT", "2"))
+ADMISSION_MAX_LIMIT = int(os.getenv("GATEWAY_ADMISSION_MAX_LIMIT", "256"))
+ADMISSION_QUEUE = int(os.getenv("GATEWAY_ADMISSION_QUEUE", "128"))
+ADMISSION_QUEUE_TIMEOUT = float(os.getenv("GATEWAY_ADMISSION_QUEUE_TIMEOUT", "10"))  # seconds
+ADMISSION_LATENCY_TARGET = float(os.getenv("GATEWAY_ADMISSION_LATENCY_TARGET", "5"))  # seconds, aimd only
+
+
+def admission_for(service: str) -> "AdmissionController":
+    """Build a service's admission controller from the environment"""
+    prefix = f"GATEWAY_ADMISSION_{service.upper()}_"
+    return AdmissionController(
+        service,
+        limit=int(os.getenv(prefix + "LIMIT", ADMISSION_LIMIT)),
+        max_queue=int(os.getenv(prefix + "QUEUE", ADMISSION_QUEUE)),
+        queue_timeout=float(os.getenv(prefix + "QUEUE_TIMEOUT", ADMISSION_QUEUE_TIMEOUT)),
+        mode=os.getenv(prefix + "MODE", ADMISSION_MODE),
+        min_limit=int(os.getenv(prefix + "MIN_LIMIT", ADMISSION_MIN_LIMIT)),
+        max_limit=int(os.getenv(prefix + "MAX_LIMIT", ADMISSION_MAX_LIMIT)),
+        latency_target=float(os.getenv(prefix + "LATENCY_TARGET", ADMISSION_LATENCY_TARGET)),
+    )
+
+
+class AdmissionController:
+    def __init__(self, name: str, limit: int = 64, max_queue: int = 128, queue_timeout: float = 10.0,
+                 mode: str = "fixed", min_limit: int = 2, max_limit: int = 256,
+                 latency_target: float = 5.0, backoff: float = 0.9, smoothing: float = 0.2):
+        if mode not in ("fixed", "aimd", "gradient"):
+            raise ValueError(f"Unknown admission mode {mode!r}")
+        self.name = name
+        self.mode = mode
+        self.limit = float(limit)
+        self.min_limit = min_limit
+        self.max_limit = max(max_limit, limit) if mode != "fixed" else limit
+        self.max_queue = max_queue
+        self.queue_timeout = queue_timeout
+        self.latency_target = latency_target
+        self.backoff = backoff
+        self.smoothing = smoothing
+
+        self.in_flight = 0
+        self.waiters = deque()
+        self.short_latency = None  # seconds, recent calls
+        self.long_latency = None   # seconds, long-term baseline (gradient mode)
+
+        self.admitted = 0
+        self.queued = 0
+        self.shed = 0
+        self.timed_out = 0
+
+    async def acquire(self) -> bool:
+        """Take a slot, waiting in the queue if needed. False means shed the call."""
+        if self.in_flight < int(self.limit) and not self.waiters:
+            self.in_flight += 1
+            self.admitted += 1
+            return True
+        if len(self.waiters) >= self.max_queue:
+            self.shed += 1
+            return False
+
+        waiter = asyncio.get_running_loop().create_future()
+        self.waiters.append(waiter)
+        self.queued += 1
+        try:
+            await asyncio.wait_for(waiter, self.queue_timeout)
+        except (asyncio.TimeoutError, asyncio.CancelledError) as e:
+            if waiter.done() and not waiter.cancelled():
+                # Handed a slot just as we gave up - pass it on
+                self.release()
+            elif waiter in self.waiters:
+                self.waiters.remove(waiter)
+            if isinstance(e, asyncio.CancelledError):
+                raise
+            self.timed_out += 1
+            return False
+        self.admitted += 1
+        return True
+
+    def release(self, latency: float = None, ok: bool = True):
+        """Give back a slot taken with acquire(), reporting the call's latency"""
+        self.in_flight -= 1
+        if latency is not None:
+            self._observe(latency, ok)
+        # Slots are handed to waiters directly, so new arrivals cannot jump the queue
+        while self.waiters and self.in_flight < int(self.limit):
+            waiter = self.waiters.popleft()
+            if not waiter.done():
+                self.in_flight += 1
+                waiter.set_result(None)
+
+    def _observe(self, latency: float, ok: bool):
+        self.short_latency = latency if self.short_latency is None else 0.9 * self.short_latency + 0.1 * latency
+        if self.mode == "fixed":
+            return
+
+        if self.mode == "aimd":
+            if not ok or latency > self.latency_target:
+                limit = self.limit * self.backoff
+            else:
+                limit = self.limit + 1.0 / self.limit
+        else:
+            if self.long_latency is None:
+                self.long_latency = latency
+            self.long_latency = 0.99 * self.long_latency + 0.01 * latency
+            if self.long_latency > 2 * self.short_latency:
+                # Load dropped off - let the baseline catch up quickly
+                self.long_latency *= 0.95
+            gradient = max(0.5, min(1.0, self.long_latency / self.short_latency))
+            if not ok:
+                gradient = 0.5
+            new_limit = self.limit * gradient + math.sqrt(self.limit)
+            limit = (1 - self.smoothing) * self.limit + self.smoothing * new_limit
+
+        if limit > self.limit and self.in_flight * 2 < self.limit:
+            # Only grow while the current limit is actually being used
+            return
+        self.limit = max(self.min_limit, min(self.max_limit, limit))
+
+    def retry_after(self) -> float:
+        """Rough seconds until the queue has drained enough to admit a new call"""
+        latency = self.short_latency or 1.0
+        return (len(self.waiters) + 1) * latency / max(1, int(self.limit))
+
+    def stats(self) -> dict:
+        return {
+            "mode": self.mode,
+            "limit": int(self.limit),
+            "in_flight": self.in_flight,
+            "queue_length": len(self.waiters),
+            "max_queue": self.max_queue,
+            "admitted": self.admitted,
+            "queued": self.queued,
+            "shed": self.shed,
+            "timed_out": self.timed_out,
+            "latency": round(self.short_latency, 4) if self.short_latency is not None else None,
+        }
@@ -0,0 +1,159 @@
+"""
+Batched sub-requests for the gateway's /api/batch endpoint.
+
+The client posts several API calls in one request:
+
+    {"requests": [
+        {"id": "profile", "method": "GET", "path": "/api/auth/profile/"},
+        {"id": "mine", "method": "GET", "path": "/api/content/my-content/?page=1"},
+        {"id": "new", "method": "POST", "path": "/api/content/items/", "body": {"title": "x"}}
+    ]}
+
+Each item becomes a Request that shares the batch's authenticated user and
+headers. It then goes through the normal proxy path, and the results come
+back in order with a status for each item:
+
+    {"responses": [{"id": "profile", "status": 200, "headers": {...}, "body": {...}}, ...]}
+
+Every item is charged to the caller's rate limits like a request of its own.
+Item bodies are read whole, so event streams are refused, and other bodies
+are cut off past a size and time limit instead of holding the batch open.
+"""
+import asyncio
+import json
+
+from fastapi import Request, Response
+
+from streaming import RelayResponse, is_event_stream
+
+
+BATCH_METHODS = frozenset({"GET", "POST", "PUT", "PATCH", "DELETE"})
+
+# Batch headers that describe the batch body itself, not the sub-requests
+SKIPPED_HEADERS = frozenset({"host", "content-length", "content-type", "transfer-encoding", "accept-encoding"})
+
+
+class BatchError(ValueError):
+    """The batch payload is malformed"""
+
+
+class ItemTooLarge(Exception):
+    """An item's response body passed the batch's per-item limit"""
+
+
+class BatchItem:
+    __slots__ = ("id", "method", "path", "query_string", "headers", "body")
+
+    def __init__(self, id, method: str, path: str, query_string: bytes, headers: dict, body: bytes):
+        self.id = id
+        self.method = method
+        self.path = path
+        self.query_string = query_string
+        self.headers = headers
+        self.body = body
+
+
+def parse_batch(payload, max_items: int) -> list:
+    """Validate a batch payload and return its BatchItems"""
+    requests = payload.get("requests") if isinstance(payload, dict) else None
+    if not isinstance(requests, list) or not requests:
+        raise BatchError("Expected {\"requests\": [...]} with at least one request.")
+    if len(requests) > max_items:
+        raise BatchError(f"Batch too large. Maximum is {max_items} requests.")
+
+    items = []
+    for index, entry in enumerate(requests):
+        if not isinstance(entry, dict) or not isinstance(entry.get("path"), str):
+            raise BatchError(f"Request {index} needs a 'path'.")
+        method = str(entry.get("method", "GET")).upper()
+        if method not in BATCH_METHODS:
+            raise BatchError(f"Request {index}: method {method} is not allowed in a batch.")
+        path, _, query = entry["path"].partition("?")
+        if not path.startswith("/api/") or path.rstrip("/") == "/api/batch":
+            raise BatchError(f"Request {index}: path must be an /api/ route other than /api/batch.")
+        headers = entry.get("headers") or {}
+        if not isinstance(headers, dict):
+            raise BatchError(f"Request {index}: 'headers' must be an object.")
+
+        headers = {str(key).lower(): str(value) for key, value in headers.items()}
+        body = b""
+        if entry.get("body") is not None:
+            body = json.dumps(entry["body"]).encode()
+            headers.setdefault("content-type", "application/json")
+        items.append(BatchItem(entry.get("id", index), method, path, query.encode(), headers, body))
+    return items
+
+
+def sub_request(batch: Request, item: BatchItem) -> Request:
+    """A Request for one batch item, with the batch's user and headers"""
+    headers = {key: value for key, value in batch.headers.items() if key not in SKIPPED_HEADERS}
+    headers.update(item.headers)
+    if item.body:
+        headers["content-length"] = str(len(item.body))
+
+    scope = dict(batch.scope)
+    scope.update(
+        method=item.method,
+        path=item.path,
+        raw_path=item.path.encode(),
+        query_string=item.query_string,
+        headers=[(key.encode("latin-1"), value.encode("latin-1")) for key, value in headers.items()],
+        # Each item records its own upstream timing, so state is per item
+        state={"user": batch.state.user} if hasattr(batch.state, "user") else {},
+    )
+
+    sent = False
+
+    async def receive():
+        # The item's body first, then the batch connection, so a client
+        # disconnect reaches every item
+        nonlocal sent
+        if sent:
+            return await batch.receive()
+        sent = True
+        return {"type": "http.request", "body": item.body, "more_body": False}
+
+    return Request(scope, receive)
+
+
+async def read_response(response: Response, max_bytes: int) -> bytes:
+    """The full body of a response, draining streaming responses, up to max_bytes"""
+    if hasattr(response, "body_iterator"):
+        chunks = []
+        received = 0
+        try:
+            async for chunk in response.body_iterator:
+                chunk = chunk if isinstance(chunk, bytes) else chunk.encode()
+                received += len(chunk)
+                if received > max_bytes:
+                    raise ItemTooLarge()
+                chunks.append(chunk)
+        finally:
+            if isinstance(response, RelayResponse):
+                await response.close()
+        return b"".join(chunks)
+    return response.body
+
+
+def error_result(item: BatchItem, status: int, detail: str) -> dict:
+    return {"id": item.id, "status": status, "headers": {}, "body": {"detail": detail}}
+
+
+async def item_result(item: BatchItem, response: Response, max_bytes: int, timeout: float) -> dict:
+    """Per-item entry of the batch response, reading at most max_bytes for at most timeout seconds"""
+    if is_event_stream(response.headers):
+        if isinstance(response, RelayResponse):
+            await response.close()
+        return error_result(item, 400, "Event streams cannot be batched. Call the endpoint directly.")
+    try:
+        body = await asyncio.wait_for(read_response(response, max_bytes), timeout)
+    except ItemTooLarge:
+        return error_result(item, 502, f"Response larger than {max_bytes} bytes cannot be batched.")
+    except asyncio.TimeoutError:
+        return error_result(item, 504, f"Response not complete within {timeout:g} seconds.")
+    headers = {key: value for key, value in response.headers.items() if key != "content-length"}
+    try:
+        decoded = json.loads(body) if body else None
+    except ValueError:
+        decoded = body.decode(errors="replace")
+    return {"id": item.id, "status": response.status_code, "headers": headers, "body": decoded}
@@ -0,0 +1,107 @@
+"""
+Per-service circuit breakers for the gateway proxy.
+
+A breaker watches the outcome and latency of the last `window` calls to its
+service. Once enough of them fail (errors, 5xx responses or calls slower than
+`slow_call` seconds) it opens, and calls are rejected immediately instead of
+waiting on a backend that is hanging. After `open_seconds` it lets a few
+trial calls through (half-open). If they succeed the breaker closes again,
+and the first failure re-opens it.
+"""
+import time
+from collections import deque
+from datetime import datetime
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+
+class CircuitBreaker:
+    def __init__(self, name: str, failure_rate: float = 0.5, min_calls: int = 10,
+                 window: int = 20, slow_call: float = 10.0, open_seconds: float = 15.0,
+                 half_open_calls: int = 3):
+        self.name = name
+        self.failure_rate = failure_rate
+        self.min_calls = min_calls
+        self.slow_call = slow_call
+        self.open_seconds = open_seconds
+        self.half_open_calls = half_open_calls
+
+        self.state = CLOSED
+        self.outcomes = deque(maxlen=window)  # True for a failed or slow call
+        self.opened_at = 0.0
+        self.trials = 0      # half-open calls in flight
+        self.successes = 0   # successful half-open calls
+        self.rejected = 0
+        self.transitions = deque(maxlen=20)
+        self.transition_counts = {}
+
+    def allow(self) -> bool:
+        """Whether a call may go to the backend right now"""
+        if self.state == CLOSED:
+            return True
+        if self.state == OPEN:
+            if time.monotonic() - self.opened_at < self.open_seconds:
+                self.rejected += 1
+                return False
+            self._transition(HALF_OPEN)
+        if self.trials >= self.half_open_calls:
+            self.rejected += 1
+            return False
+        self.trials += 1
+        return True
+
+    def record(self, ok: bool, latency: float):
+        """Report the outcome of a call that allow() let through"""
+        failed = not ok or latency >= self.slow_call
+
+        if self.state == HALF_OPEN:
+            self.trials = max(0, self.trials - 1)
+            if failed:
+                self._open()
+                return
+            self.successes += 1
+            if self.successes >= self.half_open_calls:
+                self._transition(CLOSED)
+            return
+
+        if self.state == OPEN:
+            # A call that started before the breaker opened
+            return
+
+        self.outcomes.append(failed)
+        if len(self.outcomes) >= self.min_calls:
+            if sum(self.outcomes) / len(self.outcomes) >= self.failure_rate:
+                self._open()
+
+    def abandon(self):
+        """A call that allow() let through ended without an outcome (the client went away)"""
+        if self.state == HALF_OPEN:
+            self.trials = max(0, self.trials - 1)
+
+    def retry_after(self) -> float:
+        return max(0.0, self.open_seconds - (time.monotonic() - self.opened_at))
+
+    def _open(self):
+        self.opened_at = time.monotonic()
+        self._transition(OPEN)
+
+    def _transition(self, state: str):
+        key = f"{self.state}->{state}"
+        self.transition_counts[key] = self.transition_counts.get(key, 0) + 1
+        self.transitions.append({"from": self.state, "to": state, "at": datetime.now().isoformat()})
+        self.state = state
+        self.outcomes.clear()
+        self.trials = 0
+        self.successes = 0
+
+    def stats(self) -> dict:
+        return {
+            "state": self.state,
+            "failure_rate": round(sum(self.outcomes) / len(self.outcomes), 2) if self.outcomes else 0.0,
+            "calls_in_window": len(self.outcomes),
+            "rejected": self.rejected,
+            "transition_counts": dict(self.transition_counts),
+            "recent_transitions": list(self.transitions),
+        }
@@ -0,0 +1,259 @@
+"""
+Negotiated response compression for the gateway.
+
+Large text responses (extracted PDF text, generated HTML, JSON lists) are
+compressed with the best encoding the client accepts: zstd, br or gzip,
+where the optional `zstandard` and `brotli` packages decide what is
+available. Compression streams: each body chunk is compressed and flushed as
+it passes, so nothing is buffered and streamed responses keep flowing.
+
+Responses are left alone when they are small, not text-like, already
+encoded by the backend (passed through untouched, never decoded and
+re-encoded), event streams, or marked Cache-Control: no-transform. A body
+the backend encoded for one client but shared with another (cached or
+coalesced) is decoded by for_client() only if that client cannot take it.
+"""
+import zlib
+
+from starlette.datastructures import Headers, MutableHeaders
+from starlette.responses import Response
+
+try:
+    import brotli
+except ImportError:  # optional: pip install brotli
+    brotli = None
+
+try:
+    import zstandard
+except ImportError:  # optional: pip install zstandard
+    zstandard = None
+
+
+COMPRESSIBLE_TYPES = ("text/", "application/json", "application/javascript", "application/xml",
+                      "application/x-ndjson", "image/svg+xml")
+COMPRESSIBLE_SUFFIXES = ("+json", "+xml")
+
+
+class GzipEncoder:
+    def __init__(self, level: int = 5):
+        self.compressor = zlib.compressobj(level, zlib.DEFLATED, 31)  # 31 = gzip container
+
+    def chunk(self, data: bytes) -> bytes:
+        return self.compressor.compress(data) + self.compressor.flush(zlib.Z_SYNC_FLUSH)
+
+    def last(self, data: bytes) -> bytes:
+        return self.compressor.compress(data) + self.compressor.flush()
+
+
+class BrotliEncoder:
+    def __init__(self, level: int = 4):
+        self.compressor = brotli.Compressor(quality=level)
+
+    def chunk(self, data: bytes) -> bytes:
+        return self.compressor.process(data) + self.compressor.flush()
+
+    def last(self, data: bytes) -> bytes:
+        return self.compressor.process(data) + self.compressor.finish()
+
+
+class ZstdEncoder:
+    def __init__(self, level: int = 3):
+        self.compressor = zstandard.ZstdCompressor(level=level).compressobj()
+
+    def chunk(self, data: bytes) -> bytes:
+        return self.compressor.compress(data) + self.compressor.flush(zstandard.COMPRESSOBJ_FLUSH_BLOCK)
+
+    def last(self, data: bytes) -> bytes:
+        return self.compressor.compress(data) + self.compressor.flush()
+
+
+ENCODERS = {"gzip": GzipEncoder}
+if brotli is not None:
+    ENCODERS["br"] = BrotliEncoder
+if zstandard is not None:
+    ENCODERS["zstd"] = ZstdEncoder
+
+
+def negotiate(accept_encoding: str, preferred: tuple):
+    """The encoding to use for an Accept-Encoding header, or None for identity"""
+    accepted = {}
+    for part in accept_encoding.lower().split(","):
+        name, _, params = part.partition(";")
+        quality = 1.0
+        for param in params.split(";"):
+            key, _, value = param.strip().partition("=")
+            if key == "q":
+                try:
+                    quality = float(value)
+                except ValueError:
+                    quality = 0.0
+        if name.strip():
+            accepted[name.strip()] = quality
+
+    wildcard = accepted.get("*", 0.0)
+    best, best_quality = None, 0.0
+    for encoding in preferred:
+        quality = accepted.get(encoding, wildcard)
+        if quality > best_quality:
+            best, best_quality = encoding, quality
+    return best
+
+
+def accepts(accept_encoding: str, content_encoding: str) -> bool:
+    """Whether a client sending `accept_encoding` can take a body with `content_encoding`"""
+    encodings = [encoding.strip().lower() for encoding in content_encoding.split(",")]
+    return all(
+        encoding == "identity" or negotiate(accept_encoding, (encoding,)) is not None
+        for encoding in encodings
+    )
+
+
+def decode(body: bytes, content_encoding: str) -> bytes:
+    """Undo a content-encoding. Raises ValueError for an encoding that cannot be decoded here."""
+    for encoding in reversed([encoding.strip().lower() for encoding in content_encoding.split(",")]):
+        if encoding in ("gzip", "x-gzip"):
+            body = zlib.decompress(body, 47)  # 47 = gzip or zlib container, detected
+        elif encoding == "deflate":
+            try:
+                body = zlib.decompress(body)
+            except zlib.error:
+                body = zlib.decompress(body, -zlib.MAX_WBITS)  # raw deflate
+        elif encoding == "br" and brotli is not None:
+            body = brotli.decompress(body)
+        elif encoding == "zstd" and zstandard is not None:
+            body = zstandard.ZstdDecompressor().decompressobj().decompress(body)
+        elif encoding != "identity":
+            raise ValueError(f"Cannot decode content-encoding {encoding!r}")
+    return body
+
+
+def for_client(response: Response, accept_encoding: str) -> Response:
+    """A buffered response as is if the client accepts its content-encoding, else decoded"""
+    content_encoding = response.headers.get("content-encoding")
+    if content_encoding is None or accepts(accept_encoding, content_encoding):
+        return response
+    decoded = Response(content=decode(response.body, content_encoding), status_code=response.status_code)
+    decoded.raw_headers = [
+        (key, value) for key, value in response.raw_headers if key not in (b"content-encoding", b"content-length")
+    ] + [(b"content-length", str(len(decoded.body)).encode())]
+    return decoded
+
+
+def is_compressible(status: int, headers: Headers) -> bool:
+    if status < 200 or status in (204, 304):
+        return False
+    if "content-encoding" in headers or "no-transform" in headers.get("cache-control", ""):
+        return False
+    content_type = headers.get("content-type", "").split(";", 1)[0].strip().lower()
+    if content_type == "text/event-stream":
+        return False
+    return content_type.startswith(COMPRESSIBLE_TYPES) or content_type.endswith(COMPRESSIBLE_SUFFIXES)
+
+
+class ResponseCompressor:
+    """
+    Compression settings and counters. `encodings` is the server's order of
+    preference. Encodings whose package is not installed are skipped.
+    """
+
+    def __init__(self, minimum_size: int = 1024, encodings=("zstd", "br", "gzip"), levels: dict = None):
+        self.minimum_size = minimum_size
+        self.encodings = tuple(encoding for encoding in encodings if encoding in ENCODERS)
+        self.levels = levels or {}
+        self.responses = {encoding: 0 for encoding in self.encodings}
+        self.bytes_in = 0
+        self.bytes_out = 0
+
+    def encoder(self, encoding: str):
+        self.responses[encoding] += 1
+        if encoding in self.levels:
+            return ENCODERS[encoding](level=self.levels[encoding])
+        return ENCODERS[encoding]()
+
+    def stats(self) -> dict:
+        return {
+            "encodings": list(self.encodings),
+            "responses": dict(self.responses),
+            "bytes_in": self.bytes_in,
+            "bytes_out": self.bytes_out,
+            "ratio": round(self.bytes_out / self.bytes_in, 3) if self.bytes_in else None,
+        }
+
+
+class CompressionMiddleware:
+    """Raw ASGI middleware compressing response bodies with a ResponseCompressor"""
+
+    def __init__(self, app, compressor: ResponseCompressor):
+        self.app = app
+        self.compressor = compressor
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["method"] == "HEAD":
+            await self.app(scope, receive, send)
+            return
+        compressor = self.compressor
+        encoding = negotiate(Headers(scope=scope).get("accept-encoding", ""), compressor.encodings)
+        if encoding is None:
+            await self.app(scope, receive, send)
+            return
+
+        start = None        # response start, held until the first body chunk
+        encoder = None
+        passthrough = False
+
+        async def send_wrapper(message):
+            nonlocal start, encoder, passthrough
+            if message["type"] == "http.response.start":
+                if is_compressible(message["status"], Headers(raw=message["headers"])):
+                    # The headers are edited below, and they may be a Response's own
+                    # raw_headers list, so work on a copy
+                    start = {**message, "headers": list(message["headers"])}
+                else:
+                    passthrough = True
+                    await send(message)
+                return
+            if passthrough or message["type"] != "http.response.body":
+                await send(message)
+                return
+
+            body = message.get("body", b"")
+            more_body = message.get("more_body", False)
+            if encoder is None:
+                headers = MutableHeaders(raw=start["headers"])
+                declared = headers.get("content-length")
+                if more_body:
+                    small = declared is not None and declared.isdigit() and int(declared) < compressor.minimum_size
+                else:
+                    small = len(body) < compressor.minimum_size
+                if small:
+                    passthrough = True
+                    await send(start)
+                    await send(message)
+                    return
+
+                encoder = compressor.encoder(encoding)
+                headers["content-encoding"] = encoding
+                headers.add_vary_header("accept-encoding")
+                etag = headers.get("etag")
+                if etag and not etag.startswith("W/"):
+                    # A different byte representation of the same entity
+                    headers["etag"] = "W/" + etag
+                if more_body:
+                    del headers["content-length"]
+                else:
+                    # Whole body in one message - compress it in one go
+                    compressed = encoder.last(body)
+                    headers["content-length"] = str(len(compressed))
+                    compressor.bytes_in += len(body)
+                    compressor.bytes_out += len(compressed)
+                    await send(start)
+                    await send({"type": "http.response.body", "body": compressed, "more_body": False})
+                    return
+                await send(start)
+
+            chunk = encoder.chunk(body) if more_body else encoder.last(body)
+            compressor.bytes_in += len(body)
+            compressor.bytes_out += len(chunk)
+            await send({"type": "http.response.body", "body": chunk, "more_body": more_body})
+
+        await self.app(scope, receive, send_wrapper)
@@ -0,0 +1,93 @@
+"""
+Request deadlines and client-disconnect cancellation for the gateway proxy.
+
+Every proxied request carries X-Request-Deadline, the absolute Unix time (in
+seconds) after which nobody is waiting for the answer. Backends check it and
+stop expensive work (Gemini calls, PDF extraction) once it has passed. A
+client may send its own, shorter deadline, and the gateway keeps the
+earlier of the two.
+
+The gateway also watches the client connection while it waits on a backend.
+If the client goes away, the upstream call is cancelled, which closes its
+connection so the backend is not left working for nobody.
+"""
+import asyncio
+import time
+
+from fastapi import Request
+from starlette.requests import ClientDisconnect
+
+DEADLINE_HEADER = "x-request-deadline"
+
+
+class ClientDisconnected(Exception):
+    """The client closed the connection before the response was ready"""
+
+
+def request_deadline(request: Request, timeout: float) -> float:
+    """Unix time by which the request must finish: now + timeout, or the client's earlier deadline"""
+    deadline = time.time() + timeout
+    value = request.headers.get(DEADLINE_HEADER)
+    if value:
+        try:
+            deadline = min(deadline, float(value))
+        except ValueError:
+            pass
+    return deadline
+
+
+def time_left(deadline: float) -> float:
+    return deadline - time.time()
+
+
+class DisconnectWatcher:
+    """
+    Sits between a request and its ASGI receive channel. Once the body has
+    been consumed, it keeps reading the channel so a disconnect is noticed
+    while the request waits on a backend.
+    """
+
+    def __init__(self, request: Request):
+        self._receive = request.receive
+        self.body_done = asyncio.Event()
+        self.request = Request(request.scope, self.receive)
+
+    async def receive(self):
+        message = await self._receive()
+        if message["type"] == "http.disconnect" or not message.get("more_body", False):
+            self.body_done.set()
+        return message
+
+    async def wait(self):
+        """Return once the client has disconnected"""
+        await self.body_done.wait()
+        while (await self._receive())["type"] != "http.disconnect":
+            pass
+
+    async def run(self, awaitable):
+        """
+        Await `awaitable`, cancelling it and raising ClientDisconnected if the
+        client goes away first.
+        """
+        task = asyncio.ensure_future(awaitable)
+        watcher = asyncio.ensure_future(self.wait())
+        try:
+            await asyncio.wait({task, watcher}, return_when=asyncio.FIRST_COMPLETED)
+        except asyncio.CancelledError:
+            task.cancel()
+            raise
+        finally:
+            watcher.cancel()
+
+        if not task.done():
+            task.cancel()
+            try:
+                await task
+            except (asyncio.CancelledError, Exception):
+                pass
+            raise ClientDisconnected()
+        try:
+            return task.result()
+        except ClientDisconnect:
+            # The client went away in the middle of uploading the body
+            raise ClientDisconnected()
@@ -0,0 +1,84 @@
+"""
+Background health probing of the backend services.
+
+Every service instance is probed concurrently on a fixed interval and the
+results are kept in a rolling table. `/health` answers straight from that
+table, and the proxy uses it to skip instances that are down and to fail
+fast for services with no instance left.
+"""
+import asyncio
+import time
+from collections import defaultdict, deque
+from datetime import datetime
+
+import httpx
+
+
+class HealthProber:
+    """Probes every service instance's /health endpoint and keeps a rolling health table"""
+
+    def __init__(self, upstreams, interval: float = 5.0, timeout: float = 2.0,
+                 history: int = 10, down_after: int = 2):
+        self.upstreams = upstreams
+        self.interval = interval
+        self.timeout = timeout
+        self.down_after = down_after  # consecutive failed probes before an instance counts as down
+        self.statuses = {}
+        self.instance_statuses = {}
+        self.history = defaultdict(lambda: deque(maxlen=history))
+        self.failures = defaultdict(int)
+
+    async def probe(self, service: str, instance):
+        started = time.perf_counter()
+        try:
+            response = await self.upstreams.client(service).get(
+                f"{instance.url}/health", timeout=self.timeout
+            )
+            status = {
+                "status": "healthy" if response.status_code < 500 else "unhealthy",
+                "code": response.status_code
+            }
+        except httpx.TimeoutException:
+            status = {"status": "timeout", "code": 504}
+        except Exception as e:
+            status = {"status": "down", "error": str(e)}
+
+        healthy = status["status"] == "healthy"
+        history = self.history[instance.url]
+        history.append(healthy)
+        self.failures[instance.url] = 0 if healthy else self.failures[instance.url] + 1
+        # Feed routing: the proxy stops picking instances known to be down
+        instance.healthy = self.failures[instance.url] < self.down_after
+
+        status["latency_ms"] = round((time.perf_counter() - started) * 1000, 1)
+        status["uptime"] = round(sum(history) / len(history), 2)
+        status["checked_at"] = datetime.now().isoformat()
+        self.instance_statuses[instance.url] = status
+
+    async def probe_all(self):
+        await asyncio.gather(*(
+            self.probe(service, instance)
+            for service, instances in self.upstreams.instances.items()
+            for instance in instances
+        ))
+        for service, instances in self.upstreams.instances.items():
+            statuses = [self.instance_statuses[instance.url] for instance in instances]
+            # A service is as healthy as its best instance
+            best = next((s for s in statuses if s["status"] == "healthy"), statuses[0])
+            status = dict(best)
+            if len(instances) > 1:
+                status["instances"] = {instance.url: s for instance, s in zip(instances, statuses)}
+            self.statuses[service] = status
+
+    async def run(self):
+        """Probe all services every `interval` seconds until cancelled"""
+        while True:
+            await self.probe_all()
+            await asyncio.sleep(self.interval)
+
+    def is_down(self, service: str) -> bool:
+        """True once every instance of a service has failed `down_after` probes in a row"""
+        return all(
+            self.failures[instance.url] >= self.down_after
+            for instance in self.upstreams.instances[service]
+        )
@@ -0,0 +1,65 @@
+"""
+Cache of verified JWT claims for the gateway middleware.
+
+The same bearer token usually arrives many times a minute, so once a token's
+signature has been verified its claims are kept in a bounded LRU keyed by a
+SHA-256 digest of the token. Entries expire at the token's own `exp`, and
+repeat requests skip signature verification entirely.
+"""
+import hashlib
+import time
+from collections import OrderedDict
+
+
+class VerifiedTokenCache:
+    """Bounded LRU of token digest -> (claims, expires_at)"""
+
+    def __init__(self, max_size: int = 10_000, default_ttl: float = 300):
+        self.max_size = max_size
+        self.default_ttl = default_ttl  # for tokens without an exp claim
+        self.entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def digest(token: str) -> bytes:
+        return hashlib.sha256(token.encode()).digest()
+
+    def get(self, token: str):
+        """Claims for a previously verified token, or None"""
+        key = self.digest(token)
+        entry = self.entries.get(key)
+        if entry is None:
+            self.misses += 1
+            return None
+
+        claims, expires_at = entry
+        if expires_at <= time.time():
+            del self.entries[key]
+            self.misses += 1
+            return None
+
+        self.entries.move_to_end(key)
+        self.hits += 1
+        return claims
+
+    def put(self, token: str, claims: dict):
+        """Remember claims for a token whose signature has just been verified"""
+        if self.max_size <= 0:
+            return
+        exp = claims.get("exp")
+        expires_at = float(exp) if isinstance(exp, (int, float)) else time.time() + self.default_ttl
+
+        self.entries[self.digest(token)] = (claims, expires_at)
+        if len(self.entries) > self.max_size:
+            self.entries.popitem(last=False)
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "size": len(self.entries),
+            "max_size": self.max_size,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+        }
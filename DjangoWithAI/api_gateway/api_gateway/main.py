@@ -1,10 +1,13 @@
 from fastapi import FastAPI, Request, HTTPException, Response
-from fastapi.responses import JSONResponse
+from starlette.datastructures import Headers
+from fastapi.responses import JSONResponse, PlainTextResponse, StreamingResponse
 from fastapi.middleware.cors import CORSMiddleware
 import httpx
 from jose import jwt, JWTError
+import asyncio
 import time
-from collections import defaultdict
+from collections.abc import AsyncIterator
+from contextlib import asynccontextmanager
 from datetime import datetime
 import os
 from dotenv import load_dotenv
@@ -12,10 +15,84 @@ from dotenv import load_dotenv
 # Load environment variables
 load_dotenv()
 
+from upstreams import UpstreamPool
+from health import HealthProber
+from breaker import CircuitBreaker
+from admission import admission_for
+from singleflight import SingleFlight
+from response_cache import ResponseCache, etag_matches, parse_cache_routes
+from metrics import Counter, Gauge, MetricsRegistry, RequestMetrics
+from middleware import GatewayMiddleware, PrefixTable, RouteTable
+from jwt_cache import VerifiedTokenCache
+from ratelimit import RateLimit, create_rate_limiter, parse_limit, parse_route_limits
+from compression import CompressionMiddleware, ResponseCompressor, accepts, for_client
+from batch import BatchError, BatchItem, item_result, parse_batch, sub_request
+from deadlines import DEADLINE_HEADER, ClientDisconnected, DisconnectWatcher, request_deadline, time_left
+from retries import IDEMPOTENT_METHODS, RetryBudget, RetryPolicy
+from streaming import (HOP_BY_HOP_HEADERS, BodyTooLarge, RelayResponse, declared_length, has_body, is_event_stream,
+                       is_live_stream, limited_body, parse_route_sizes, parse_size, read_body, response_headers)
+
+# Service URLs - Map service names to backend ports
+SERVICE_URLS = {
+    "auth": "http://127.0.0.1:8001",
+    "pdf": "http://127.0.0.1:8002",
+    "ai": "http://127.0.0.1:8003",
+    "content": "http://127.0.0.1:8004",
+    "db": "http://127.0.0.1:8005"
+}
+
+# Instances per service - scale a service out with a comma-separated list, e.g.
+# GATEWAY_PDF_URLS="http://127.0.0.1:8002,http://127.0.0.1:8012"
+SERVICE_INSTANCES = {
+    service: os.getenv(f"GATEWAY_{service.upper()}_URLS", url).split(",")
+    for service, url in SERVICE_URLS.items()
+}
+# "p2c" (power of two choices) or "least_outstanding"
+LOAD_BALANCING = os.getenv("GATEWAY_LOAD_BALANCING", "p2c")
+
+# Long-lived keep-alive clients, one per backend service
+upstreams = UpstreamPool(SERVICE_INSTANCES, policy=LOAD_BALANCING)
+
+# Background health probing - /health and the proxy read the latest results
+HEALTH_INTERVAL = float(os.getenv("GATEWAY_HEALTH_INTERVAL", "5"))  # seconds
+HEALTH_FAIL_FAST = os.getenv("GATEWAY_HEALTH_FAIL_FAST", "true").lower() == "true"
+health = HealthProber(upstreams, interval=HEALTH_INTERVAL)
+
+# Circuit breakers - open on error rate or slow calls and reject with 503 at once
+breakers = {
+    service: CircuitBreaker(
+        service,
+        failure_rate=float(os.getenv("GATEWAY_BREAKER_FAILURE_RATE", "0.5")),
+        min_calls=int(os.getenv("GATEWAY_BREAKER_MIN_CALLS", "10")),
+        slow_call=float(os.getenv("GATEWAY_BREAKER_SLOW_CALL", "10")),      # seconds
+        open_seconds=float(os.getenv("GATEWAY_BREAKER_OPEN_SECONDS", "15"))
+    )
+    for service in SERVICE_URLS
+}
+
+# Admission control - per-service concurrency limit and bounded wait queue,
+# so slow services shed load alone (see admission.py for the GATEWAY_ADMISSION_* settings)
+admission_controllers = {service: admission_for(service) for service in SERVICE_URLS}
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Open upstream connection pools at startup and close them at shutdown"""
+    await upstreams.start()
+    eviction = asyncio.create_task(rate_limiter.run_eviction(RATE_LIMIT_EVICT_INTERVAL))
+    prober = asyncio.create_task(health.run())
+    yield
+    prober.cancel()
+    eviction.cancel()
+    await rate_limiter.close()
+    await upstreams.close()
+
+
 app = FastAPI(
     title="Microservices API Gateway",
     version="1.0.0",
-    description="Central gateway for microservices platform"
+    description="Central gateway for microservices platform",
+    lifespan=lifespan
 )
 
 # CORS Configuration - Allow frontend to connect
@@ -32,43 +109,120 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-# Service URLs - Map service names to backend ports
-SERVICE_URLS = {
-    "auth": "http://127.0.0.1:8001",
-    "pdf": "http://127.0.0.1:8002",
-    "ai": "http://127.0.0.1:8003",
-    "content": "http://127.0.0.1:8004",
-    "db": "http://127.0.0.1:8005"
-}
-
 # CRITICAL: Must match the SECRET_KEY in all microservices
 SECRET_KEY = os.getenv("JWT_SECRET_KEY", "microservice-shared-secret-key-change-in-production-12345")
 ALGORITHM = "HS256"
 
-# Rate limiting storage (in-memory, use Redis in production)
-rate_limit_storage = defaultdict(list)
-RATE_LIMIT_REQUESTS = 100  # requests per window
-RATE_LIMIT_WINDOW = 60     # seconds
+# Claims of already verified tokens, so repeat requests skip signature checks
+JWT_CACHE_SIZE = int(os.getenv("GATEWAY_JWT_CACHE_SIZE", "10000"))
+jwt_cache = VerifiedTokenCache(max_size=JWT_CACHE_SIZE)
+
+# Rate limiting (GCRA, one float per client)
+RATE_LIMIT_REQUESTS = int(os.getenv("GATEWAY_RATE_LIMIT_REQUESTS", "100"))  # requests per window
+RATE_LIMIT_WINDOW = int(os.getenv("GATEWAY_RATE_LIMIT_WINDOW", "60"))       # seconds
+RATE_LIMIT = RateLimit(RATE_LIMIT_REQUESTS, RATE_LIMIT_WINDOW)
+# Optional per-user and per-route limits, e.g. "300/60" and "/api/ai/=20/60,/api/pdf/=30/60"
+USER_RATE_LIMIT = parse_limit(os.getenv("GATEWAY_USER_RATE_LIMIT", ""))
+ROUTE_RATE_LIMITS = parse_route_limits(os.getenv("GATEWAY_ROUTE_RATE_LIMITS", ""))
+RATE_LIMIT_MAX_CLIENTS = int(os.getenv("GATEWAY_RATE_LIMIT_MAX_CLIENTS", "100000"))
+RATE_LIMIT_EVICT_INTERVAL = 60  # seconds between idle client sweeps
+# "memory" limits each worker separately; "shm" shares limits between workers
+# on this host and "redis" between every gateway host
+RATE_LIMIT_BACKEND = os.getenv("GATEWAY_RATE_LIMIT_BACKEND", "memory")
+RATE_LIMIT_BATCH = int(os.getenv("GATEWAY_RATE_LIMIT_BATCH", "10"))  # most requests reserved per shared lookup
+RATE_LIMIT_SHM_PATH = os.getenv("GATEWAY_RATE_LIMIT_SHM_PATH", "/dev/shm/gateway-ratelimit")
+REDIS_URL = os.getenv("GATEWAY_REDIS_URL", "redis://127.0.0.1:6379/0")
+rate_limiter = create_rate_limiter(
+    RATE_LIMIT_BACKEND,
+    max_clients=RATE_LIMIT_MAX_CLIENTS,
+    batch=RATE_LIMIT_BATCH,
+    shm_path=RATE_LIMIT_SHM_PATH,
+    redis_url=REDIS_URL
+)
 
+# Streaming proxy - pipe bodies through instead of buffering them in memory
+STREAM_PROXY = os.getenv("GATEWAY_STREAM_PROXY", "true").lower() == "true"
+# Seconds of backend silence before an event stream gets a keep-alive comment
+SSE_KEEPALIVE = float(os.getenv("GATEWAY_SSE_KEEPALIVE", "15"))
+MAX_BODY_SIZE = parse_size(os.getenv("GATEWAY_MAX_BODY_SIZE", "50MB"))
+# Tighter per-route body limits, checked before authentication and before any
+# backend is contacted, e.g. GATEWAY_ROUTE_BODY_LIMITS="/api/auth/=64KB,/api/ai/=2MB"
+route_body_limits = PrefixTable(parse_route_sizes(os.getenv("GATEWAY_ROUTE_BODY_LIMITS", "")))
+# Chunked bodies (no Content-Length) are buffered when the route's limit is at
+# most this, and streamed with a cutoff otherwise
+CHUNKED_BUFFER_LIMIT = parse_size(os.getenv("GATEWAY_CHUNKED_BUFFER_LIMIT", "1MB"))
 
-def check_rate_limit(client_id: str) -> bool:
-    """Simple rate limiter - 100 requests per minute per IP"""
-    now = time.time()
-    window_start = now - RATE_LIMIT_WINDOW
-    
-    # Clean old requests
-    rate_limit_storage[client_id] = [
-        req_time for req_time in rate_limit_storage[client_id]
-        if req_time > window_start
-    ]
-    
-    # Check limit
-    if len(rate_limit_storage[client_id]) >= RATE_LIMIT_REQUESTS:
-        return False
-    
-    # Add current request
-    rate_limit_storage[client_id].append(now)
-    return True
+# Retries and hedging for idempotent methods (GET, HEAD, OPTIONS). Attempts
+# include the first one. Retries and hedges share a budget of a fraction of
+# recent requests. Hedging is opt-in per service, e.g. GATEWAY_HEDGE_SERVICES="content,db"
+retry_policy = RetryPolicy(
+    upstreams,
+    attempts=int(os.getenv("GATEWAY_RETRY_ATTEMPTS", "2")),
+    budget=RetryBudget(
+        ratio=float(os.getenv("GATEWAY_RETRY_BUDGET_RATIO", "0.2")),
+        min_per_second=float(os.getenv("GATEWAY_RETRY_MIN_PER_SECOND", "5"))
+    ),
+    backoff=float(os.getenv("GATEWAY_RETRY_BACKOFF", "0.05")),  # seconds, jittered
+    hedge_services=set(filter(None, os.getenv("GATEWAY_HEDGE_SERVICES", "").split(","))),
+    # no retry or hedge with less than this left before the request's deadline
+    min_attempt_time=float(os.getenv("GATEWAY_RETRY_MIN_TIME", "0.1"))
+)
+
+# Request coalescing (opt-in) - concurrent identical GETs from the same user
+# share one upstream call, e.g. GATEWAY_COALESCE_SERVICES="content,db"
+COALESCE_SERVICES = set(filter(None, os.getenv("GATEWAY_COALESCE_SERVICES", "").split(",")))
+coalescer = SingleFlight()
+
+# Response cache (opt-in per route) - prefix=default TTL in seconds, e.g.
+# GATEWAY_CACHE_ROUTES="/api/content/=30,/api/db/=30". Keyed per user.
+response_cache = ResponseCache(
+    parse_cache_routes(os.getenv("GATEWAY_CACHE_ROUTES", "")),
+    max_bytes=int(os.getenv("GATEWAY_CACHE_MAX_BYTES", str(64 * 1024 * 1024)))
+)
+
+# Batched sub-requests on /api/batch - largest number of calls in one batch
+BATCH_MAX_ITEMS = int(os.getenv("GATEWAY_BATCH_MAX_ITEMS", "20"))
+# Largest response body and longest read per item - a streaming endpoint
+# must not hold the whole batch open
+BATCH_ITEM_MAX_BYTES = parse_size(os.getenv("GATEWAY_BATCH_ITEM_MAX_BYTES", "2MB"))
+BATCH_ITEM_TIMEOUT = float(os.getenv("GATEWAY_BATCH_ITEM_TIMEOUT", "30"))  # seconds
+
+# Response compression negotiated from Accept-Encoding - br and zstd need the
+# optional brotli and zstandard packages, gzip is always available
+COMPRESSION = os.getenv("GATEWAY_COMPRESSION", "true").lower() == "true"
+compressor = ResponseCompressor(
+    minimum_size=parse_size(os.getenv("GATEWAY_COMPRESSION_MIN_SIZE", "1KB")),
+    encodings=os.getenv("GATEWAY_COMPRESSION_ENCODINGS", "zstd,br,gzip").split(",")
+)
+
+# Request metrics, exposed in Prometheus text format at /metrics
+metrics = MetricsRegistry()
+request_metrics = RequestMetrics(metrics, [*SERVICE_URLS, "batch"])
+
+# Routes that skip JWT validation, decided by a precompiled table
+route_table = RouteTable(
+    public_paths=["/", "/health", "/docs", "/openapi.json", "/redoc"],
+    public_prefixes=["/api/auth/signup", "/api/auth/login"]
+)
+route_rate_limits = PrefixTable(dict(ROUTE_RATE_LIMITS))
+
+
+def body_limit(path: str) -> int:
+    """Largest request body accepted for a path, in bytes"""
+    route = route_body_limits.match(path)
+    return route[1] if route else MAX_BODY_SIZE
+
+
+def rate_limit_exceeded(retry_after: float) -> JSONResponse:
+    retry_after = max(1, round(retry_after))
+    return JSONResponse(
+        status_code=429,
+        content={
+            "detail": "Rate limit exceeded. Try again later.",
+            "retry_after": retry_after
+        },
+        headers={"Retry-After": str(retry_after)}
+    )
 
 
 @app.get("/")
@@ -82,29 +236,99 @@ def read_root():
             "content": "/api/content/*",
             "pdf": "/api/pdf/*",
             "ai": "/api/ai/*",
-            "db": "/api/db/*"
+            "db": "/api/db/*",
+            "batch": "/api/batch"
         },
         "docs": "/docs"
     }
 
 
+@app.get("/metrics")
+def prometheus_metrics():
+    """Request counters, latency histograms and component state in Prometheus format"""
+    return PlainTextResponse(metrics.render(), media_type="text/plain; version=0.0.4")
+
+
+@metrics.collector
+def collect_component_metrics():
+    """Breaker, pool, cache and limiter state, read at scrape time"""
+    breaker_state = Gauge("gateway_breaker_state", "Circuit breaker state (0 closed, 1 half-open, 2 open)", ("service",))
+    breaker_rejected = Counter("gateway_breaker_rejected_total", "Calls rejected by an open breaker", ("service",))
+    breaker_transitions = Counter("gateway_breaker_transitions_total", "Breaker state changes", ("service", "transition"))
+    for service, breaker in breakers.items():
+        breaker_state.inc(service, amount={"closed": 0, "half_open": 1, "open": 2}[breaker.state])
+        breaker_rejected.inc(service, amount=breaker.rejected)
+        for transition, count in breaker.transition_counts.items():
+            breaker_transitions.inc(service, transition, amount=count)
+    
+    pool_connections = Gauge("gateway_pool_connections", "Upstream pool connections and waiters", ("service", "state"))
+    instance_outstanding = Gauge("gateway_instance_outstanding", "Outstanding requests per instance", ("service", "instance"))
+    instance_ejected = Gauge("gateway_instance_ejected", "1 while an instance is ejected", ("service", "instance"))
+    for service, pool in upstreams.stats().items():
+        for state in ("in_use", "idle", "waiting"):
+            pool_connections.inc(service, state, amount=pool[state])
+        for instance in pool["instances"]:
+            instance_outstanding.inc(service, instance["url"], amount=instance["outstanding"])
+            instance_ejected.inc(service, instance["url"], amount=int(instance["ejected"]))
+    
+    admission_limit = Gauge("gateway_admission_limit", "Current concurrency limit", ("service",))
+    admission_queue = Gauge("gateway_admission_queue_length", "Calls waiting for an admission slot", ("service",))
+    admission_shed = Counter("gateway_admission_shed_total", "Calls answered 503 by admission control", ("service", "reason"))
+    for service, controller in admission_controllers.items():
+        admission_limit.inc(service, amount=int(controller.limit))
+        admission_queue.inc(service, amount=len(controller.waiters))
+        admission_shed.inc(service, "queue_full", amount=controller.shed)
+        admission_shed.inc(service, "queue_timeout", amount=controller.timed_out)
+    
+    retries = Counter("gateway_retries_total", "Retries, hedges and refusals for idempotent calls", ("service", "event"))
+    hedge_delay = Gauge("gateway_hedge_delay_seconds", "Current p95-based hedging delay", ("service",))
+    for service, stats in retry_policy.stats()["services"].items():
+        for event in ("retries", "hedges", "hedge_wins", "budget_exhausted", "out_of_time"):
+            retries.inc(service, event, amount=stats[event])
+        if stats["hedge_delay"] is not None:
+            hedge_delay.inc(service, amount=stats["hedge_delay"])
+    
+    compressed = Counter("gateway_compressed_responses_total", "Responses compressed by the gateway", ("encoding",))
+    for encoding, count in compressor.responses.items():
+        compressed.inc(encoding, amount=count)
+    
+    component = Gauge("gateway_component", "Numeric counters of gateway components", ("component", "stat"))
+    for name, stats in (("rate_limit", rate_limiter.stats()), ("jwt_cache", jwt_cache.stats()),
+                        ("coalescing", coalescer.stats()), ("response_cache", response_cache.stats()),
+                        ("retry_budget", retry_policy.budget.stats()), ("compression", compressor.stats())):
+        for stat, value in stats.items():
+            if isinstance(value, (int, float)) and not isinstance(value, bool):
+                component.inc(name, stat, amount=value)
+    
+    return [breaker_state, breaker_rejected, breaker_transitions, pool_connections,
+            instance_outstanding, instance_ejected, admission_limit, admission_queue, admission_shed,
+            retries, hedge_delay, compressed, component]
+
+
+@app.get("/gateway/stats")
+def gateway_stats():
+    """Gateway internals: connection pools, rate limiter, caches, breakers, retries, admission and compression"""
+    return {
+        "pools": upstreams.stats(),
+        "rate_limit": rate_limiter.stats(),
+        "jwt_cache": jwt_cache.stats(),
+        "breakers": {service: breaker.stats() for service, breaker in breakers.items()},
+        "coalescing": coalescer.stats(),
+        "response_cache": response_cache.stats(),
+        "retries": retry_policy.stats(),
+        "admission": {service: controller.stats() for service, controller in admission_controllers.items()},
+        "compression": compressor.stats(),
+        "timestamp": datetime.now().isoformat()
+    }
+
+
 @app.get("/health")
 async def health_check():
-    """Check health of all services"""
-    statuses = {}
-    
-    async with httpx.AsyncClient(timeout=2.0) as client:
-        for service_name, service_url in SERVICE_URLS.items():
-            try:
-                response = await client.get(f"{service_url}/health")
-                statuses[service_name] = {
-                    "status": "healthy" if response.status_code < 500 else "unhealthy",
-                    "code": response.status_code
-                }
-            except httpx.TimeoutException:
-                statuses[service_name] = {"status": "timeout", "code": 504}
-            except Exception as e:
-                statuses[service_name] = {"status": "down", "error": str(e)}
+    """Health of all services, from the background prober's latest results"""
+    if len(health.statuses) < len(SERVICE_URLS):
+        # First request before the initial probe round has finished
+        await health.probe_all()
+    statuses = health.statuses
     
     all_healthy = all(s.get("status") == "healthy" for s in statuses.values())
     
@@ -116,37 +340,28 @@ async def health_check():
     }
 
 
-# JWT Middleware
-@app.middleware("http")
-async def jwt_and_rate_limit_middleware(request: Request, call_next):
-    """
-    1. Rate limiting
-    2. JWT validation for protected endpoints
-    """
-    path = request.url.path
-    client_ip = request.client.host
-    
-    # Rate limiting
-    if not check_rate_limit(client_ip):
-        return JSONResponse(
-            status_code=429,
-            content={
-                "detail": "Rate limit exceeded. Try again later.",
-                "retry_after": RATE_LIMIT_WINDOW
-            }
-        )
+# Rate limiting, JWT validation and request metrics as raw ASGI middleware.
+# Added after CORS, so it runs first.
+async def check_request(scope):
+    """Rate limit and authenticate a request. Returns an error response, or None to proceed."""
+    path = scope["path"]
+    client_ip = scope["client"][0] if scope.get("client") else "unknown"
     
-    # Skip JWT validation for public endpoints
-    public_paths = ["/", "/health", "/docs", "/openapi.json", "/redoc"]
-    is_auth_endpoint = path.startswith("/api/auth/signup") or path.startswith("/api/auth/login")
+    # Rate limiting per client IP
+    allowed, retry_after = await rate_limiter.hit(f"ip:{client_ip}", RATE_LIMIT)
+    if not allowed:
+        return rate_limit_exceeded(retry_after)
     
-    if path in public_paths or is_auth_endpoint:
-        response = await call_next(request)
-        return response
+    # Refuse bodies that announce themselves as too large before doing any more work
+    headers = Headers(scope=scope)
+    length = declared_length(headers)
+    if length is not None and length > body_limit(path):
+        return body_too_large(body_limit(path))
     
     # JWT validation for protected endpoints
-    if path.startswith("/api/"):
-        auth_header = request.headers.get("Authorization")
+    user = None
+    if route_table.requires_auth(path):
+        auth_header = headers.get("authorization")
         
         if not auth_header or not auth_header.startswith("Bearer "):
             return JSONResponse(
@@ -156,16 +371,124 @@ async def jwt_and_rate_limit_middleware(request: Request, call_next):
         
         try:
             token = auth_header.split(" ")[1]
-            payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
-            request.state.user = payload
+            user = jwt_cache.get(token)
+            if user is None:
+                user = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
+                jwt_cache.put(token, user)
+            # Shows up as request.state.user in the endpoints
+            scope.setdefault("state", {})["user"] = user
         except JWTError as e:
             return JSONResponse(
                 status_code=401,
                 content={"detail": f"Invalid token: {str(e)}"}
             )
     
-    response = await call_next(request)
-    return response
+    # Per-user and per-route limits, keyed by user once authenticated
+    identity = f"user:{user.get('user_id')}" if user else f"ip:{client_ip}"
+    
+    if user and USER_RATE_LIMIT:
+        allowed, retry_after = await rate_limiter.hit(identity, USER_RATE_LIMIT)
+        if not allowed:
+            return rate_limit_exceeded(retry_after)
+    
+    return await check_route_limit(path, identity)
+
+
+async def check_route_limit(path: str, identity: str):
+    """Per-route rate limit for a path. Returns a 429 response, or None to proceed."""
+    route = route_rate_limits.match(path)
+    if route:
+        prefix, limit = route
+        allowed, retry_after = await rate_limiter.hit(f"route:{prefix}:{identity}", limit)
+        if not allowed:
+            return rate_limit_exceeded(retry_after)
+    return None
+
+
+if COMPRESSION:
+    app.add_middleware(CompressionMiddleware, compressor=compressor)
+app.add_middleware(GatewayMiddleware, check=check_request, metrics=request_metrics)
+
+
+# Batch endpoint - several API calls in one round trip, authenticated once
+@app.post("/api/batch")
+async def batch(request: Request):
+    """
+    Run a list of API calls concurrently through the proxy and return every
+    response, each with its own status. The middleware has already checked
+    the JWT once for the whole batch.
+    """
+    try:
+        payload = await request.json()
+    except ValueError as e:
+        return JSONResponse(status_code=400, content={"detail": f"Invalid JSON body: {str(e)}"})
+    try:
+        items = parse_batch(payload, BATCH_MAX_ITEMS)
+    except BatchError as e:
+        return JSONResponse(status_code=400, content={"detail": str(e)})
+    
+    results = await asyncio.gather(*(run_batch_item(request, item) for item in items))
+    return {"responses": results}
+
+
+async def run_batch_item(request: Request, item: BatchItem) -> dict:
+    # Each item is one more upstream call, so it is charged to the caller's
+    # IP, user and route limits like a request of its own
+    user = getattr(request.state, "user", None) or {}
+    client_ip = request.client.host if request.client else "unknown"
+    identity = f"user:{user.get('user_id')}" if user else f"ip:{client_ip}"
+    response = await check_item_limits(item.path, client_ip, identity, bool(user))
+    
+    if response is None:
+        service, _, path = item.path[len("/api/"):].partition("/")
+        try:
+            response = await proxy(service, path, sub_request(request, item))
+        except HTTPException as e:
+            response = JSONResponse(status_code=e.status_code, content={"detail": e.detail})
+        except Exception as e:
+            response = JSONResponse(status_code=502, content={"detail": f"Batch request failed: {str(e)}"})
+    return await item_result(item, response, BATCH_ITEM_MAX_BYTES, BATCH_ITEM_TIMEOUT)
+
+
+async def check_item_limits(path: str, client_ip: str, identity: str, authenticated: bool):
+    """check_request's rate limits for one batch item. Returns a 429 response, or None to proceed."""
+    allowed, retry_after = await rate_limiter.hit(f"ip:{client_ip}", RATE_LIMIT)
+    if not allowed:
+        return rate_limit_exceeded(retry_after)
+    if authenticated and USER_RATE_LIMIT:
+        allowed, retry_after = await rate_limiter.hit(identity, USER_RATE_LIMIT)
+        if not allowed:
+            return rate_limit_exceeded(retry_after)
+    return await check_route_limit(path, identity)
+
+
+# Special handling for file uploads (PDF service). Registered before the
+# catch-all below, which would otherwise match it first.
+@app.post("/api/pdf/upload")
+async def pdf_upload_proxy(request: Request):
+    """Special endpoint for PDF uploads with larger timeout"""
+    target_path = "/api/pdf/upload/"
+    
+    headers = dict(request.headers)
+    headers.pop("host", None)
+    
+    # Add user info if authenticated
+    if hasattr(request.state, "user"):
+        headers["X-User-ID"] = str(request.state.user.get("user_id", ""))
+    
+    try:
+        # Longer timeout for uploads
+        return await forward_within_deadline("pdf", target_path, request, headers, 60.0)
+    except httpx.TimeoutException:
+        return JSONResponse(
+            status_code=504,
+            content={"detail": "PDF upload timed out"}
+        )
+    except Exception as e:
+        return JSONResponse(
+            status_code=500,
+            content={"detail": f"PDF upload failed: {str(e)}"}
+        )
 
 
 # Dynamic proxy endpoint
@@ -184,15 +507,15 @@ async def proxy(service: str, path: str, request: Request):
             detail=f"Service '{service}' not found. Available: {list(SERVICE_URLS.keys())}"
         )
     
-    # Build target URL - remove trailing slash if path is empty
+    # Build target path - remove trailing slash if path is empty
     if path:
-        target_url = f"{SERVICE_URLS[service]}/api/{service}/{path}"
+        target_path = f"/api/{service}/{path}"
     else:
-        target_url = f"{SERVICE_URLS[service]}/api/{service}"
+        target_path = f"/api/{service}"
     
     # Add trailing slash only if original request had it
-    if request.url.path.endswith('/') and not target_url.endswith('/'):
-        target_url += '/'
+    if request.url.path.endswith('/') and not target_path.endswith('/'):
+        target_path += '/'
     
     # Prepare headers (forward all except host)
     headers = dict(request.headers)
@@ -203,79 +526,313 @@ async def proxy(service: str, path: str, request: Request):
         headers["X-User-ID"] = str(request.state.user.get("user_id", ""))
         headers["X-User-Email"] = str(request.state.user.get("email", ""))
     
-    # Read request body
-    body = await request.body()
+    try:
+        return await forward_within_deadline(service, target_path, request, headers, upstreams.timeout)
+    except httpx.TimeoutException:
+        return JSONResponse(
+            status_code=504,
+            content={"detail": f"Service '{service}' timed out"}
+        )
+    except httpx.RequestError as e:
+        return JSONResponse(
+            status_code=503,
+            content={"detail": f"Service '{service}' unavailable: {str(e)}"}
+        )
+
+
+async def forward_within_deadline(service: str, target_path: str, request: Request, headers: dict,
+                                  timeout: float):
+    """
+    Forward a request with an X-Request-Deadline header, and cancel the
+    upstream call if the client disconnects before the response is ready.
+    """
+    deadline = request_deadline(request, timeout)
+    remaining = time_left(deadline)
+    if remaining <= 0:
+        return JSONResponse(status_code=504, content={"detail": "Request deadline has already passed"})
+    headers[DEADLINE_HEADER] = f"{deadline:.3f}"
     
-    # Forward request to microservice
-    async with httpx.AsyncClient(timeout=30.0) as client:
+    watcher = DisconnectWatcher(request)
+    if not has_body(request.headers):
+        # Take the empty body now so the watcher can listen for a disconnect
+        await watcher.request.body()
+    try:
+        return await watcher.run(
+            forward_to_service(service, target_path, watcher.request, headers, deadline=deadline)
+        )
+    except ClientDisconnected:
+        # Nobody will read this, but it shows up as 499 in the metrics
+        return JSONResponse(status_code=499, content={"detail": "Client closed request"})
+
+
+async def forward_to_service(service: str, target_path: str, request: Request, headers: dict,
+                             deadline: float = None):
+    """
+    Send the incoming request to a backend instance over its pooled client.
+    GETs on cached routes are answered from the response cache when possible,
+    and identical concurrent GETs are coalesced for COALESCE_SERVICES.
+    """
+    # Fail fast for services the health prober knows are down
+    if HEALTH_FAIL_FAST and health.is_down(service):
+        return service_unavailable(f"Service '{service}' is down", HEALTH_INTERVAL)
+    
+    user = getattr(request.state, "user", None) or {}
+    user_id = user.get("user_id")
+    
+    if request.method == "GET":
+        cache_ttl = response_cache.ttl_for(target_path)
+        if cache_ttl is not None:
+            return await cached_get(service, target_path, request, headers, deadline, user_id, cache_ttl)
+        if service in COALESCE_SERVICES:
+            return await fetch_buffered(service, target_path, request, headers, deadline, user_id)
+        return await call_upstream(service, target_path, request, headers, deadline, stream=STREAM_PROXY)
+    
+    response = await call_upstream(service, target_path, request, headers, deadline, stream=STREAM_PROXY)
+    if request.method in ("POST", "PUT", "PATCH", "DELETE"):
+        # The user changed data under this service - drop their cached reads of it
+        response_cache.invalidate(f"/api/{service}", user_id)
+    return response
+
+
+async def cached_get(service: str, target_path: str, request: Request, headers: dict,
+                     deadline, user_id, cache_ttl: float):
+    """Serve a GET from the response cache, fetching and storing it on a miss"""
+    key = (target_path, str(request.query_params), user_id)
+    if_none_match = request.headers.get("if-none-match")
+    # The backend must send a full body for the gateway to cache
+    headers = {k: v for k, v in headers.items() if k not in ("if-none-match", "if-modified-since")}
+    
+    entry = response_cache.get(key)
+    if entry is None:
+        response = await fetch_buffered(service, target_path, request, headers, deadline, user_id)
+        entry = response_cache.store(key, response, cache_ttl)
+        if entry is None:
+            return response
+        cache_status = "MISS"
+    else:
+        cache_status = "HIT"
+    
+    if if_none_match and etag_matches(if_none_match, entry.etag):
+        response_cache.not_modified += 1
+        return entry.not_modified()
+    try:
+        return for_client(entry.to_response(cache_status), request.headers.get("accept-encoding", ""))
+    except ValueError:
+        # Stored in an encoding this client refuses and this worker cannot
+        # decode (br or zstd without its package) - fetch the client its own copy
+        return await call_upstream(service, target_path, request, headers, deadline, stream=False)
+
+
+async def fetch_buffered(service: str, target_path: str, request: Request, headers: dict,
+                         deadline, user_id):
+    """
+    Buffered upstream call, coalesced with identical in-flight GETs where
+    enabled. Live streams are relayed, never buffered or shared.
+    """
+    if service not in COALESCE_SERVICES or "text/event-stream" in request.headers.get("accept", ""):
+        return await call_upstream(service, target_path, request, headers, deadline, stream=False)
+    
+    key = (target_path, str(request.query_params), user_id)
+    started = time.perf_counter()
+    originated = False
+    
+    def fetch():
+        nonlocal originated
+        originated = True
+        return call_upstream(service, target_path, request, headers, deadline, stream=False)
+    
+    # The buffered response is shared by every caller waiting on the key.
+    # Sending a Response can change it (middleware edits its headers), so
+    # each caller sends its own copy.
+    shared = await coalescer.do(key, fetch)
+    if isinstance(shared, StreamingResponse):
+        # The backend answered with a live stream, which only one client can read
+        response = shared if originated else await call_upstream(
+            service, target_path, request, headers, deadline, stream=False
+        )
+    else:
+        response = Response(content=shared.body, status_code=shared.status_code)
+        response.raw_headers = list(shared.raw_headers)
         try:
-            response = await client.request(
-                method=request.method,
-                url=target_url,
-                headers=headers,
-                content=body,
-                params=request.query_params
-            )
-            
-            # Return response with same status code and headers
-            return Response(
-                content=response.content,
-                status_code=response.status_code,
-                headers=dict(response.headers),
-                media_type=response.headers.get("content-type")
-            )
-            
-        except httpx.TimeoutException:
-            return JSONResponse(
-                status_code=504,
-                content={"detail": f"Service '{service}' timed out"}
-            )
-        except httpx.RequestError as e:
-            return JSONResponse(
-                status_code=503,
-                content={"detail": f"Service '{service}' unavailable: {str(e)}"}
-            )
+            response = for_client(response, request.headers.get("accept-encoding", ""))
+        except ValueError:
+            # Encoded for another client in a way this worker cannot decode
+            response = await call_upstream(service, target_path, request, headers, deadline, stream=False)
+    request.state.upstream_seconds = time.perf_counter() - started
+    return response
 
 
-# Special handling for file uploads (PDF service)
-@app.post("/api/pdf/upload")
-async def pdf_upload_proxy(request: Request):
-    """Special endpoint for PDF uploads with larger timeout"""
-    target_url = f"{SERVICE_URLS['pdf']}/api/pdf/upload/"
+async def call_upstream(service: str, target_path: str, request: Request, headers: dict,
+                        deadline, stream: bool):
+    """
+    Make one upstream call through admission control, the circuit breaker
+    and the load balancer.
+    When streaming, the body is piped through as it arrives and the
+    response is relayed chunk by chunk; otherwise both are buffered, except
+    live responses (event streams, chunked bodies), which are always relayed.
+    Idempotent requests are retried and hedged by retry_policy.
+    """
+    # Reject bodies that announce themselves as too large before reading them
+    max_body = body_limit(target_path)
+    length = declared_length(request.headers)
+    if length is not None and length > max_body:
+        return body_too_large(max_body)
     
-    headers = dict(request.headers)
-    headers.pop("host", None)
+    def count_request_bytes(received: int):
+        request_metrics.proxied_bytes.inc(service, "in", amount=received)
     
-    # Add user info if authenticated
-    if hasattr(request.state, "user"):
-        headers["X-User-ID"] = str(request.state.user.get("user_id", ""))
+    if stream and (length is not None or max_body > CHUNKED_BUFFER_LIMIT):
+        # Counted as it streams, and cut off once it passes the limit
+        body = limited_body(request, max_body, on_done=count_request_bytes) if has_body(request.headers) else None
+    else:
+        # Chunked bodies on routes with small limits are read up front, so
+        # an oversized one is refused before the backend hears of it
+        try:
+            body = await read_body(request, max_body)
+        except BodyTooLarge:
+            return body_too_large(max_body)
+    
+    # Wait for a slot under the service's concurrency limit, or shed the call
+    admission = admission_controllers[service]
+    if not await admission.acquire():
+        return service_unavailable(f"Service '{service}' is overloaded", admission.retry_after())
     
-    body = await request.body()
+    # Fail fast while the service's circuit breaker is open
+    breaker = breakers[service]
+    if not breaker.allow():
+        admission.release()
+        return service_unavailable(
+            f"Service '{service}' is unavailable (circuit open)", breaker.retry_after()
+        )
     
-    async with httpx.AsyncClient(timeout=60.0) as client:  # Longer timeout for uploads
+    client = upstreams.client(service)
+    instance = None
+    started = time.perf_counter()
+    failed = True
+    streaming = False
+    cancelled = False
+    try:
+        if isinstance(body, bytes):
+            request_metrics.proxied_bytes.inc(service, "in", amount=len(body))
+        
+        forwarded = {key: value for key, value in headers.items() if key.lower() not in HOP_BY_HOP_HEADERS}
+        
+        def build(picked):
+            return client.build_request(
+                method=request.method,
+                url=picked.url + target_path,
+                headers=forwarded,
+                content=body,
+                params=request.query_params,
+                # Each attempt gets only what is left of the request's deadline
+                timeout=httpx.USE_CLIENT_DEFAULT if deadline is None else max(0.0, time_left(deadline))
+            )
+        
         try:
-            response = await client.post(
-                target_url,
-                headers=headers,
-                content=body
+            # Safe to send more than once (a streamed body cannot be replayed),
+            # so retry and hedge within the budget
+            if request.method in IDEMPOTENT_METHODS and not isinstance(body, AsyncIterator):
+                response, instance = await retry_policy.send(service, client, build, stream=True, deadline=deadline)
+            else:
+                instance = upstreams.pick(service)
+                response = await client.send(build(instance), stream=True)
+        except BodyTooLarge as e:
+            failed = False
+            return body_too_large(e.limit)
+        failed = response.status_code >= 500
+        
+        # Only the response headers have arrived - buffer the body unless
+        # streaming, or the backend is streaming it live
+        if not (stream or is_live_stream(response.headers)):
+            # A body the backend encoded in a way the client accepts is kept
+            # as sent, so it is neither decoded nor compressed again.
+            # Otherwise httpx decodes it.
+            forwarded_headers = response_headers(response)
+            content_encoding = response.headers.get("content-encoding")
+            keep_encoding = content_encoding is not None and accepts(
+                request.headers.get("accept-encoding", ""), content_encoding
             )
+            try:
+                if keep_encoding:
+                    content = b"".join([chunk async for chunk in response.aiter_raw()])
+                else:
+                    content = await response.aread()
+                    forwarded_headers.pop("content-encoding", None)
+            finally:
+                await response.aclose()
+            request_metrics.proxied_bytes.inc(service, "out", amount=len(content))
             
+            forwarded_headers.pop("content-length", None)
             return Response(
-                content=response.content,
+                content=content,
                 status_code=response.status_code,
-                headers=dict(response.headers),
+                headers=forwarded_headers,
                 media_type=response.headers.get("content-type")
             )
-        except httpx.TimeoutException:
-            return JSONResponse(
-                status_code=504,
-                content={"detail": "PDF upload timed out"}
-            )
-        except Exception as e:
-            return JSONResponse(
-                status_code=500,
-                content={"detail": f"PDF upload failed: {str(e)}"}
-            )
+        
+        # The instance and admission slot stay taken until the body has been
+        # relayed. RelayResponse calls this once, even if the client leaves
+        # before the body starts.
+        def finished(ok: bool, sent: int):
+            upstreams.release(service, instance, ok and not failed)
+            admission.release(elapsed, not failed)
+            request_metrics.proxied_bytes.inc(service, "out", amount=sent)
+        
+        # Relay raw bytes so any backend content-encoding passes through untouched
+        streaming = True
+        forwarded_headers = response_headers(response)
+        keepalive = None
+        if is_event_stream(response.headers):
+            # Tell any proxy in front of the gateway not to buffer or cache the stream
+            forwarded_headers.setdefault("cache-control", "no-cache")
+            forwarded_headers["x-accel-buffering"] = "no"
+            if "content-encoding" not in response.headers:
+                keepalive = SSE_KEEPALIVE
+        return RelayResponse(
+            response,
+            finished,
+            keepalive=keepalive,
+            status_code=response.status_code,
+            headers=forwarded_headers
+        )
+    except asyncio.CancelledError:
+        # The client went away (DisconnectWatcher cancelled the call). That
+        # says nothing about the backend, so the slots are given back without
+        # a breaker, latency or outlier sample.
+        cancelled = True
+        raise
+    finally:
+        elapsed = time.perf_counter() - started
+        request.state.upstream_seconds = elapsed
+        if cancelled:
+            breaker.abandon()
+            admission.release()
+            if instance is not None:
+                upstreams.release(service, instance, None)
+        else:
+            request_metrics.upstream_seconds.observe(elapsed, service)
+            breaker.record(not failed, elapsed)
+        if not streaming and not cancelled:
+            admission.release(elapsed, not failed)
+            if instance is not None:
+                upstreams.release(service, instance, not failed)
+
+
+def service_unavailable(detail: str, retry_after: float) -> JSONResponse:
+    return JSONResponse(
+        status_code=503,
+        content={"detail": detail},
+        headers={"Retry-After": str(max(1, round(retry_after)))}
+    )
+
+
+def body_too_large(limit: int) -> JSONResponse:
+    # Close the connection rather than read the rest of an oversized upload
+    return JSONResponse(
+        status_code=413,
+        content={"detail": f"Request body too large. Maximum size is {limit} bytes."},
+        headers={"Connection": "close"}
+    )
 
 
 if __name__ == "__main__":
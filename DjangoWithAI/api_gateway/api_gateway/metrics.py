@@ -0,0 +1,151 @@
+"""
+Prometheus-style metrics for the gateway.
+
+Recording happens on every request, so the hot path is plain dict lookups,
+integer adds and a bisect into fixed histogram buckets. Cumulative bucket
+counts and the text exposition format are only produced when /metrics is
+scraped. Components that keep their own counters (breakers, pools, caches)
+are read at scrape time through collectors instead of being mirrored here.
+"""
+from bisect import bisect_left
+
+
+# Latency buckets in seconds, from sub-millisecond gateway work to slow AI calls
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1,
+                   0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+
+def escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def format_labels(names: tuple, values: tuple) -> str:
+    if not names:
+        return ""
+    return "{" + ",".join(f'{name}="{escape(value)}"' for name, value in zip(names, values)) + "}"
+
+
+class Counter:
+    kind = "counter"
+
+    def __init__(self, name: str, help: str, labels: tuple = ()):
+        self.name = name
+        self.help = help
+        self.labels = labels
+        self.values = {}
+
+    def inc(self, *labels, amount: float = 1):
+        self.values[labels] = self.values.get(labels, 0) + amount
+
+    def samples(self):
+        for labels, value in self.values.items():
+            yield self.name, format_labels(self.labels, labels), value
+
+
+class Gauge(Counter):
+    kind = "gauge"
+
+    def dec(self, *labels, amount: float = 1):
+        self.values[labels] = self.values.get(labels, 0) - amount
+
+
+class Histogram:
+    kind = "histogram"
+
+    def __init__(self, name: str, help: str, labels: tuple = (), buckets: tuple = LATENCY_BUCKETS):
+        self.name = name
+        self.help = help
+        self.labels = labels
+        self.buckets = buckets
+        self.values = {}  # labels -> [bucket counts..., +Inf count, sum]
+
+    def observe(self, value: float, *labels):
+        series = self.values.get(labels)
+        if series is None:
+            series = self.values[labels] = [0] * (len(self.buckets) + 2)
+        series[bisect_left(self.buckets, value)] += 1
+        series[-1] += value
+
+    def samples(self):
+        for labels, series in self.values.items():
+            cumulative = 0
+            for bound, count in zip(self.buckets + ("+Inf",), series):
+                cumulative += count
+                yield (f"{self.name}_bucket",
+                       format_labels(self.labels + ("le",), labels + (bound,)), cumulative)
+            yield f"{self.name}_sum", format_labels(self.labels, labels), series[-1]
+            yield f"{self.name}_count", format_labels(self.labels, labels), cumulative
+
+
+class MetricsRegistry:
+    def __init__(self):
+        self.metrics = []
+        self.collectors = []
+
+    def counter(self, name: str, help: str, labels: tuple = ()) -> Counter:
+        return self._register(Counter(name, help, labels))
+
+    def gauge(self, name: str, help: str, labels: tuple = ()) -> Gauge:
+        return self._register(Gauge(name, help, labels))
+
+    def histogram(self, name: str, help: str, labels: tuple = (), buckets: tuple = LATENCY_BUCKETS) -> Histogram:
+        return self._register(Histogram(name, help, labels, buckets))
+
+    def _register(self, metric):
+        self.metrics.append(metric)
+        return metric
+
+    def collector(self, fn):
+        """Register fn() -> iterable of metrics, evaluated at scrape time"""
+        self.collectors.append(fn)
+        return fn
+
+    def render(self) -> str:
+        lines = []
+        metrics = list(self.metrics)
+        for collect in self.collectors:
+            metrics.extend(collect())
+        for metric in metrics:
+            lines.append(f"# HELP {metric.name} {metric.help}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            for name, labels, value in metric.samples():
+                lines.append(f"{name}{labels} {value}")
+        return "\n".join(lines) + "\n"
+
+
+class RequestMetrics:
+    """Per-request gateway metrics, fed by GatewayMiddleware and the proxy"""
+
+    def __init__(self, registry: MetricsRegistry, services):
+        self.services = frozenset(services)
+        self.requests_total = registry.counter(
+            "gateway_requests_total", "Requests handled by the gateway", ("service", "status"))
+        self.request_seconds = registry.histogram(
+            "gateway_request_duration_seconds", "Request arrival to response headers", ("service",))
+        self.overhead_seconds = registry.histogram(
+            "gateway_overhead_seconds", "Time spent in the gateway itself, excluding upstream waits", ("service",))
+        self.upstream_seconds = registry.histogram(
+            "gateway_upstream_duration_seconds", "Upstream call to backend response headers", ("service",))
+        self.in_flight = registry.gauge(
+            "gateway_requests_in_flight", "Requests currently being handled", ("service",))
+        self.proxied_bytes = registry.counter(
+            "gateway_proxied_bytes_total", "Body bytes proxied to (in) and from (out) backends", ("service", "direction"))
+
+    def label(self, path: str) -> str:
+        """Metrics label for a request path: the backend service or 'gateway'"""
+        if path.startswith("/api/"):
+            service = path[5:].split("/", 1)[0]
+            return service if service in self.services else "unknown"
+        return "gateway"
+
+    def started(self, scope) -> str:
+        label = self.label(scope["path"])
+        self.in_flight.inc(label)
+        return label
+
+    def finished(self, scope, label: str, status: int, elapsed: float):
+        self.in_flight.dec(label)
+        self.requests_total.inc(label, status)
+        self.request_seconds.observe(elapsed, label)
+        upstream = scope.get("state", {}).get("upstream_seconds", 0.0)
+        self.overhead_seconds.observe(max(0.0, elapsed - upstream), label)
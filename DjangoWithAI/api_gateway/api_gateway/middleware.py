@@ -0,0 +1,87 @@
+"""
+Raw ASGI middleware and precompiled route tables for the gateway.
+
+Starlette's BaseHTTPMiddleware (behind @app.middleware("http")) runs the app
+in a separate task and re-streams every response body through a memory
+object stream. This middleware instead calls the app directly and only
+looks at the response start message to record the status code.
+"""
+import re
+import time
+
+
+class PrefixTable:
+    """Longest-prefix lookup over a fixed set of path prefixes, compiled to one regex"""
+
+    def __init__(self, prefixes: dict):
+        # Longest first, so the most specific prefix wins the alternation
+        ordered = sorted(prefixes.items(), key=lambda item: len(item[0]), reverse=True)
+        self.values = [value for _, value in ordered]
+        self.pattern = re.compile(
+            "|".join(f"(?P<p{i}>{re.escape(prefix)})" for i, (prefix, _) in enumerate(ordered))
+        ) if ordered else None
+
+    def match(self, path: str):
+        """(prefix, value) for the longest matching prefix, or None"""
+        if self.pattern is None:
+            return None
+        match = self.pattern.match(path)
+        if match is None:
+            return None
+        return match.group(), self.values[int(match.lastgroup[1:])]
+
+
+class RouteTable:
+    """Decides once per request whether a path needs a valid JWT"""
+
+    def __init__(self, public_paths, public_prefixes, protected_prefix: str = "/api/"):
+        self.public_paths = frozenset(public_paths)
+        self.public_prefixes = PrefixTable(dict.fromkeys(public_prefixes, True))
+        self.protected_prefix = protected_prefix
+
+    def requires_auth(self, path: str) -> bool:
+        if path in self.public_paths or not path.startswith(self.protected_prefix):
+            return False
+        return self.public_prefixes.match(path) is None
+
+
+class GatewayMiddleware:
+    """
+    Rate limiting, JWT validation and request metrics as raw ASGI middleware.
+
+    `check(scope)` returns an error response to send instead of calling the
+    app, or None to let the request through. `metrics` is told when each
+    request starts and when its response headers go out.
+    """
+
+    def __init__(self, app, check, metrics):
+        self.app = app
+        self.check = check
+        self.metrics = metrics
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        started = time.perf_counter()
+        label = self.metrics.started(scope)
+        status = 500
+        headers_sent = None
+
+        async def send_wrapper(message):
+            nonlocal status, headers_sent
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                headers_sent = time.perf_counter()
+            await send(message)
+
+        try:
+            response = await self.check(scope)
+            if response is not None:
+                await response(scope, receive, send_wrapper)
+            else:
+                await self.app(scope, receive, send_wrapper)
+        finally:
+            elapsed = (headers_sent or time.perf_counter()) - started
+            self.metrics.finished(scope, label, status, elapsed)
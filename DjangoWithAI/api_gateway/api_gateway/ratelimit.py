@@ -0,0 +1,542 @@
+"""
+Constant-time rate limiting for the gateway (GCRA).
+
+Each client is tracked by a single float, its theoretical arrival time (TAT).
+Checking a request is O(1) and memory per client is fixed. A client whose TAT
+is already in the past behaves exactly like a client never seen before, so
+idle clients can be evicted without changing any limiting decision.
+
+Three backends share the same `await limiter.hit(key, limit)` interface:
+
+- memory: per-process table (each uvicorn worker limits on its own)
+- shm:    mmap-backed slot table shared by every worker on the host
+- redis:  fixed-window counters in Redis, shared by every gateway host
+
+The shared backends reserve requests in small batches (leases) so most
+requests are decided locally without touching the shared state. Requests a
+lease did not use go back to the store when it expires.
+"""
+import asyncio
+import hashlib
+import math
+import mmap
+import os
+import struct
+import time
+from collections import OrderedDict
+from urllib.parse import urlparse
+
+
+class RateLimit:
+    """Allow `requests` per `window` seconds, with bursts of up to `requests`"""
+
+    __slots__ = ("requests", "window", "interval")
+
+    def __init__(self, requests: int, window: float):
+        self.requests = requests
+        self.window = window
+        self.interval = window / requests
+
+    def __repr__(self):
+        return f"RateLimit({self.requests}/{self.window}s)"
+
+
+def parse_limit(value: str):
+    """Parse '100/60' (requests/seconds) into a RateLimit, or None if empty"""
+    if not value:
+        return None
+    requests, window = value.split("/")
+    return RateLimit(int(requests), float(window))
+
+
+def parse_route_limits(value: str) -> list:
+    """Parse '/api/ai/=20/60,/api/pdf/=30/60' into [(prefix, RateLimit), ...]"""
+    routes = []
+    for item in filter(None, (part.strip() for part in value.split(","))):
+        prefix, limit = item.split("=", 1)
+        routes.append((prefix, parse_limit(limit)))
+    # Longest prefix first so the most specific route wins
+    return sorted(routes, key=lambda route: len(route[0]), reverse=True)
+
+
+class RateLimiter:
+    """
+    In-memory GCRA limiter keyed by client, bounded to `max_clients` entries.
+
+    Clients are kept least recently seen first, so making room for a new one
+    drops the head of the table in O(1) however full it is.
+    """
+
+    def __init__(self, max_clients: int = 100_000):
+        self.max_clients = max_clients
+        self.tats = OrderedDict()
+        self.evicted = 0
+
+    async def hit(self, key: str, limit: RateLimit) -> tuple:
+        """
+        Count one request for `key`.
+        Returns (allowed, retry_after) where retry_after is in seconds.
+        """
+        return self.check(key, limit)
+
+    def check(self, key: str, limit: RateLimit, now: float = None) -> tuple:
+        """Synchronous core of hit()"""
+        if now is None:
+            now = time.monotonic()
+        tats = self.tats
+
+        tat = tats.get(key)
+        if tat is None:
+            if len(tats) >= self.max_clients:
+                # The least recently seen client - idle unless the table is
+                # full of active ones, and then the least active of them
+                tats.popitem(last=False)
+                self.evicted += 1
+            tat = now
+        else:
+            tats.move_to_end(key)
+            if tat < now:
+                tat = now
+
+        new_tat = tat + limit.interval
+        allow_at = new_tat - limit.window
+        if allow_at > now:
+            return False, allow_at - now
+
+        tats[key] = new_tat
+        return True, 0.0
+
+    def evict_idle(self, now: float = None) -> int:
+        """Drop every client whose bucket has fully refilled"""
+        if now is None:
+            now = time.monotonic()
+        idle = [key for key, tat in self.tats.items() if tat <= now]
+        for key in idle:
+            del self.tats[key]
+        self.evicted += len(idle)
+        return len(idle)
+
+    async def run_eviction(self, interval: float):
+        """Evict idle clients every `interval` seconds until cancelled"""
+        while True:
+            await asyncio.sleep(interval)
+            self.evict_idle()
+
+    async def close(self):
+        pass
+
+    def stats(self) -> dict:
+        return {
+            "backend": "memory",
+            "clients": len(self.tats),
+            "max_clients": self.max_clients,
+            "evicted": self.evicted,
+        }
+
+
+class SharedMemoryStore:
+    """
+    GCRA state in an mmap-backed file shared by all workers on one host.
+
+    The file is a fixed table of (key hash, TAT) slots grouped into buckets
+    of BUCKET_SLOTS. A bucket is locked with an fcntl byte-range lock while it
+    is read and updated, so workers only contend when they hit the same bucket.
+    Stale slots are reused in place, so the file never grows.
+
+    The lock is taken without blocking, so a busy bucket never stalls the
+    event loop: after LOCK_ATTEMPTS tries a reservation is decided by a
+    per-process limiter instead, and a release is dropped.
+    """
+
+    SLOT = struct.Struct("<Qd")
+    BUCKET_SLOTS = 8
+    LOCK_ATTEMPTS = 3
+    LOCK_RETRY = 0.001  # seconds between attempts
+
+    def __init__(self, path: str, slots: int = 65536):
+        import fcntl  # POSIX only
+
+        self._fcntl = fcntl
+        self.path = path
+        self.buckets = max(1, slots // self.BUCKET_SLOTS)
+        self.bucket_size = self.SLOT.size * self.BUCKET_SLOTS
+        size = self.buckets * self.bucket_size
+
+        self.fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o600)
+        if os.fstat(self.fd).st_size < size:
+            os.ftruncate(self.fd, size)
+        self.table = mmap.mmap(self.fd, size)
+        self.fallback = RateLimiter()
+        self.contended = 0
+
+    @staticmethod
+    def key_hash(key: str) -> int:
+        # Python's hash() differs between processes, so use a stable digest
+        value = int.from_bytes(hashlib.blake2b(key.encode(), digest_size=8).digest(), "little")
+        return value or 1  # 0 marks an empty slot
+
+    async def reserve(self, key: str, limit: RateLimit, wanted: int) -> tuple:
+        """Reserve up to `wanted` requests. Returns (granted, retry_after)."""
+        now = time.time()
+        h = self.key_hash(key)
+        offset = (h % self.buckets) * self.bucket_size
+
+        if not await self._lock(offset):
+            allowed, retry_after = self.fallback.check(key, limit)
+            return int(allowed), retry_after
+        try:
+            slot, tat = self._find_slot(offset, h, now)
+            tat = max(tat, now)
+            available = int((now + limit.window - tat) / limit.interval)
+            granted = min(wanted, available)
+            if granted <= 0:
+                return 0, tat + limit.interval - limit.window - now
+            self.SLOT.pack_into(self.table, slot, h, tat + granted * limit.interval)
+            return granted, 0.0
+        finally:
+            self._fcntl.lockf(self.fd, self._fcntl.LOCK_UN, self.bucket_size, offset)
+
+    async def release(self, key: str, limit: RateLimit, unused: int, reserved_at: float):
+        """Give back `unused` requests of an earlier reservation"""
+        now = time.time()
+        h = self.key_hash(key)
+        offset = (h % self.buckets) * self.bucket_size
+
+        if not await self._lock(offset):
+            return
+        try:
+            for i in range(self.BUCKET_SLOTS):
+                slot = offset + i * self.SLOT.size
+                slot_hash, tat = self.SLOT.unpack_from(self.table, slot)
+                if slot_hash == h:
+                    self.SLOT.pack_into(self.table, slot, h, max(now, tat - unused * limit.interval))
+                    return
+        finally:
+            self._fcntl.lockf(self.fd, self._fcntl.LOCK_UN, self.bucket_size, offset)
+
+    async def _lock(self, offset: int) -> bool:
+        """Lock a bucket, or give up if another worker keeps holding it"""
+        for attempt in range(self.LOCK_ATTEMPTS):
+            try:
+                self._fcntl.lockf(self.fd, self._fcntl.LOCK_EX | self._fcntl.LOCK_NB, self.bucket_size, offset)
+                return True
+            except OSError:
+                if attempt + 1 < self.LOCK_ATTEMPTS:
+                    await asyncio.sleep(self.LOCK_RETRY)
+        self.contended += 1
+        return False
+
+    def _find_slot(self, offset: int, h: int, now: float) -> tuple:
+        """Slot offset for `h` in its bucket and its current TAT"""
+        victim, victim_tat = offset, None
+        for i in range(self.BUCKET_SLOTS):
+            slot = offset + i * self.SLOT.size
+            slot_hash, tat = self.SLOT.unpack_from(self.table, slot)
+            if slot_hash == h:
+                return slot, tat
+            if slot_hash == 0 or tat <= now:
+                victim, victim_tat = slot, float("-inf")
+            elif victim_tat is None or tat < victim_tat:
+                victim, victim_tat = slot, tat
+        # Not tracked yet: take a free or stale slot, else the least busy one
+        return victim, now
+
+    async def close(self):
+        self.table.close()
+        os.close(self.fd)
+
+    def stats(self) -> dict:
+        return {"path": self.path, "slots": self.buckets * self.BUCKET_SLOTS, "contended": self.contended}
+
+
+class RedisStore:
+    """
+    Fixed-window counters in Redis, spoken over a minimal RESP client.
+
+    Each reservation pipelines `SET key 0 PX window NX` and `INCRBY key n` on
+    one connection, so it costs a single round trip and needs nothing beyond
+    core Redis commands. The part of a reservation that did not fit in the
+    window is decremented again at once, so rejected requests use up nothing.
+
+    If Redis is unreachable the gateway falls back to per-process limiting
+    instead of rejecting traffic. `timeout` bounds the whole call, including
+    the wait for the shared connection, and after a failure Redis is left
+    alone for `cooldown` seconds so requests go straight to the fallback
+    rather than queueing on a dead connection.
+    """
+
+    def __init__(self, url: str, prefix: str = "gateway:rl:", timeout: float = 0.5, cooldown: float = 5.0):
+        parsed = urlparse(url)
+        self.host = parsed.hostname or "127.0.0.1"
+        self.port = parsed.port or 6379
+        self.password = parsed.password
+        self.db = int(parsed.path.lstrip("/") or 0)
+        self.prefix = prefix
+        self.timeout = timeout
+        self.cooldown = cooldown
+        self.reader = self.writer = None
+        self.lock = asyncio.Lock()
+        self.fallback = RateLimiter()
+        self.down_until = 0.0
+        self.errors = 0
+        self.fallbacks = 0
+
+    async def reserve(self, key: str, limit: RateLimit, wanted: int) -> tuple:
+        """Reserve up to `wanted` requests. Returns (granted, retry_after)."""
+        now = time.time()
+        window = int(now // limit.window)
+        redis_key = f"{self.prefix}{key}:{window}"
+        if self.is_down():
+            return self._fall_back(key, limit)
+        try:
+            count = await self._add(redis_key, limit, wanted)
+            granted = max(0, min(wanted, limit.requests - (count - wanted)))
+            if granted < wanted:
+                await self._add(redis_key, limit, granted - wanted)
+        except (OSError, asyncio.TimeoutError, RedisError):
+            self._failed()
+            return self._fall_back(key, limit)
+
+        if granted <= 0:
+            return 0, (window + 1) * limit.window - now
+        return granted, 0.0
+
+    async def release(self, key: str, limit: RateLimit, unused: int, reserved_at: float):
+        """Give back `unused` requests of a reservation made at `reserved_at`"""
+        window = int(reserved_at // limit.window)
+        if window != int(time.time() // limit.window):
+            # That window is over and its counter no longer matters
+            return
+        if self.is_down():
+            return
+        try:
+            await self._add(f"{self.prefix}{key}:{window}", limit, -unused)
+        except (OSError, asyncio.TimeoutError, RedisError):
+            self._failed()
+
+    def is_down(self) -> bool:
+        return time.monotonic() < self.down_until
+
+    def _failed(self):
+        self.errors += 1
+        self.down_until = time.monotonic() + self.cooldown
+        self._disconnect()
+
+    def _fall_back(self, key: str, limit: RateLimit) -> tuple:
+        self.fallbacks += 1
+        allowed, retry_after = self.fallback.check(key, limit)
+        return int(allowed), retry_after
+
+    async def _add(self, redis_key: str, limit: RateLimit, amount: int) -> int:
+        """Add `amount` to a window counter, creating it with the window's expiry"""
+        _, count = await self.execute(
+            ("SET", redis_key, "0", "PX", str(int(limit.window * 1000)), "NX"),
+            ("INCRBY", redis_key, str(amount)),
+        )
+        return count
+
+    async def execute(self, *commands) -> list:
+        """Send pipelined commands and return their replies in order, within `timeout`"""
+        deadline = asyncio.get_running_loop().time() + self.timeout
+        return await asyncio.wait_for(self._execute(commands, deadline), self.timeout)
+
+    async def _execute(self, commands, deadline: float) -> list:
+        async with self.lock:
+            if self.is_down():
+                # Another caller failed while this one waited for the connection
+                raise ConnectionError("Redis is cooling down after an error")
+            try:
+                if self.writer is None:
+                    await self._connect()
+                self.writer.write(b"".join(encode_command(command) for command in commands))
+                return [await read_reply(self.reader) for _ in commands]
+            except asyncio.CancelledError:
+                # Half set up, or replies still on their way - never reuse it
+                self._disconnect()
+                if asyncio.get_running_loop().time() >= deadline:
+                    # Timed out: mark Redis down before the next caller gets the lock
+                    self.down_until = time.monotonic() + self.cooldown
+                raise
+
+    async def _connect(self):
+        self.reader, self.writer = await asyncio.open_connection(self.host, self.port)
+        setup = []
+        if self.password:
+            setup.append(("AUTH", self.password))
+        if self.db:
+            setup.append(("SELECT", str(self.db)))
+        for command in setup:
+            self.writer.write(encode_command(command))
+            await read_reply(self.reader)
+
+    def _disconnect(self):
+        if self.writer is not None:
+            self.writer.close()
+        self.reader = self.writer = None
+
+    async def close(self):
+        self._disconnect()
+
+    def stats(self) -> dict:
+        return {
+            "redis": f"{self.host}:{self.port}/{self.db}",
+            "errors": self.errors,
+            "fallbacks": self.fallbacks,
+            "down": self.is_down(),
+        }
+
+
+class RedisError(Exception):
+    """Error reply from the Redis server"""
+
+
+def encode_command(args) -> bytes:
+    parts = [b"*%d\r\n" % len(args)]
+    for arg in args:
+        data = arg.encode() if isinstance(arg, str) else arg
+        parts.append(b"$%d\r\n%s\r\n" % (len(data), data))
+    return b"".join(parts)
+
+
+async def read_reply(reader: asyncio.StreamReader):
+    line = await reader.readline()
+    if not line:
+        raise ConnectionError("Redis closed the connection")
+    kind, payload = line[:1], line[1:-2]
+    if kind == b"+":
+        return payload.decode()
+    if kind == b"-":
+        raise RedisError(payload.decode())
+    if kind == b":":
+        return int(payload)
+    if kind == b"$":
+        length = int(payload)
+        if length < 0:
+            return None
+        data = await reader.readexactly(length + 2)
+        return data[:-2]
+    if kind == b"*":
+        return [await read_reply(reader) for _ in range(int(payload))]
+    raise RedisError(f"Unexpected reply: {line!r}")
+
+
+class LeasedLimiter:
+    """
+    Front a shared store with local leases to batch increments.
+
+    The first request for a key reserves what the limit allows in `lease_ttl`
+    seconds (at most `batch` requests) from the store; the following ones are
+    admitted from the local lease without touching shared state. Rejections
+    are cached the same way, up to `lease_ttl`. When a lease expires, the
+    requests it did not use are handed back to the store, so a client sending
+    slower than one lease per `lease_ttl` is charged only for what it sent.
+    Worst-case overshoot is one lease per worker.
+
+    Leases are kept oldest first. Once `max_clients` keys hold one, a new key
+    displaces the oldest lease in O(1), and its unused requests are returned
+    like those of an expired lease.
+    """
+
+    def __init__(self, store, batch: int = 10, lease_ttl: float = 1.0, max_clients: int = 100_000):
+        self.store = store
+        self.batch = batch
+        self.lease_ttl = lease_ttl
+        self.max_clients = max_clients
+        self.leases = OrderedDict()  # key -> [remaining (-1 = rejected), expires_at, limit, reserved_at]
+        self.unreturned = []  # (key, lease) of evicted leases with requests left over
+        self.reservations = 0
+        self.local_hits = 0
+        self.returned = 0
+
+    async def hit(self, key: str, limit: RateLimit) -> tuple:
+        """
+        Count one request for `key`.
+        Returns (allowed, retry_after) where retry_after is in seconds.
+        """
+        now = time.monotonic()
+        lease = self.leases.get(key)
+        if lease is not None and lease[1] > now and lease[0]:
+            self.local_hits += 1
+            if lease[0] > 0:
+                lease[0] -= 1
+                return True, 0.0
+            # A negative lease is a cached rejection
+            return False, lease[1] - now
+
+        if lease is not None and lease[0] > 0:
+            await self._return(key, lease)
+
+        self.reservations += 1
+        reserved_at = time.time()
+        granted, retry_after = await self.store.reserve(key, limit, self.lease_size(limit))
+
+        if lease is None and len(self.leases) >= self.max_clients:
+            self._evict(*self.leases.popitem(last=False))
+        if granted:
+            self.leases[key] = [granted - 1, now + self.lease_ttl, limit, reserved_at]
+        else:
+            self.leases[key] = [-1, now + min(retry_after, self.lease_ttl), limit, reserved_at]
+        # The newest lease, so it goes behind every other one
+        self.leases.move_to_end(key)
+        return (True, 0.0) if granted else (False, retry_after)
+
+    def lease_size(self, limit: RateLimit) -> int:
+        """Requests the limit allows in one lease_ttl, capped at `batch`"""
+        return max(1, min(self.batch, limit.requests, math.ceil(self.lease_ttl / limit.interval)))
+
+    async def _return(self, key: str, lease: list):
+        self.returned += lease[0]
+        await self.store.release(key, lease[2], lease[0], lease[3])
+
+    def evict_idle(self, now: float = None) -> int:
+        """Drop expired leases, keeping their unused requests for return_unused()"""
+        if now is None:
+            now = time.monotonic()
+        expired = [key for key, lease in self.leases.items() if lease[1] <= now]
+        for key in expired:
+            self._evict(key, self.leases.pop(key))
+        return len(expired)
+
+    def _evict(self, key: str, lease: list):
+        if lease[0] > 0:
+            self.unreturned.append((key, lease))
+
+    async def return_unused(self):
+        """Hand the unused requests of evicted leases back to the store"""
+        unreturned, self.unreturned = self.unreturned, []
+        for key, lease in unreturned:
+            await self._return(key, lease)
+
+    async def run_eviction(self, interval: float):
+        """Evict expired leases every `interval` seconds until cancelled"""
+        while True:
+            await asyncio.sleep(interval)
+            self.evict_idle()
+            await self.return_unused()
+
+    async def close(self):
+        await self.store.close()
+
+    def stats(self) -> dict:
+        return {
+            "backend": type(self.store).__name__,
+            "leases": len(self.leases),
+            "reservations": self.reservations,
+            "local_hits": self.local_hits,
+            "returned": self.returned,
+            **self.store.stats(),
+        }
+
+
+def create_rate_limiter(backend: str, max_clients: int = 100_000, batch: int = 10,
+                        shm_path: str = None, redis_url: str = None):
+    """Build the limiter for GATEWAY_RATE_LIMIT_BACKEND (memory, shm or redis)"""
+    if backend == "memory":
+        return RateLimiter(max_clients=max_clients)
+    if backend == "shm":
+        store = SharedMemoryStore(shm_path)
+    elif backend == "redis":
+        store = RedisStore(redis_url)
+    else:
+        raise ValueError(f"Unknown rate limit backend '{backend}'. Use memory, shm or redis.")
+    return LeasedLimiter(store, batch=batch, max_clients=max_clients)
@@ -0,0 +1,155 @@
+"""
+Per-route response cache for proxied GET requests.
+
+Entries are keyed by path, query string and authenticated user, so one
+user's data is never served to another. The cache is bounded by total bytes
+(LRU) and honours Cache-Control from the backends: no-store and no-cache are
+never cached and max-age / s-maxage override the route's default TTL.
+`private` responses are cached, since an entry only ever goes to its own
+user. Every cached response carries a strong ETag, and a matching
+If-None-Match is answered with 304 without contacting the backend.
+"""
+import hashlib
+import time
+from collections import OrderedDict
+
+from fastapi import Response
+
+
+def parse_cache_routes(value: str) -> list:
+    """Parse '/api/content/=30,/api/db/=60' into [(prefix, ttl_seconds), ...]"""
+    routes = []
+    for item in filter(None, (part.strip() for part in value.split(","))):
+        prefix, ttl = item.split("=", 1)
+        routes.append((prefix, float(ttl)))
+    return sorted(routes, key=lambda route: len(route[0]), reverse=True)
+
+
+def parse_cache_control(value: str) -> dict:
+    directives = {}
+    for part in filter(None, (p.strip() for p in value.lower().split(","))):
+        name, _, arg = part.partition("=")
+        directives[name.strip()] = arg.strip().strip('"')
+    return directives
+
+
+def etag_matches(if_none_match: str, etag: str) -> bool:
+    """If-None-Match uses weak comparison, so W/ prefixes are ignored"""
+    if if_none_match.strip() == "*":
+        return True
+    opaque = etag.removeprefix("W/")
+    return any(tag.strip().removeprefix("W/") == opaque for tag in if_none_match.split(","))
+
+
+class CachedResponse:
+    __slots__ = ("status_code", "headers", "body", "etag", "stored_at", "expires_at")
+
+    def __init__(self, status_code: int, headers: dict, body: bytes, etag: str, ttl: float):
+        self.status_code = status_code
+        self.headers = headers
+        self.body = body
+        self.etag = etag
+        self.stored_at = time.monotonic()
+        self.expires_at = self.stored_at + ttl
+
+    def to_response(self, cache_status: str) -> Response:
+        headers = dict(self.headers)
+        headers["etag"] = self.etag
+        headers["age"] = str(int(time.monotonic() - self.stored_at))
+        headers["x-cache"] = cache_status
+        return Response(content=self.body, status_code=self.status_code, headers=headers)
+
+    def not_modified(self) -> Response:
+        return Response(status_code=304, headers={"etag": self.etag, "x-cache": "HIT"})
+
+
+class ResponseCache:
+    def __init__(self, routes: list, max_bytes: int = 64 * 1024 * 1024,
+                 max_entry_bytes: int = 8 * 1024 * 1024):
+        self.routes = routes
+        self.max_bytes = max_bytes
+        self.max_entry_bytes = max_entry_bytes
+        self.entries = OrderedDict()
+        self.bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.not_modified = 0
+        self.evictions = 0
+
+    def ttl_for(self, path: str):
+        """Default TTL for a cached route, or None if the path is not cached"""
+        for prefix, ttl in self.routes:
+            if path.startswith(prefix):
+                return ttl
+        return None
+
+    def get(self, key):
+        entry = self.entries.get(key)
+        if entry is None:
+            self.misses += 1
+            return None
+        if entry.expires_at <= time.monotonic():
+            self._remove(key)
+            self.misses += 1
+            return None
+        self.entries.move_to_end(key)
+        self.hits += 1
+        return entry
+
+    def store(self, key, response: Response, default_ttl: float):
+        """Cache a buffered 200 response if the backend allows it. Returns the entry or None."""
+        body = getattr(response, "body", None)
+        if response.status_code != 200 or body is None or len(body) > self.max_entry_bytes:
+            return None
+
+        directives = parse_cache_control(response.headers.get("cache-control", ""))
+        if "no-store" in directives or "no-cache" in directives:
+            return None
+        ttl = default_ttl
+        for directive in ("s-maxage", "max-age"):
+            if directives.get(directive, "").isdigit():
+                ttl = int(directives[directive])
+                break
+        if ttl <= 0:
+            return None
+
+        etag = response.headers.get("etag")
+        if not etag or etag.startswith("W/"):
+            etag = '"' + hashlib.sha256(body).hexdigest()[:32] + '"'
+        headers = {
+            name: value for name, value in response.headers.items()
+            if name not in ("content-length", "etag", "age", "x-cache")
+        }
+
+        if key in self.entries:
+            self._remove(key)
+        entry = CachedResponse(response.status_code, headers, body, etag, ttl)
+        self.entries[key] = entry
+        self.bytes += len(body)
+        while self.bytes > self.max_bytes:
+            self._remove(next(iter(self.entries)))
+            self.evictions += 1
+        return entry
+
+    def invalidate(self, path_prefix: str, user_id):
+        """Drop a user's cached responses under a path after they change data there"""
+        stale = [key for key in self.entries if key[0].startswith(path_prefix) and key[2] == user_id]
+        for key in stale:
+            self._remove(key)
+
+    def _remove(self, key):
+        entry = self.entries.pop(key)
+        self.bytes -= len(entry.body)
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "entries": len(self.entries),
+            "bytes": self.bytes,
+            "max_bytes": self.max_bytes,
+            "hits": self.hits,
+            "misses": self.misses,
+            "not_modified": self.not_modified,
+            "evictions": self.evictions,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+        }
@@ -0,0 +1,232 @@
+"""
+Retries and hedged requests for idempotent proxied calls.
+
+GET, HEAD and OPTIONS requests that fail to connect, lose their connection
+or get a 502/503/504 are retried on another instance where there is one.
+For services that opt in, a request still waiting after the service's p95
+latency gets a second (hedged) attempt, and the first good response wins.
+
+Every retry or hedge draws from a shared budget. The budget refills with a
+fraction of normal requests plus a small floor per second, so retries can
+never multiply the load on a backend that is already failing. Read timeouts
+are not retried, since that would double an already long wait. Hedging is
+how slow attempts get a second chance.
+
+Attempts share the request's deadline rather than each getting the full
+timeout, and no retry or hedge is started once too little of it is left to
+be worth the call.
+"""
+import asyncio
+import random
+import time
+from collections import deque
+
+import httpx
+
+IDEMPOTENT_METHODS = frozenset({"GET", "HEAD", "OPTIONS"})
+RETRYABLE_STATUSES = frozenset({502, 503, 504})
+RETRYABLE_ERRORS = (httpx.ConnectError, httpx.ConnectTimeout, httpx.RemoteProtocolError,
+                    httpx.ReadError, httpx.WriteError)
+
+
+class RetryBudget:
+    """Token bucket: each request adds `ratio` tokens and each retry or hedge spends one"""
+
+    def __init__(self, ratio: float = 0.2, min_per_second: float = 5.0, window: float = 10.0):
+        self.ratio = ratio
+        self.min_per_second = min_per_second
+        self.capacity = max(10.0, min_per_second * window)
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self.spent = 0
+        self.exhausted = 0
+
+    def deposit(self):
+        self.tokens = min(self.capacity, self.tokens + self.ratio)
+
+    def withdraw(self) -> bool:
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.min_per_second)
+        self.updated = now
+        if self.tokens < 1.0:
+            self.exhausted += 1
+            return False
+        self.tokens -= 1.0
+        self.spent += 1
+        return True
+
+    def stats(self) -> dict:
+        return {
+            "tokens": round(self.tokens, 2),
+            "capacity": self.capacity,
+            "spent": self.spent,
+            "exhausted": self.exhausted,
+        }
+
+
+class LatencyTracker:
+    """p95 of recent attempt latencies, recomputed every `refresh` samples"""
+
+    def __init__(self, size: int = 500, refresh: int = 50, min_samples: int = 20):
+        self.samples = deque(maxlen=size)
+        self.refresh = refresh
+        self.min_samples = min_samples
+        self.since_refresh = 0
+        self.p95 = None  # seconds, None until there are enough samples
+
+    def observe(self, seconds: float):
+        self.samples.append(seconds)
+        self.since_refresh += 1
+        if len(self.samples) >= self.min_samples and (self.p95 is None or self.since_refresh >= self.refresh):
+            ordered = sorted(self.samples)
+            self.p95 = ordered[int(0.95 * (len(ordered) - 1))]
+            self.since_refresh = 0
+
+
+class RetryPolicy:
+    """
+    Sends idempotent requests with retries and optional hedging.
+
+    `attempts` counts the first try, so 1 disables both retries and hedges.
+    `backoff` is the largest random delay before a retry, in seconds.
+    `min_attempt_time` is the least time before the deadline, in seconds,
+    that a retry or hedge is started with.
+    """
+
+    def __init__(self, upstreams, attempts: int = 2, budget: RetryBudget = None,
+                 backoff: float = 0.05, hedge_services=(), hedge_min_delay: float = 0.01,
+                 min_attempt_time: float = 0.1):
+        self.upstreams = upstreams
+        self.attempts = attempts
+        self.budget = budget or RetryBudget()
+        self.backoff = backoff
+        self.hedge_services = frozenset(hedge_services)
+        self.hedge_min_delay = hedge_min_delay
+        self.min_attempt_time = min_attempt_time
+        self.latency = {service: LatencyTracker() for service in upstreams.instances}
+        self.counts = {
+            service: {"retries": 0, "hedges": 0, "hedge_wins": 0, "budget_exhausted": 0, "out_of_time": 0}
+            for service in upstreams.instances
+        }
+
+    def hedge_delay(self, service: str):
+        """Seconds to wait before hedging a request to `service`, or None to not hedge"""
+        p95 = self.latency[service].p95
+        if service not in self.hedge_services or p95 is None:
+            return None
+        return max(p95, self.hedge_min_delay)
+
+    def has_time(self, deadline) -> bool:
+        """Whether enough is left before `deadline` (Unix time, or None for none) for another attempt"""
+        return deadline is None or deadline - time.time() >= self.min_attempt_time
+
+    async def send(self, service: str, client: httpx.AsyncClient, build, stream: bool, deadline: float = None):
+        """
+        Send `build(instance)` until an attempt succeeds or attempts, budget or
+        time before `deadline` run out. Returns (response, instance), where the
+        caller releases the instance. The last bad response is returned as is,
+        and if every attempt raised, the last error is re-raised.
+        """
+        counts = self.counts[service]
+        hedge_delay = self.hedge_delay(service)
+        self.budget.deposit()
+
+        pending = {}  # attempt task -> (instance, started)
+        tried = []
+        hedges = set()
+        failure = None  # (response or error, instance) of the latest failed attempt
+        first_started = time.perf_counter()
+
+        def launch():
+            instance = self.upstreams.pick(service, exclude=tried)
+            tried.append(instance)
+            task = asyncio.ensure_future(client.send(build(instance), stream=stream))
+            pending[task] = (instance, time.perf_counter())
+            return task
+
+        launch()
+        try:
+            while pending:
+                timeout = None
+                if hedge_delay is not None and not hedges and len(tried) < self.attempts:
+                    timeout = max(0.0, first_started + hedge_delay - time.perf_counter())
+                done, _ = await asyncio.wait(pending, timeout=timeout, return_when=asyncio.FIRST_COMPLETED)
+
+                if not done:
+                    # Still waiting after the p95 - race a second attempt
+                    if not self.has_time(deadline):
+                        counts["out_of_time"] += 1
+                        hedge_delay = None
+                    elif self.budget.withdraw():
+                        counts["hedges"] += 1
+                        hedges.add(launch())
+                    else:
+                        counts["budget_exhausted"] += 1
+                        hedge_delay = None
+                    continue
+
+                for task in done:
+                    instance, started = pending.pop(task)
+                    error = task.exception()
+                    outcome = error or task.result()
+                    if error is None and outcome.status_code not in RETRYABLE_STATUSES:
+                        self.latency[service].observe(time.perf_counter() - started)
+                        if task in hedges:
+                            counts["hedge_wins"] += 1
+                        return outcome, instance
+                    if error is not None and not isinstance(error, RETRYABLE_ERRORS):
+                        self.upstreams.release(service, instance, False)
+                        raise error
+                    if failure is not None:
+                        self._discard(service, *failure)
+                    failure = (outcome, instance)
+
+                if not pending and len(tried) < self.attempts:
+                    if not self.has_time(deadline):
+                        counts["out_of_time"] += 1
+                    elif self.budget.withdraw():
+                        counts["retries"] += 1
+                        await asyncio.sleep(random.uniform(0, self.backoff))
+                        launch()
+                    else:
+                        counts["budget_exhausted"] += 1
+
+            outcome, instance = failure
+            failure = None
+            if isinstance(outcome, httpx.Response):
+                return outcome, instance
+            self.upstreams.release(service, instance, False)
+            raise outcome
+        finally:
+            if failure is not None:
+                self._discard(service, *failure)
+            # Losing hedges, or every attempt if the caller went away
+            for task, (instance, _) in pending.items():
+                task.cancel()
+                task.add_done_callback(lambda done, instance=instance: self._abandoned(service, done, instance))
+
+    def _discard(self, service: str, outcome, instance):
+        self.upstreams.release(service, instance, False)
+        if isinstance(outcome, httpx.Response):
+            asyncio.ensure_future(outcome.aclose())
+
+    def _abandoned(self, service: str, task: asyncio.Task, instance):
+        if task.cancelled():
+            # Cut short by us, which says nothing about the instance
+            self.upstreams.release(service, instance, None)
+            return
+        error = task.exception()
+        self.upstreams.release(service, instance, error is None)
+        if error is None:
+            # Finished before the cancel landed - hand its connection back
+            asyncio.ensure_future(task.result().aclose())
+
+    def stats(self) -> dict:
+        return {
+            "attempts": self.attempts,
+            "budget": self.budget.stats(),
+            "services": {
+                service: dict(counts, hedge_delay=self.hedge_delay(service))
+                for service, counts in self.counts.items()
+            },
+        }
@@ -0,0 +1,42 @@
+"""
+Request coalescing (single-flight) for the gateway.
+
+When an identical request is already on its way to a backend, later callers
+wait for that one upstream call instead of sending duplicates. The upstream
+call runs in its own task, so a caller that disconnects does not cancel it
+for the others waiting on it.
+"""
+import asyncio
+
+
+class SingleFlight:
+    def __init__(self):
+        self.calls = {}
+        self.originated = 0
+        self.coalesced = 0
+
+    async def do(self, key, fn):
+        """Run `fn()` once for concurrent callers sharing `key` and return its result to all"""
+        task = self.calls.get(key)
+        if task is None:
+            self.originated += 1
+            task = asyncio.ensure_future(fn())
+            self.calls[key] = task
+            task.add_done_callback(lambda done: self._finished(key, done))
+        else:
+            self.coalesced += 1
+        return await asyncio.shield(task)
+
+    def _finished(self, key, task: asyncio.Task):
+        if self.calls.get(key) is task:
+            del self.calls[key]
+        # Mark the exception as retrieved in case every caller went away
+        if not task.cancelled():
+            task.exception()
+
+    def stats(self) -> dict:
+        return {
+            "originated": self.originated,
+            "coalesced": self.coalesced,
+            "in_flight": len(self.calls),
+        }
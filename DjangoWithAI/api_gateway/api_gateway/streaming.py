@@ -0,0 +1,202 @@
+"""
+Streaming helpers for the gateway proxy.
+
+Request bodies are piped to the backend as they arrive and backend responses
+are relayed chunk by chunk, so gateway memory stays flat regardless of the
+payload size. Bodies are counted as they pass, and one that exceeds its
+route's limit is cut off at that point.
+
+Live responses (Server-Sent Events and chunked bodies without a length) are
+always relayed as they arrive, even where the gateway otherwise buffers, so
+time-to-first-byte for streamed AI output is set by the backend. Quiet event
+streams get keep-alive comments so idle proxies do not drop them.
+"""
+import asyncio
+import re
+
+from fastapi import Request
+from fastapi.responses import StreamingResponse
+import httpx
+
+
+# Headers that describe a single connection and must not be forwarded
+HOP_BY_HOP_HEADERS = {
+    "connection",
+    "keep-alive",
+    "proxy-authenticate",
+    "proxy-authorization",
+    "te",
+    "trailer",
+    "transfer-encoding",
+    "upgrade",
+}
+
+
+# SSE comment line - ignored by EventSource clients
+KEEPALIVE_COMMENT = b": keep-alive\n\n"
+
+
+SIZE_UNITS = {"": 1, "B": 1, "K": 1024, "KB": 1024, "M": 1024 ** 2, "MB": 1024 ** 2, "G": 1024 ** 3, "GB": 1024 ** 3}
+
+
+def parse_size(value: str) -> int:
+    """Parse '4096', '64KB' or '50MB' into bytes"""
+    match = re.fullmatch(r"\s*(\d+)\s*([KMG]?B?)\s*", value.upper())
+    if match is None:
+        raise ValueError(f"Invalid size: {value!r}")
+    return int(match.group(1)) * SIZE_UNITS[match.group(2)]
+
+
+def parse_route_sizes(value: str) -> dict:
+    """Parse '/api/auth/=64KB,/api/pdf/=50MB' into {prefix: bytes}"""
+    sizes = {}
+    for item in filter(None, (part.strip() for part in value.split(","))):
+        prefix, size = item.split("=", 1)
+        sizes[prefix.strip()] = parse_size(size)
+    return sizes
+
+
+class BodyTooLarge(Exception):
+    """Raised when a request body exceeds the configured maximum size"""
+
+    def __init__(self, limit: int):
+        self.limit = limit
+        super().__init__(f"Request body exceeds {limit} bytes")
+
+
+def declared_length(headers):
+    """Content-Length sent by the client, or None if absent or malformed"""
+    value = headers.get("content-length")
+    if value is None or not value.isdigit():
+        return None
+    return int(value)
+
+
+def has_body(headers) -> bool:
+    """Whether the client announced a request body"""
+    if "transfer-encoding" in headers:
+        return True
+    return bool(declared_length(headers))
+
+
+async def limited_body(request: Request, max_bytes: int, on_done=None):
+    """
+    Yield the request body chunk by chunk, aborting once it exceeds max_bytes.
+    Calls on_done(received_bytes) when the body has been read.
+    """
+    received = 0
+    async for chunk in request.stream():
+        received += len(chunk)
+        if received > max_bytes:
+            raise BodyTooLarge(max_bytes)
+        if chunk:
+            yield chunk
+    if on_done is not None:
+        on_done(received)
+
+
+async def read_body(request: Request, max_bytes: int) -> bytes:
+    """The whole request body, raising BodyTooLarge as soon as it passes max_bytes"""
+    return b"".join([chunk async for chunk in limited_body(request, max_bytes)])
+
+
+def response_headers(response: httpx.Response) -> dict:
+    """Backend response headers minus hop-by-hop headers"""
+    return {
+        key: value for key, value in response.headers.items()
+        if key.lower() not in HOP_BY_HOP_HEADERS
+    }
+
+
+class RelayResponse(StreamingResponse):
+    """
+    Relays the raw body of a streamed backend response.
+
+    The backend response is closed and on_close(ok, sent_bytes) is called
+    exactly once when the relay ends, however it ends: body done, client
+    gone mid-body, or client gone before the body started (when the body
+    generator never runs). `ok` is False only if the backend failed while
+    sending the body.
+
+    With `keepalive`, an event stream gets KEEPALIVE_COMMENT whenever the
+    backend has been quiet that many seconds. Comments only go out between
+    events, never in the middle of one.
+    """
+
+    def __init__(self, upstream: httpx.Response, on_close, keepalive: float = None, **kwargs):
+        self.upstream = upstream
+        self.on_close = on_close
+        self.ok = True
+        self.sent = 0
+        self.closed = False
+        body = self._events(keepalive) if keepalive is not None else self._body()
+        super().__init__(body, **kwargs)
+
+    async def __call__(self, scope, receive, send):
+        try:
+            await super().__call__(scope, receive, send)
+        finally:
+            await self.close()
+
+    async def close(self):
+        """Stop relaying and give back everything the upstream call holds"""
+        if self.closed:
+            return
+        self.closed = True
+        self.on_close(self.ok, self.sent)
+        try:
+            await self.body_iterator.aclose()
+        finally:
+            await self.upstream.aclose()
+
+    async def _chunks(self):
+        try:
+            async for chunk in self.upstream.aiter_raw():
+                self.sent += len(chunk)
+                yield chunk
+        except httpx.HTTPError:
+            self.ok = False
+            raise
+
+    async def _body(self):
+        async for chunk in self._chunks():
+            yield chunk
+
+    async def _events(self, keepalive: float):
+        chunks = self._chunks()
+        pending = None
+        between_events = True
+        try:
+            while True:
+                if pending is None:
+                    pending = asyncio.ensure_future(chunks.__anext__())
+                done, _ = await asyncio.wait({pending}, timeout=keepalive)
+                if not done:
+                    if between_events:
+                        yield KEEPALIVE_COMMENT
+                    continue
+                next_chunk, pending = pending, None
+                try:
+                    chunk = next_chunk.result()
+                except StopAsyncIteration:
+                    break
+                between_events = chunk.endswith((b"\n\n", b"\r\n\r\n", b"\r\r"))
+                yield chunk
+        finally:
+            if pending is not None:
+                pending.cancel()
+                try:
+                    await pending
+                except (asyncio.CancelledError, Exception):
+                    pass
+
+
+def is_event_stream(headers) -> bool:
+    return headers.get("content-type", "").split(";", 1)[0].strip().lower() == "text/event-stream"
+
+
+def is_live_stream(headers) -> bool:
+    """An event stream, or a chunked body the backend is still producing"""
+    if is_event_stream(headers):
+        return True
+    return "chunked" in headers.get("transfer-encoding", "").lower() and "content-length" not in headers
@@ -0,0 +1,173 @@
+"""
+Pooled HTTP clients and instance selection for the backend microservices.
+
+The gateway keeps one long-lived httpx.AsyncClient per service so proxied
+requests reuse keep-alive connections instead of opening a new TCP
+connection every time. Clients are opened at startup and closed at shutdown.
+
+A service can run as several instances. Each request goes to the instance
+with the fewest outstanding requests, picked either from all instances or from
+two random ones (power of two choices). An instance that keeps failing is
+ejected for a while (passive outlier detection).
+"""
+import os
+import random
+import time
+
+import httpx
+
+
+# Default pool limits - override globally with GATEWAY_POOL_* or per service
+# with GATEWAY_POOL_<SERVICE>_* (e.g. GATEWAY_POOL_PDF_MAX_CONNECTIONS=20)
+POOL_MAX_CONNECTIONS = int(os.getenv("GATEWAY_POOL_MAX_CONNECTIONS", "100"))
+POOL_MAX_KEEPALIVE = int(os.getenv("GATEWAY_POOL_MAX_KEEPALIVE", "20"))
+POOL_KEEPALIVE_EXPIRY = float(os.getenv("GATEWAY_POOL_KEEPALIVE_EXPIRY", "30"))
+UPSTREAM_TIMEOUT = float(os.getenv("GATEWAY_UPSTREAM_TIMEOUT", "30"))
+
+# Outlier ejection - consecutive failures before an instance is ejected, how
+# long it stays out (multiplied by how often it was ejected) and the largest
+# share of a service's instances that may be ejected at once
+OUTLIER_CONSECUTIVE_FAILURES = int(os.getenv("GATEWAY_OUTLIER_CONSECUTIVE_FAILURES", "5"))
+OUTLIER_BASE_EJECTION = float(os.getenv("GATEWAY_OUTLIER_BASE_EJECTION", "30"))  # seconds
+OUTLIER_MAX_EJECTION = float(os.getenv("GATEWAY_OUTLIER_MAX_EJECTION", "300"))   # seconds
+OUTLIER_MAX_EJECTED_PERCENT = float(os.getenv("GATEWAY_OUTLIER_MAX_EJECTED_PERCENT", "50"))
+
+
+def limits_for(service: str) -> httpx.Limits:
+    """Build connection pool limits for a service from the environment"""
+    prefix = f"GATEWAY_POOL_{service.upper()}_"
+    return httpx.Limits(
+        max_connections=int(os.getenv(prefix + "MAX_CONNECTIONS", POOL_MAX_CONNECTIONS)),
+        max_keepalive_connections=int(os.getenv(prefix + "MAX_KEEPALIVE", POOL_MAX_KEEPALIVE)),
+        keepalive_expiry=float(os.getenv(prefix + "KEEPALIVE_EXPIRY", POOL_KEEPALIVE_EXPIRY)),
+    )
+
+
+class Instance:
+    """One backend process serving a service"""
+
+    __slots__ = ("url", "outstanding", "requests", "failures", "ejections",
+                 "ejected_until", "healthy")
+
+    def __init__(self, url: str):
+        self.url = url.rstrip("/")
+        self.outstanding = 0
+        self.requests = 0
+        self.failures = 0         # consecutive failed requests
+        self.ejections = 0
+        self.ejected_until = 0.0
+        self.healthy = True       # last verdict of the health prober
+
+    def available(self, now: float) -> bool:
+        return self.healthy and self.ejected_until <= now
+
+    def stats(self) -> dict:
+        return {
+            "url": self.url,
+            "outstanding": self.outstanding,
+            "requests": self.requests,
+            "consecutive_failures": self.failures,
+            "ejections": self.ejections,
+            "ejected": self.ejected_until > time.monotonic(),
+            "healthy": self.healthy,
+        }
+
+
+class UpstreamPool:
+    """One keep-alive httpx.AsyncClient and a set of instances per backend service"""
+
+    def __init__(self, service_instances: dict, timeout: float = UPSTREAM_TIMEOUT,
+                 policy: str = "p2c"):
+        self.instances = {
+            service: [Instance(url) for url in urls]
+            for service, urls in service_instances.items()
+        }
+        self.timeout = timeout
+        self.policy = policy  # "p2c" or "least_outstanding"
+        self.clients = {}
+
+    async def start(self):
+        for service in self.instances:
+            self.clients[service] = httpx.AsyncClient(
+                timeout=self.timeout,
+                limits=limits_for(service),
+            )
+
+    async def close(self):
+        for client in self.clients.values():
+            await client.aclose()
+        self.clients.clear()
+
+    def client(self, service: str) -> httpx.AsyncClient:
+        return self.clients[service]
+
+    def pick(self, service: str, exclude=()) -> Instance:
+        """
+        Choose an instance for the next request and count it as outstanding.
+        Instances in `exclude` (already tried by a retry) are avoided if possible.
+        """
+        instances = self.instances[service]
+        if len(instances) == 1:
+            instance = instances[0]
+        else:
+            now = time.monotonic()
+            candidates = [i for i in instances if i.available(now)]
+            if exclude:
+                candidates = [i for i in candidates if i not in exclude] or candidates
+            if not candidates:
+                # Everything is ejected or down - spreading load beats refusing it
+                candidates = instances
+            if self.policy == "p2c" and len(candidates) > 2:
+                candidates = random.sample(candidates, 2)
+            # Ties go to the instance that has served fewer requests overall
+            instance = min(candidates, key=lambda i: (i.outstanding, i.requests))
+
+        instance.outstanding += 1
+        instance.requests += 1
+        return instance
+
+    def release(self, service: str, instance: Instance, ok):
+        """
+        Finish a request picked with pick() and feed outlier detection.
+        ok=None is a call abandoned before it had an outcome, which counts for neither.
+        """
+        instance.outstanding -= 1
+        if ok is None:
+            return
+        if ok:
+            instance.failures = 0
+            return
+
+        instance.failures += 1
+        if instance.failures >= OUTLIER_CONSECUTIVE_FAILURES:
+            self._eject(service, instance)
+
+    def _eject(self, service: str, instance: Instance):
+        now = time.monotonic()
+        instances = self.instances[service]
+        ejected = sum(1 for i in instances if i.ejected_until > now)
+        if (ejected + 1) * 100 > len(instances) * OUTLIER_MAX_EJECTED_PERCENT:
+            return
+        instance.ejections += 1
+        instance.failures = 0
+        instance.ejected_until = now + min(
+            OUTLIER_BASE_EJECTION * instance.ejections, OUTLIER_MAX_EJECTION
+        )
+
+    def stats(self) -> dict:
+        """Connection pool usage and instance state, per service"""
+        stats = {}
+        for service, client in self.clients.items():
+            # httpx does not expose pool state publicly, so read it from httpcore
+            pool = getattr(client._transport, "_pool", None)
+            connections = getattr(pool, "connections", [])
+            requests = getattr(pool, "_requests", [])
+            idle = sum(1 for conn in connections if conn.is_idle())
+            stats[service] = {
+                "in_use": len(connections) - idle,
+                "idle": idle,
+                "waiting": sum(1 for req in requests if req.is_queued()),
+                "max_connections": getattr(pool, "_max_connections", None),
+                "instances": [instance.stats() for instance in self.instances[service]],
+            }
+        return stats
@@ -0,0 +1,99 @@
+"""
+Benchmark: requests per second through the gateway on a trivial proxied
+route, with the auth/rate-limit checks behind Starlette's BaseHTTPMiddleware
+(the old @app.middleware("http") hook) versus the raw ASGI GatewayMiddleware.
+
+Everything runs in-process: the gateway is driven through httpx's ASGI
+transport and the backend is a one-line stub app, so the numbers reflect
+gateway overhead only. Run from DjangoWithAI/api_gateway:
+
+    python benchmarks/bench_middleware.py --concurrency 32 --seconds 5
+"""
+import argparse
+import asyncio
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "api_gateway"))
+
+import httpx  # noqa: E402
+from fastapi import FastAPI  # noqa: E402
+from fastapi.middleware.cors import CORSMiddleware  # noqa: E402
+from jose import jwt  # noqa: E402
+from starlette.applications import Starlette  # noqa: E402
+from starlette.middleware.base import BaseHTTPMiddleware  # noqa: E402
+
+import main  # noqa: E402
+from ratelimit import RateLimit  # noqa: E402
+
+# A backend that answers instantly
+backend = FastAPI()
+
+
+@backend.get("/api/content/ping")
+def ping():
+    return {"ok": True}
+
+
+def base_http_middleware_app():
+    """The gateway routes wrapped the old way, in BaseHTTPMiddleware"""
+
+    async def dispatch(request, call_next):
+        response = await main.check_request(request.scope)
+        if response is not None:
+            return response
+        return await call_next(request)
+
+    app = Starlette(routes=main.app.routes)
+    app.add_middleware(CORSMiddleware, allow_origins=["http://localhost:5173"])
+    app.add_middleware(BaseHTTPMiddleware, dispatch=dispatch)
+    return app
+
+
+async def drive(app, concurrency: int, seconds: float, headers: dict) -> float:
+    transport = httpx.ASGITransport(app=app, client=("10.0.0.1", 1234))
+    async with httpx.AsyncClient(transport=transport, base_url="http://gateway") as client:
+        deadline = time.perf_counter() + seconds
+        done = 0
+
+        async def worker():
+            nonlocal done
+            while time.perf_counter() < deadline:
+                response = await client.get("/api/content/ping", headers=headers)
+                assert response.status_code == 200, response.text
+                done += 1
+
+        started = time.perf_counter()
+        await asyncio.gather(*(worker() for _ in range(concurrency)))
+        return done / (time.perf_counter() - started)
+
+
+async def run(concurrency: int, seconds: float):
+    # Keep rate limiting in the path without ever tripping it
+    main.RATE_LIMIT = RateLimit(10 ** 9, 60)
+    token = jwt.encode({"user_id": 1, "exp": time.time() + 3600}, main.SECRET_KEY, algorithm=main.ALGORITHM)
+    headers = {"Authorization": f"Bearer {token}"}
+
+    async with main.lifespan(main.app):
+        # Route every service to the in-process backend
+        for service in main.upstreams.clients:
+            await main.upstreams.clients[service].aclose()
+            main.upstreams.clients[service] = httpx.AsyncClient(transport=httpx.ASGITransport(app=backend))
+
+        results = {}
+        for name, app in (("BaseHTTPMiddleware", base_http_middleware_app()), ("raw ASGI", main.app)):
+            await drive(app, concurrency, 0.5, headers)  # warm-up
+            results[name] = await drive(app, concurrency, seconds, headers)
+            print(f"{name:>20}: {results[name]:8.0f} req/s")
+
+        before, after = results["BaseHTTPMiddleware"], results["raw ASGI"]
+        print(f"{'change':>20}: {(after / before - 1) * 100:+7.1f}%")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Gateway middleware throughput benchmark")
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument("--seconds", type=float, default=5.0)
+    args = parser.parse_args()
+    asyncio.run(run(args.concurrency, args.seconds))
@@ -0,0 +1,90 @@
+"""
+Micro-benchmark: gateway rate limiter cost per request as the number of
+distinct clients grows.
+
+Compares the old per-IP timestamp list limiter with the GCRA limiter in
+api_gateway/ratelimit.py, and with a GCRA limiter whose table holds a tenth
+of the clients, so most new clients first evict another. Run from
+DjangoWithAI/api_gateway:
+
+    python benchmarks/bench_ratelimit.py
+"""
+import os
+import random
+import sys
+import time
+import tracemalloc
+from collections import defaultdict
+from functools import partial
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "api_gateway"))
+
+from ratelimit import RateLimit, RateLimiter  # noqa: E402
+
+REQUESTS = 100
+WINDOW = 60
+CALLS = 300_000
+
+
+def timestamp_list_limiter():
+    """The previous limiter: a list of request timestamps per client"""
+    storage = defaultdict(list)
+
+    def check(client_id, now):
+        window_start = now - WINDOW
+        storage[client_id] = [t for t in storage[client_id] if t > window_start]
+        if len(storage[client_id]) >= REQUESTS:
+            return False
+        storage[client_id].append(now)
+        return True
+
+    return check
+
+
+def gcra_limiter(max_clients: int = 1_000_000):
+    limiter = RateLimiter(max_clients=max_clients)
+    limit = RateLimit(REQUESTS, WINDOW)
+
+    def check(client_id, now):
+        return limiter.check(client_id, limit, now)[0]
+
+    return check
+
+
+def run(make_limiter, clients: int) -> tuple:
+    keys = [f"ip:10.{i >> 16 & 255}.{i >> 8 & 255}.{i & 255}" for i in range(clients)]
+    # Hot clients send most of the traffic, like a real gateway
+    order = [keys[min(int(random.paretovariate(1.2)) - 1, clients - 1)] if i % 2 else keys[i % clients]
+             for i in range(CALLS)]
+
+    now = time.monotonic()
+
+    # Timing pass
+    check = make_limiter()
+    start = time.perf_counter()
+    for i, key in enumerate(order):
+        check(key, now + i * 0.0002)
+    elapsed = time.perf_counter() - start
+
+    # Memory pass (tracemalloc slows everything down, so it runs separately)
+    tracemalloc.start()
+    check = make_limiter()
+    for i, key in enumerate(order):
+        check(key, now + i * 0.0002)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return elapsed / CALLS * 1e9, peak / 1024 / 1024
+
+
+def main():
+    random.seed(42)
+    print(f"{'clients':>9} {'limiter':>15} {'ns/request':>11} {'peak MiB':>9}")
+    for clients in (1_000, 10_000, 100_000):
+        for name, make_limiter in (("timestamp-list", timestamp_list_limiter), ("gcra", gcra_limiter),
+                                   ("gcra-full", partial(gcra_limiter, clients // 10))):
+            ns, mib = run(make_limiter, clients)
+            print(f"{clients:>9} {name:>15} {ns:>11.0f} {mib:>9.1f}")
+
+
+if __name__ == "__main__":
+    main()
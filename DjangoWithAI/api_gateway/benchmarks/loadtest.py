@@ -0,0 +1,225 @@
+"""
+Gateway load test against stub backends.
+
+Drives the gateway at a fixed concurrency for a fixed time and reports
+requests per second, p50/p95/p99 latency and peak memory. Two modes:
+
+- inprocess: the gateway and stub backends run in this process and are
+  connected by httpx's ASGI transport. No ports are used, so it is quick
+  and repeatable, and it isolates the cost of proxy() and the middleware.
+- live: starts a stub server on every SERVICE_URLS port and the gateway
+  under uvicorn, then drives it over real sockets. Memory is the gateway
+  process's peak RSS.
+
+Save a run with --json and compare later runs against it with --baseline to
+catch regressions (exit code 1 if throughput or p99 is worse than allowed).
+Run from DjangoWithAI/api_gateway:
+
+    python benchmarks/loadtest.py --mode inprocess --concurrency 64 --duration 10 \\
+        --payload-bytes 4096 --latency-ms 5 --json baseline.json
+    python benchmarks/loadtest.py --mode inprocess --baseline baseline.json
+"""
+import argparse
+import asyncio
+import json
+import os
+import subprocess
+import sys
+import time
+from urllib.parse import urlparse
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+GATEWAY_DIR = os.path.join(os.path.dirname(HERE), "api_gateway")
+sys.path.insert(0, GATEWAY_DIR)
+sys.path.insert(0, HERE)
+
+import httpx  # noqa: E402
+from jose import jwt  # noqa: E402
+
+from stubs import create_stub_app  # noqa: E402
+
+
+def peak_rss_mb(pid: int = None):
+    """Peak resident memory of a process in MiB (Linux), or None if unknown"""
+    try:
+        with open(f"/proc/{pid or 'self'}/status") as status:
+            for line in status:
+                if line.startswith("VmHWM:"):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    return None
+
+
+def percentile(sorted_values: list, fraction: float) -> float:
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, int(round(fraction * (len(sorted_values) - 1))))
+    return sorted_values[index]
+
+
+async def drive(client: httpx.AsyncClient, args, headers: dict, duration: float) -> dict:
+    """Keep `concurrency` requests in flight for `duration` seconds"""
+    latencies = []
+    errors = 0
+    body = b"x" * args.request_bytes if args.method != "GET" else None
+    deadline = time.perf_counter() + duration
+
+    async def worker():
+        nonlocal errors
+        while time.perf_counter() < deadline:
+            started = time.perf_counter()
+            try:
+                response = await client.request(args.method, args.path, headers=headers, content=body)
+                await response.aread()
+                if response.status_code >= 400:
+                    errors += 1
+            except httpx.HTTPError:
+                errors += 1
+            latencies.append(time.perf_counter() - started)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(args.concurrency)))
+    elapsed = time.perf_counter() - started
+
+    latencies.sort()
+    return {
+        "requests": len(latencies),
+        "errors": errors,
+        "rps": len(latencies) / elapsed,
+        "p50_ms": percentile(latencies, 0.50) * 1000,
+        "p95_ms": percentile(latencies, 0.95) * 1000,
+        "p99_ms": percentile(latencies, 0.99) * 1000,
+    }
+
+
+def auth_headers(secret_key: str) -> dict:
+    token = jwt.encode({"user_id": 1, "email": "load@test", "exp": time.time() + 3600}, secret_key, algorithm="HS256")
+    return {"Authorization": f"Bearer {token}"}
+
+
+async def run_inprocess(args) -> dict:
+    os.environ.setdefault("GATEWAY_RATE_LIMIT_REQUESTS", str(10 ** 9))
+    import main
+
+    stub = create_stub_app(args.payload_bytes, args.latency_ms)
+    async with main.lifespan(main.app):
+        # Point every service's pooled client at the in-process stub
+        for service in list(main.upstreams.clients):
+            await main.upstreams.clients[service].aclose()
+            main.upstreams.clients[service] = httpx.AsyncClient(transport=httpx.ASGITransport(app=stub))
+
+        transport = httpx.ASGITransport(app=main.app, client=("10.0.0.1", 1234))
+        async with httpx.AsyncClient(transport=transport, base_url="http://gateway") as client:
+            headers = auth_headers(main.SECRET_KEY)
+            await drive(client, args, headers, min(1.0, args.duration / 5))  # warm-up
+            result = await drive(client, args, headers, args.duration)
+    result["peak_rss_mb"] = peak_rss_mb()
+    return result
+
+
+async def wait_until_up(url: str, timeout: float = 15.0):
+    deadline = time.monotonic() + timeout
+    async with httpx.AsyncClient() as client:
+        while time.monotonic() < deadline:
+            try:
+                await client.get(url, timeout=1.0)
+                return
+            except httpx.HTTPError:
+                await asyncio.sleep(0.2)
+    raise RuntimeError(f"{url} did not come up within {timeout}s")
+
+
+async def run_live(args) -> dict:
+    import main
+
+    stub_env = dict(os.environ, STUB_PAYLOAD_BYTES=str(args.payload_bytes), STUB_LATENCY_MS=str(args.latency_ms))
+    gateway_env = dict(os.environ, GATEWAY_RATE_LIMIT_REQUESTS=str(10 ** 9))
+    processes = []
+    try:
+        ports = sorted({urlparse(url).port for url in main.SERVICE_URLS.values()})
+        for port in ports:
+            processes.append(subprocess.Popen(
+                [sys.executable, "-m", "uvicorn", "stubs:app", "--port", str(port), "--log-level", "warning"],
+                cwd=HERE, env=stub_env
+            ))
+        gateway = subprocess.Popen(
+            [sys.executable, "-m", "uvicorn", "main:app", "--port", str(args.gateway_port),
+             "--log-level", "warning", "--workers", str(args.workers)],
+            cwd=GATEWAY_DIR, env=gateway_env
+        )
+        processes.append(gateway)
+
+        for port in ports:
+            await wait_until_up(f"http://127.0.0.1:{port}/health")
+        base_url = f"http://127.0.0.1:{args.gateway_port}"
+        await wait_until_up(f"{base_url}/")
+
+        limits = httpx.Limits(max_connections=args.concurrency, max_keepalive_connections=args.concurrency)
+        async with httpx.AsyncClient(base_url=base_url, limits=limits, timeout=60.0) as client:
+            headers = auth_headers(main.SECRET_KEY)
+            await drive(client, args, headers, min(1.0, args.duration / 5))  # warm-up
+            result = await drive(client, args, headers, args.duration)
+        result["peak_rss_mb"] = peak_rss_mb(gateway.pid)
+        return result
+    finally:
+        for process in processes:
+            process.terminate()
+        for process in processes:
+            process.wait()
+
+
+def compare(result: dict, baseline: dict, tolerance: float) -> list:
+    """Regressions of this run against a saved baseline"""
+    problems = []
+    if result["rps"] < baseline["rps"] * (1 - tolerance):
+        problems.append(f"throughput {result['rps']:.0f} req/s is below baseline {baseline['rps']:.0f} req/s")
+    if result["p99_ms"] > baseline["p99_ms"] * (1 + tolerance):
+        problems.append(f"p99 {result['p99_ms']:.1f} ms is above baseline {baseline['p99_ms']:.1f} ms")
+    return problems
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Gateway load test against stub backends")
+    parser.add_argument("--mode", choices=["inprocess", "live"], default="inprocess")
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument("--duration", type=float, default=10.0, help="seconds")
+    parser.add_argument("--method", default="GET")
+    parser.add_argument("--path", default="/api/content/items/")
+    parser.add_argument("--payload-bytes", type=int, default=1024, help="stub response size")
+    parser.add_argument("--latency-ms", type=float, default=0.0, help="stub response delay")
+    parser.add_argument("--request-bytes", type=int, default=1024, help="request body size for non-GET")
+    parser.add_argument("--gateway-port", type=int, default=8080)
+    parser.add_argument("--workers", type=int, default=1, help="gateway uvicorn workers (live mode)")
+    parser.add_argument("--json", help="write the result to this file")
+    parser.add_argument("--baseline", help="compare against a result saved with --json")
+    parser.add_argument("--tolerance", type=float, default=0.10, help="allowed regression, as a fraction")
+    args = parser.parse_args()
+
+    runner = run_inprocess if args.mode == "inprocess" else run_live
+    result = asyncio.run(runner(args))
+    result["config"] = {key: value for key, value in vars(args).items() if key not in ("json", "baseline")}
+
+    memory = f"{result['peak_rss_mb']:.0f} MiB" if result["peak_rss_mb"] else "n/a"
+    print(f"mode={args.mode} concurrency={args.concurrency} duration={args.duration}s "
+          f"payload={args.payload_bytes}B latency={args.latency_ms}ms")
+    print(f"  requests  {result['requests']} ({result['errors']} errors)")
+    print(f"  rps       {result['rps']:.0f}")
+    print(f"  p50/p95/p99  {result['p50_ms']:.2f} / {result['p95_ms']:.2f} / {result['p99_ms']:.2f} ms")
+    print(f"  peak RSS  {memory}")
+
+    if args.json:
+        with open(args.json, "w") as output:
+            json.dump(result, output, indent=2)
+
+    if args.baseline:
+        with open(args.baseline) as saved:
+            problems = compare(result, json.load(saved), args.tolerance)
+        for problem in problems:
+            print(f"REGRESSION: {problem}")
+        if problems:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,106 @@
+"""
+Tiny in-process stand-in for Redis, for trying the gateway's redis rate-limit
+backend without a Redis server. Supports only the commands the gateway uses
+(PING, AUTH, SELECT, GET, SET with PX/EX/NX, INCR, INCRBY, DEL).
+
+    python benchmarks/redis_standin.py --port 6379
+    GATEWAY_RATE_LIMIT_BACKEND=redis python api_gateway/main.py
+"""
+import argparse
+import asyncio
+import time
+
+
+class RedisStandin:
+    def __init__(self):
+        self.data = {}  # key -> (value, expires_at or None)
+
+    def _get(self, key):
+        item = self.data.get(key)
+        if item is None:
+            return None
+        value, expires_at = item
+        if expires_at is not None and expires_at <= time.monotonic():
+            del self.data[key]
+            return None
+        return item
+
+    def run(self, args: list):
+        command = args[0].upper()
+        if command == b"PING":
+            return "+PONG"
+        if command in (b"AUTH", b"SELECT"):
+            return "+OK"
+        if command == b"GET":
+            item = self._get(args[1])
+            return None if item is None else item[0]
+        if command == b"SET":
+            key, value, options = args[1], args[2], [arg.upper() for arg in args[3:]]
+            expires_at = None
+            if b"PX" in options:
+                expires_at = time.monotonic() + int(args[3 + options.index(b"PX") + 1]) / 1000
+            if b"EX" in options:
+                expires_at = time.monotonic() + int(args[3 + options.index(b"EX") + 1])
+            if b"NX" in options and self._get(key) is not None:
+                return None
+            self.data[key] = (value, expires_at)
+            return "+OK"
+        if command in (b"INCR", b"INCRBY"):
+            amount = int(args[2]) if command == b"INCRBY" else 1
+            item = self._get(args[1])
+            value, expires_at = item if item else (b"0", None)
+            value = int(value) + amount
+            self.data[args[1]] = (str(value).encode(), expires_at)
+            return value
+        if command == b"DEL":
+            return sum(1 for key in args[1:] if self.data.pop(key, None) is not None)
+        return f"-ERR unknown command '{command.decode()}'"
+
+    async def handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        try:
+            while True:
+                args = await read_command(reader)
+                if args is None:
+                    break
+                writer.write(encode_reply(self.run(args)))
+                await writer.drain()
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            writer.close()
+
+
+async def read_command(reader: asyncio.StreamReader):
+    line = await reader.readline()
+    if not line:
+        return None
+    args = []
+    for _ in range(int(line[1:-2])):
+        length = int((await reader.readline())[1:-2])
+        args.append((await reader.readexactly(length + 2))[:-2])
+    return args
+
+
+def encode_reply(reply) -> bytes:
+    if reply is None:
+        return b"$-1\r\n"
+    if isinstance(reply, int):
+        return b":%d\r\n" % reply
+    if isinstance(reply, bytes):
+        return b"$%d\r\n%s\r\n" % (len(reply), reply)
+    return reply.encode() + b"\r\n"
+
+
+async def serve(host: str, port: int):
+    server = await asyncio.start_server(RedisStandin().handle, host, port)
+    async with server:
+        await server.serve_forever()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=6379)
+    args = parser.parse_args()
+    print(f"Redis stand-in listening on {args.host}:{args.port}")
+    asyncio.run(serve(args.host, args.port))
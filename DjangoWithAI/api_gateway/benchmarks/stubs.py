@@ -0,0 +1,50 @@
+"""
+Lightweight stand-ins for the backend services, for load-testing the gateway
+without starting the Django services.
+
+Every /api/<service>/... path answers with a JSON body of a configurable size
+after a configurable delay. Defaults come from STUB_PAYLOAD_BYTES and
+STUB_LATENCY_MS, and each request can override them with ?size=<bytes> and
+?latency_ms=<ms>. Run one per SERVICE_URLS port:
+
+    STUB_PAYLOAD_BYTES=4096 python -m uvicorn stubs:app --port 8004
+"""
+import asyncio
+import os
+
+from fastapi import FastAPI, Request, Response
+
+PAYLOAD_BYTES = int(os.getenv("STUB_PAYLOAD_BYTES", "1024"))
+LATENCY_MS = float(os.getenv("STUB_LATENCY_MS", "0"))
+
+
+def create_stub_app(payload_bytes: int = PAYLOAD_BYTES, latency_ms: float = LATENCY_MS) -> FastAPI:
+    stub = FastAPI()
+    bodies = {}
+
+    def body_of(size: int) -> bytes:
+        # Bodies are built once per size, so the stub itself stays cheap
+        if size not in bodies:
+            bodies[size] = b'{"data":"' + b"x" * max(0, size - 11) + b'"}'
+        return bodies[size]
+
+    @stub.get("/health")
+    def health():
+        return {"status": "ok"}
+
+    @stub.api_route("/api/{service}/{path:path}", methods=["GET", "POST", "PUT", "PATCH", "DELETE"])
+    async def respond(service: str, path: str, request: Request):
+        latency = float(request.query_params.get("latency_ms", latency_ms))
+        size = int(request.query_params.get("size", payload_bytes))
+        if request.method != "GET":
+            # Drain the upload like a real backend would
+            async for _ in request.stream():
+                pass
+        if latency:
+            await asyncio.sleep(latency / 1000)
+        return Response(body_of(size), media_type="application/json")
+
+    return stub
+
+
+app = create_stub_app()
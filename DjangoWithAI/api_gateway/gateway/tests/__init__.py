@@ -0,0 +1,6 @@
+import os
+import sys
+
+# The gateway runs as a script from api_gateway/ and imports its modules top-level
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))),
+                                "api_gateway"))
@@ -0,0 +1,24 @@
+from unittest import mock
+
+
+class Clock:
+    """Stands in for the time module inside a gateway module, moved by hand through `now`"""
+
+    def __init__(self, now: float = 1000.0):
+        self.now = now
+
+    def install(self, test, module) -> "Clock":
+        """Replace `module`'s time with this clock for the rest of `test`"""
+        patcher = mock.patch.object(module, "time", self)
+        patcher.start()
+        test.addCleanup(patcher.stop)
+        return self
+
+    def time(self) -> float:
+        return self.now
+
+    def monotonic(self) -> float:
+        return self.now
+
+    def perf_counter(self) -> float:
+        return self.now
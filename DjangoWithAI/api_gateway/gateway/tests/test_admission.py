@@ -0,0 +1,101 @@
+import asyncio
+import unittest
+from unittest import mock
+
+import httpx
+from jose import jwt
+
+import main
+from admission import AdmissionController
+
+
+class AdmissionControllerTests(unittest.IsolatedAsyncioTestCase):
+    async def test_queues_then_sheds(self):
+        admission = AdmissionController("ai", limit=2, max_queue=1)
+        self.assertTrue(await admission.acquire())
+        self.assertTrue(await admission.acquire())
+        waiting = asyncio.ensure_future(admission.acquire())
+        await asyncio.sleep(0)
+        self.assertEqual(len(admission.waiters), 1)
+        self.assertFalse(await admission.acquire())
+        self.assertEqual(admission.shed, 1)
+
+        admission.release(0.1)
+        self.assertTrue(await waiting)
+        self.assertEqual(admission.in_flight, 2)
+
+    async def test_release_hands_slots_over_in_order(self):
+        admission = AdmissionController("ai", limit=1, max_queue=5)
+        await admission.acquire()
+        order = []
+
+        async def wait(name):
+            await admission.acquire()
+            order.append(name)
+
+        waiting = [asyncio.ensure_future(wait(name)) for name in "abc"]
+        await asyncio.sleep(0)
+        for _ in range(3):
+            admission.release()
+            await asyncio.sleep(0)
+            # A newcomer does not jump ahead of the queue
+            self.assertEqual(admission.in_flight, 1)
+        await asyncio.gather(*waiting)
+        self.assertEqual(order, ["a", "b", "c"])
+        admission.release()
+        self.assertEqual(admission.in_flight, 0)
+
+    async def test_queue_timeout_and_cancellation_leave_the_queue(self):
+        admission = AdmissionController("ai", limit=1, max_queue=5, queue_timeout=0.01)
+        await admission.acquire()
+        self.assertFalse(await admission.acquire())
+        self.assertEqual(admission.timed_out, 1)
+
+        waiting = asyncio.ensure_future(admission.acquire())
+        await asyncio.sleep(0)
+        waiting.cancel()
+        with self.assertRaises(asyncio.CancelledError):
+            await waiting
+        self.assertEqual(len(admission.waiters), 0)
+        admission.release()
+        self.assertEqual(admission.in_flight, 0)
+
+    async def test_aimd_cuts_on_failure_and_slow_calls(self):
+        admission = AdmissionController("ai", limit=10, mode="aimd", latency_target=1.0, min_limit=2)
+        admission.release(0.1, ok=False)
+        self.assertAlmostEqual(admission.limit, 9.0)
+        admission.release(2.0)
+        self.assertAlmostEqual(admission.limit, 8.1)
+        for _ in range(30):
+            admission.release(2.0)
+        self.assertEqual(admission.limit, 2)
+
+    async def test_aimd_grows_only_while_the_limit_is_used(self):
+        admission = AdmissionController("ai", limit=4, mode="aimd")
+        admission.in_flight = 1
+        admission.release(0.1)
+        self.assertEqual(admission.limit, 4.0)
+        admission.in_flight = 4
+        admission.release(0.1)
+        self.assertAlmostEqual(admission.limit, 4.25)
+
+
+class SheddingGatewayTests(unittest.IsolatedAsyncioTestCase):
+    async def asyncSetUp(self):
+        self.admission = AdmissionController("ai", limit=1, max_queue=0)
+        patcher = mock.patch.dict(main.admission_controllers, {"ai": self.admission})
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        token = jwt.encode({"user_id": 8}, main.SECRET_KEY, algorithm=main.ALGORITHM)
+        self.gateway = httpx.AsyncClient(transport=httpx.ASGITransport(app=main.app), base_url="http://testserver",
+                                         headers={"authorization": f"Bearer {token}"})
+
+    async def asyncTearDown(self):
+        await self.gateway.aclose()
+
+    async def test_full_service_is_shed_with_retry_after(self):
+        await self.admission.acquire()  # a slow AI call holds the only slot
+        response = await self.gateway.get("/api/ai/generate")
+        self.assertEqual(response.status_code, 503)
+        self.assertIn("retry-after", response.headers)
+        self.assertEqual(self.admission.shed, 1)
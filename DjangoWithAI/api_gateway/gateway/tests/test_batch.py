@@ -0,0 +1,93 @@
+import asyncio
+import unittest
+from unittest import mock
+
+import httpx
+from jose import jwt
+
+import main
+from batch import BatchError, parse_batch
+from ratelimit import RateLimit, RateLimiter
+
+
+class ParseBatchTests(unittest.TestCase):
+    def test_items(self):
+        items = parse_batch({"requests": [
+            {"id": "a", "path": "/api/content/items/?page=2"},
+            {"method": "post", "path": "/api/content/items/", "body": {"title": "x"}},
+        ]}, max_items=5)
+        self.assertEqual([(i.id, i.method, i.path, i.query_string) for i in items],
+                         [("a", "GET", "/api/content/items/", b"page=2"), (1, "POST", "/api/content/items/", b"")])
+        self.assertEqual(items[1].headers["content-type"], "application/json")
+        self.assertEqual(items[1].body, b'{"title": "x"}')
+
+    def test_invalid_batches(self):
+        for payload in ({}, {"requests": []}, {"requests": [{"path": "/other"}]},
+                        {"requests": [{"path": "/api/batch"}]}, {"requests": [{"path": "/api/x", "method": "TRACE"}]},
+                        {"requests": [{"path": "/api/x"}] * 3}):
+            with self.subTest(payload=payload), self.assertRaises(BatchError):
+                parse_batch(payload, max_items=2)
+
+
+class EndlessEvents(httpx.AsyncByteStream):
+    async def __aiter__(self):
+        while True:
+            yield b"data: tick\n\n"
+            await asyncio.sleep(0.01)
+
+
+class Backend(httpx.AsyncBaseTransport):
+    """/stream answers with an event stream that never ends, /big with 64 KB, anything else with {}"""
+
+    def __init__(self):
+        self.calls = 0
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        self.calls += 1
+        if request.url.path.endswith("/stream"):
+            return httpx.Response(200, headers={"content-type": "text/event-stream"}, stream=EndlessEvents())
+        body = b"x" * 65536 if request.url.path.endswith("/big") else b"{}"
+        return httpx.Response(200, headers={"content-type": "application/json"}, stream=httpx.ByteStream(body))
+
+
+class BatchEndpointTests(unittest.IsolatedAsyncioTestCase):
+    async def asyncSetUp(self):
+        self.transport = Backend()
+        self.backend = httpx.AsyncClient(transport=self.transport)
+        main.upstreams.clients["content"] = self.backend
+        for name, value in (("rate_limiter", RateLimiter()), ("BATCH_ITEM_MAX_BYTES", 32768)):
+            patcher = mock.patch.object(main, name, value)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        token = jwt.encode({"user_id": 5}, main.SECRET_KEY, algorithm=main.ALGORITHM)
+        self.gateway = httpx.AsyncClient(transport=httpx.ASGITransport(app=main.app), base_url="http://testserver",
+                                         headers={"authorization": f"Bearer {token}"})
+
+    async def asyncTearDown(self):
+        await self.gateway.aclose()
+        await self.backend.aclose()
+        del main.upstreams.clients["content"]
+
+    async def batch(self, *paths) -> list:
+        response = await self.gateway.post("/api/batch", json={"requests": [{"path": path} for path in paths]})
+        self.assertEqual(response.status_code, 200)
+        return [item["status"] for item in response.json()["responses"]]
+
+    async def test_items_are_charged_to_the_ip_limit(self):
+        with mock.patch.object(main, "RATE_LIMIT", RateLimit(3, 60)):
+            statuses = await self.batch(*["/api/content/items/"] * 5)
+        # The batch request itself takes one of the three
+        self.assertEqual(sorted(statuses), [200, 200, 429, 429, 429])
+        self.assertEqual(self.transport.calls, 2)
+
+    async def test_items_are_charged_to_the_user_limit(self):
+        with mock.patch.object(main, "USER_RATE_LIMIT", RateLimit(2, 60)):
+            statuses = await self.batch(*["/api/content/items/"] * 4)
+        self.assertEqual(sorted(statuses), [200, 429, 429, 429])
+
+    async def test_streaming_and_oversized_items_do_not_hold_the_batch(self):
+        statuses = await asyncio.wait_for(
+            self.batch("/api/content/stream", "/api/content/big", "/api/content/items/"), timeout=5
+        )
+        self.assertEqual(statuses, [400, 502, 200])
+        self.assertEqual(main.admission_controllers["content"].in_flight, 0)
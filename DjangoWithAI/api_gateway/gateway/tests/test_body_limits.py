@@ -0,0 +1,80 @@
+import unittest
+from unittest import mock
+
+import httpx
+from jose import jwt
+
+import main
+from breaker import CircuitBreaker
+from middleware import PrefixTable
+
+
+async def chunked(size: int, chunk: int = 64):
+    """A body of `size` bytes sent without a Content-Length"""
+    for start in range(0, size, chunk):
+        yield b"x" * min(chunk, size - start)
+
+
+class BodyLimitTests(unittest.IsolatedAsyncioTestCase):
+    async def asyncSetUp(self):
+        self.backend_calls = 0
+        self.received = []  # body bytes each backend call got
+
+        async def backend(scope, receive, send):
+            self.backend_calls += 1
+            self.received.append(0)
+            while True:
+                message = await receive()
+                self.received[-1] += len(message.get("body", b""))
+                if not message.get("more_body", False):
+                    break
+            await send({"type": "http.response.start", "status": 200, "headers": []})
+            await send({"type": "http.response.body", "body": b"{}"})
+
+        self.backend = httpx.AsyncClient(transport=httpx.ASGITransport(app=backend))
+        for service in ("content", "ai"):
+            main.upstreams.clients[service] = self.backend
+        breakers = {service: CircuitBreaker(service) for service in ("content", "ai")}
+        for patcher in (mock.patch.dict(main.breakers, breakers),
+                        mock.patch.object(main, "MAX_BODY_SIZE", 1000),
+                        mock.patch.object(main, "route_body_limits", PrefixTable({"/api/ai/": 100})),
+                        mock.patch.object(main, "CHUNKED_BUFFER_LIMIT", 500)):
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        token = jwt.encode({"user_id": 8}, main.SECRET_KEY, algorithm=main.ALGORITHM)
+        self.auth = {"authorization": f"Bearer {token}"}
+        self.gateway = httpx.AsyncClient(transport=httpx.ASGITransport(app=main.app), base_url="http://testserver")
+
+    async def asyncTearDown(self):
+        await self.gateway.aclose()
+        await self.backend.aclose()
+        for service in ("content", "ai"):
+            del main.upstreams.clients[service]
+
+    async def post(self, path: str, content, headers=None) -> httpx.Response:
+        return await self.gateway.post(path, content=content, headers=headers or self.auth)
+
+    async def test_declared_length_over_the_limit_is_refused_before_auth(self):
+        response = await self.post("/api/content/items/", b"x" * 1001, headers={})
+        self.assertEqual(response.status_code, 413)
+        self.assertEqual(response.headers["connection"], "close")
+        self.assertEqual(self.backend_calls, 0)
+
+    async def test_route_limit_overrides_the_default(self):
+        self.assertEqual((await self.post("/api/ai/generate/", b"x" * 101)).status_code, 413)
+        self.assertEqual((await self.post("/api/ai/generate/", b"x" * 100)).status_code, 200)
+        self.assertEqual((await self.post("/api/content/items/", b"x" * 1000)).status_code, 200)
+        self.assertEqual(self.received, [100, 1000])
+
+    async def test_chunked_body_is_buffered_and_refused_on_small_limits(self):
+        response = await self.post("/api/ai/generate/", chunked(101))
+        self.assertEqual(response.status_code, 413)
+        self.assertEqual(self.backend_calls, 0)
+
+    async def test_chunked_body_is_cut_off_while_streaming_on_large_limits(self):
+        self.assertEqual((await self.post("/api/content/items/", chunked(1000))).status_code, 200)
+        response = await self.post("/api/content/items/", chunked(1001))
+        self.assertEqual(response.status_code, 413)
+        self.assertEqual(self.received[0], 1000)
+        self.assertEqual(self.backend_calls, 2)  # streamed to the backend until the limit was passed
+        self.assertLessEqual(self.received[1], 1000)
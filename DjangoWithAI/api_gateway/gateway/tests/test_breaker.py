@@ -0,0 +1,117 @@
+import unittest
+from unittest import mock
+
+import httpx
+from jose import jwt
+
+import breaker as breaker_module
+import main
+from breaker import CLOSED, HALF_OPEN, OPEN, CircuitBreaker
+from gateway.tests.clock import Clock
+
+
+class CircuitBreakerTests(unittest.TestCase):
+    def setUp(self):
+        self.clock = Clock().install(self, breaker_module)
+        self.breaker = CircuitBreaker("ai", failure_rate=0.5, min_calls=4, window=10, slow_call=1.0,
+                                      open_seconds=15.0, half_open_calls=2)
+
+    def trip(self):
+        for _ in range(4):
+            self.assertTrue(self.breaker.allow())
+            self.breaker.record(False, 0.1)
+
+    def test_stays_closed_below_min_calls(self):
+        for _ in range(3):
+            self.breaker.record(False, 0.1)
+        self.assertEqual(self.breaker.state, CLOSED)
+        self.breaker.record(False, 0.1)
+        self.assertEqual(self.breaker.state, OPEN)
+
+    def test_stays_closed_below_failure_rate(self):
+        for ok in (True, True, True, False, True, False):
+            self.breaker.record(ok, 0.1)
+        self.assertEqual(self.breaker.state, CLOSED)
+
+    def test_slow_calls_count_as_failures(self):
+        for _ in range(4):
+            self.breaker.record(True, 2.0)
+        self.assertEqual(self.breaker.state, OPEN)
+
+    def test_open_rejects_until_open_seconds_pass(self):
+        self.trip()
+        self.assertEqual(self.breaker.state, OPEN)
+        self.assertFalse(self.breaker.allow())
+        self.clock.now += 10
+        self.assertAlmostEqual(self.breaker.retry_after(), 5.0)
+        self.assertFalse(self.breaker.allow())
+        self.assertEqual(self.breaker.rejected, 2)
+
+    def test_half_open_closes_after_successful_trials(self):
+        self.trip()
+        self.clock.now += 15
+        self.assertTrue(self.breaker.allow())
+        self.assertEqual(self.breaker.state, HALF_OPEN)
+        self.assertTrue(self.breaker.allow())
+        self.assertFalse(self.breaker.allow())  # only half_open_calls trials at a time
+        self.breaker.record(True, 0.1)
+        self.breaker.record(True, 0.1)
+        self.assertEqual(self.breaker.state, CLOSED)
+        self.assertEqual(self.breaker.stats()["transition_counts"],
+                         {"closed->open": 1, "open->half_open": 1, "half_open->closed": 1})
+
+    def test_half_open_failure_reopens(self):
+        self.trip()
+        self.clock.now += 15
+        self.assertTrue(self.breaker.allow())
+        self.breaker.record(False, 0.1)
+        self.assertEqual(self.breaker.state, OPEN)
+        self.assertFalse(self.breaker.allow())
+
+    def test_abandoned_trial_frees_its_place(self):
+        self.trip()
+        self.clock.now += 15
+        self.assertTrue(self.breaker.allow())
+        self.assertTrue(self.breaker.allow())
+        self.breaker.abandon()
+        self.assertTrue(self.breaker.allow())
+        self.assertEqual(self.breaker.state, HALF_OPEN)
+
+
+class OpenBreakerGatewayTests(unittest.IsolatedAsyncioTestCase):
+    async def asyncSetUp(self):
+        self.backend_calls = 0
+
+        async def backend(scope, receive, send):
+            self.backend_calls += 1
+            await send({"type": "http.response.start", "status": 200, "headers": []})
+            await send({"type": "http.response.body", "body": b"{}"})
+
+        self.backend = httpx.AsyncClient(transport=httpx.ASGITransport(app=backend))
+        main.upstreams.clients["ai"] = self.backend
+        self.breaker = CircuitBreaker("ai", open_seconds=15.0)
+        self.breaker._open()
+        patcher = mock.patch.dict(main.breakers, {"ai": self.breaker})
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        token = jwt.encode({"user_id": 6}, main.SECRET_KEY, algorithm=main.ALGORITHM)
+        self.gateway = httpx.AsyncClient(transport=httpx.ASGITransport(app=main.app), base_url="http://testserver",
+                                         headers={"authorization": f"Bearer {token}"})
+
+    async def asyncTearDown(self):
+        await self.gateway.aclose()
+        await self.backend.aclose()
+        del main.upstreams.clients["ai"]
+
+    async def test_open_breaker_fails_fast_with_retry_after(self):
+        response = await self.gateway.get("/api/ai/generate")
+        self.assertEqual(response.status_code, 503)
+        self.assertIn(int(response.headers["retry-after"]), (14, 15))
+        self.assertEqual(self.backend_calls, 0)
+        self.assertEqual(main.admission_controllers["ai"].in_flight, 0)
+
+    async def test_breaker_state_is_reported(self):
+        stats = (await self.gateway.get("/gateway/stats")).json()
+        self.assertEqual(stats["breakers"]["ai"]["state"], OPEN)
+        metrics = (await self.gateway.get("/metrics")).text
+        self.assertIn('gateway_breaker_state{service="ai"} 2', metrics)
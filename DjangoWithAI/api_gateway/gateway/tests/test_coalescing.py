@@ -0,0 +1,74 @@
+import asyncio
+import gzip
+import unittest
+
+import httpx
+from jose import jwt
+
+import main
+from singleflight import SingleFlight
+
+BODY = b'{"rows": "' + b"x" * 6000 + b'"}'
+
+
+class SingleFlightTests(unittest.IsolatedAsyncioTestCase):
+    async def test_concurrent_callers_share_one_call(self):
+        flight = SingleFlight()
+        calls = 0
+
+        async def fetch():
+            nonlocal calls
+            calls += 1
+            await asyncio.sleep(0.01)
+            return calls
+
+        results = await asyncio.gather(*(flight.do("key", fetch) for _ in range(5)))
+        self.assertEqual(results, [1] * 5)
+        self.assertEqual(flight.stats(), {"originated": 1, "coalesced": 4, "in_flight": 0})
+
+    async def test_a_departing_caller_does_not_cancel_the_others(self):
+        flight = SingleFlight()
+
+        async def fetch():
+            await asyncio.sleep(0.02)
+            return "done"
+
+        first = asyncio.ensure_future(flight.do("key", fetch))
+        second = asyncio.ensure_future(flight.do("key", fetch))
+        await asyncio.sleep(0)
+        first.cancel()
+        self.assertEqual(await second, "done")
+
+
+class CoalescedGatewayTests(unittest.IsolatedAsyncioTestCase):
+    async def asyncSetUp(self):
+        self.backend_calls = 0
+
+        async def backend(scope, receive, send):
+            self.backend_calls += 1
+            await asyncio.sleep(0.05)  # long enough for the other callers to join
+            await send({"type": "http.response.start", "status": 200,
+                        "headers": [(b"content-type", b"application/json")]})
+            await send({"type": "http.response.body", "body": BODY})
+
+        self.backend = httpx.AsyncClient(transport=httpx.ASGITransport(app=backend))
+        main.upstreams.clients["db"] = self.backend
+        main.COALESCE_SERVICES.add("db")
+        token = jwt.encode({"user_id": 7}, main.SECRET_KEY, algorithm=main.ALGORITHM)
+        self.gateway = httpx.AsyncClient(transport=httpx.ASGITransport(app=main.app), base_url="http://testserver",
+                                         headers={"authorization": f"Bearer {token}"})
+
+    async def asyncTearDown(self):
+        await self.gateway.aclose()
+        await self.backend.aclose()
+        main.COALESCE_SERVICES.discard("db")
+        del main.upstreams.clients["db"]
+
+    async def test_every_waiter_gets_a_complete_compressed_response(self):
+        responses = await asyncio.gather(*(
+            self.gateway.get("/api/db/rows", headers={"accept-encoding": "gzip"}) for _ in range(3)
+        ))
+        self.assertEqual(self.backend_calls, 1)
+        for response in responses:
+            self.assertEqual(response.headers["content-encoding"], "gzip")
+            self.assertEqual(response.content, BODY)
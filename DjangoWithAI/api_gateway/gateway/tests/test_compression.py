@@ -0,0 +1,220 @@
+import asyncio
+import gzip
+import unittest
+from unittest import mock
+
+import httpx
+from fastapi import Response
+from jose import jwt
+
+import main
+from compression import CompressionMiddleware, ResponseCompressor, accepts, decode, for_client, negotiate
+
+
+async def call(app, accept_encoding: str = "gzip") -> tuple:
+    """(status, headers, body) of one GET through `app`"""
+    scope = {"type": "http", "method": "GET", "path": "/", "headers": [(b"accept-encoding", accept_encoding.encode())]}
+    messages = []
+
+    async def receive():
+        return {"type": "http.request", "body": b"", "more_body": False}
+
+    async def send(message):
+        messages.append(message)
+
+    await app(scope, receive, send)
+    headers = {key.decode(): value.decode() for key, value in messages[0]["headers"]}
+    return messages[0]["status"], headers, b"".join(message.get("body", b"") for message in messages[1:])
+
+
+class NegotiateTests(unittest.TestCase):
+    def test_server_preference_among_accepted(self):
+        self.assertEqual(negotiate("gzip, br", ("zstd", "br", "gzip")), "br")
+
+    def test_quality_zero_refuses(self):
+        self.assertEqual(negotiate("br;q=0, gzip", ("br", "gzip")), "gzip")
+        self.assertIsNone(negotiate("gzip;q=0", ("gzip",)))
+
+    def test_wildcard(self):
+        self.assertEqual(negotiate("*", ("br", "gzip")), "br")
+        self.assertEqual(negotiate("*;q=0.5, br;q=0", ("br", "gzip")), "gzip")
+
+
+class CompressionMiddlewareTests(unittest.IsolatedAsyncioTestCase):
+    body = b'{"text": "' + b"lorem ipsum " * 500 + b'"}'
+
+    def middleware(self, response: Response) -> CompressionMiddleware:
+        async def app(scope, receive, send):
+            await response(scope, receive, send)
+
+        return CompressionMiddleware(app, ResponseCompressor(minimum_size=1024, encodings=("gzip",)))
+
+    async def test_large_json_is_compressed(self):
+        status, headers, body = await call(self.middleware(Response(self.body, media_type="application/json")))
+        self.assertEqual(status, 200)
+        self.assertEqual(headers["content-encoding"], "gzip")
+        self.assertEqual(int(headers["content-length"]), len(body))
+        self.assertEqual(gzip.decompress(body), self.body)
+
+    async def test_shared_response_is_compressed_for_every_caller(self):
+        # Coalesced and cached responses are sent more than once
+        response = Response(self.body, media_type="application/json", headers={"etag": '"v1"'})
+        app = self.middleware(response)
+        for _ in range(3):
+            _, headers, body = await call(app)
+            self.assertEqual(gzip.decompress(body), self.body)
+            self.assertEqual(headers["etag"], 'W/"v1"')
+        self.assertNotIn(b"content-encoding", dict(response.raw_headers))
+
+    async def test_small_and_encoded_responses_pass_through(self):
+        small = Response(b'{"ok": true}', media_type="application/json")
+        _, headers, body = await call(self.middleware(small))
+        self.assertNotIn("content-encoding", headers)
+        self.assertEqual(body, b'{"ok": true}')
+
+        encoded = gzip.compress(self.body)
+        response = Response(encoded, media_type="application/json", headers={"content-encoding": "gzip"})
+        _, headers, body = await call(self.middleware(response), "gzip, br")
+        self.assertEqual(headers["content-encoding"], "gzip")
+        self.assertEqual(body, encoded)
+
+    async def test_identity_client_gets_identity(self):
+        _, headers, body = await call(self.middleware(Response(self.body, media_type="application/json")), "identity")
+        self.assertNotIn("content-encoding", headers)
+        self.assertEqual(body, self.body)
+
+
+class EncodedBodyTests(unittest.TestCase):
+    body = b"lorem ipsum " * 200
+
+    def test_accepts(self):
+        self.assertTrue(accepts("gzip, br", "gzip"))
+        self.assertTrue(accepts("*", "br"))
+        self.assertFalse(accepts("", "gzip"))
+        self.assertFalse(accepts("br, gzip;q=0", "gzip"))
+
+    def test_decode(self):
+        self.assertEqual(decode(gzip.compress(self.body), "gzip"), self.body)
+        self.assertEqual(decode(self.body, "identity"), self.body)
+        with self.assertRaises(ValueError):
+            decode(self.body, "compress")
+
+    def test_for_client_decodes_only_when_needed(self):
+        encoded = Response(gzip.compress(self.body), headers={"content-encoding": "gzip"})
+        self.assertIs(for_client(encoded, "gzip"), encoded)
+        decoded = for_client(encoded, "identity")
+        self.assertEqual(decoded.body, self.body)
+        self.assertNotIn("content-encoding", decoded.headers)
+        self.assertEqual(decoded.headers["content-length"], str(len(self.body)))
+
+
+class BufferedPassthroughTests(unittest.IsolatedAsyncioTestCase):
+    """Bodies the backend already encoded go out as sent on the buffered proxy paths"""
+
+    body = b'{"text": "' + b"lorem ipsum " * 500 + b'"}'
+    # Level 1 and mtime 0, so any re-encoding by the gateway would change the bytes
+    encoded = gzip.compress(body, compresslevel=1, mtime=0)
+
+    async def asyncSetUp(self):
+        self.backend_calls = 0
+
+        async def backend(scope, receive, send):
+            self.backend_calls += 1
+            await asyncio.sleep(0.02)
+            await send({"type": "http.response.start", "status": 200, "headers": [
+                (b"content-type", b"application/json"), (b"content-encoding", b"gzip"),
+                (b"content-length", str(len(self.encoded)).encode()),
+            ]})
+            await send({"type": "http.response.body", "body": self.encoded})
+
+        self.backend = httpx.AsyncClient(transport=httpx.ASGITransport(app=backend))
+        main.upstreams.clients["content"] = self.backend
+        patcher = mock.patch.object(main, "STREAM_PROXY", False)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        token = jwt.encode({"user_id": 3}, main.SECRET_KEY, algorithm=main.ALGORITHM)
+        self.gateway = httpx.AsyncClient(transport=httpx.ASGITransport(app=main.app), base_url="http://testserver",
+                                         headers={"authorization": f"Bearer {token}"})
+
+    async def asyncTearDown(self):
+        await self.gateway.aclose()
+        await self.backend.aclose()
+        del main.upstreams.clients["content"]
+
+    async def get(self, accept_encoding: str) -> tuple:
+        """(content-encoding, raw body bytes) of a GET through the gateway"""
+        async with self.gateway.stream("GET", "/api/content/items/", headers={"accept-encoding": accept_encoding}) as r:
+            return r.headers.get("content-encoding"), b"".join([chunk async for chunk in r.aiter_raw()])
+
+    async def test_accepted_encoding_passes_through(self):
+        self.assertEqual(await self.get("gzip, br"), ("gzip", self.encoded))
+
+    async def test_other_clients_get_identity(self):
+        self.assertEqual(await self.get("identity"), (None, self.body))
+
+    async def test_coalesced_callers_each_get_what_they_accept(self):
+        main.COALESCE_SERVICES.add("content")
+        try:
+            results = await asyncio.gather(self.get("gzip"), self.get("identity"), self.get("gzip"))
+        finally:
+            main.COALESCE_SERVICES.discard("content")
+        self.assertEqual(self.backend_calls, 1)
+        self.assertEqual(results, [("gzip", self.encoded), (None, self.body), ("gzip", self.encoded)])
+
+
+class UndecodableSharedBodyTests(unittest.IsolatedAsyncioTestCase):
+    """A shared body this worker cannot decode is refetched, not turned into a 500"""
+
+    body = b'{"text": "lorem ipsum"}'
+    brotli_body = b"\x1b\x16\x00not-really-brotli"
+
+    async def asyncSetUp(self):
+        self.backend_calls = 0
+
+        async def backend(scope, receive, send):
+            self.backend_calls += 1
+            await asyncio.sleep(0.02)
+            headers = dict(scope["headers"])
+            if b"br" in headers.get(b"accept-encoding", b""):
+                response = [(b"content-encoding", b"br")], self.brotli_body
+            else:
+                response = [], self.body
+            await send({"type": "http.response.start", "status": 200,
+                        "headers": [(b"content-type", b"application/json")] + response[0]})
+            await send({"type": "http.response.body", "body": response[1]})
+
+        self.backend = httpx.AsyncClient(transport=httpx.ASGITransport(app=backend))
+        main.upstreams.clients["content"] = self.backend
+        for patcher in (mock.patch("compression.brotli", None), mock.patch.object(main, "STREAM_PROXY", False)):
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        token = jwt.encode({"user_id": 4}, main.SECRET_KEY, algorithm=main.ALGORITHM)
+        self.gateway = httpx.AsyncClient(transport=httpx.ASGITransport(app=main.app), base_url="http://testserver",
+                                         headers={"authorization": f"Bearer {token}"})
+
+    async def asyncTearDown(self):
+        await self.gateway.aclose()
+        await self.backend.aclose()
+        del main.upstreams.clients["content"]
+
+    async def get(self, accept_encoding: str) -> tuple:
+        """(status, content-encoding, raw body bytes) of a GET through the gateway"""
+        async with self.gateway.stream("GET", "/api/content/items/", headers={"accept-encoding": accept_encoding}) as r:
+            return r.status_code, r.headers.get("content-encoding"), b"".join([chunk async for chunk in r.aiter_raw()])
+
+    async def test_coalesced_identity_caller_is_refetched(self):
+        main.COALESCE_SERVICES.add("content")
+        try:
+            results = await asyncio.gather(self.get("br"), self.get("identity"))
+        finally:
+            main.COALESCE_SERVICES.discard("content")
+        self.assertEqual(results, [(200, "br", self.brotli_body), (200, None, self.body)])
+        self.assertEqual(self.backend_calls, 2)
+
+    async def test_cached_entry_is_refetched_for_an_identity_client(self):
+        self.addCleanup(main.response_cache.invalidate, "/api/content", 4)
+        with mock.patch.object(main.response_cache, "routes", [("/api/content/", 30.0)]):
+            self.assertEqual(await self.get("br"), (200, "br", self.brotli_body))
+            self.assertEqual(await self.get("identity"), (200, None, self.body))
+            self.assertEqual(await self.get("br"), (200, "br", self.brotli_body))
+        self.assertEqual(self.backend_calls, 2)
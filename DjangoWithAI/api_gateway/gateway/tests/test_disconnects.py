@@ -0,0 +1,68 @@
+import asyncio
+import unittest
+
+import httpx
+from jose import jwt
+
+import main
+
+
+class DisconnectTests(unittest.IsolatedAsyncioTestCase):
+    """A client leaving while the backend works says nothing about the backend"""
+
+    async def asyncSetUp(self):
+        self.reached = asyncio.Event()
+
+        async def backend(scope, receive, send):
+            self.reached.set()
+            await asyncio.sleep(30)
+
+        self.client = httpx.AsyncClient(transport=httpx.ASGITransport(app=backend))
+        main.upstreams.clients["ai"] = self.client
+        self.token = jwt.encode({"user_id": 2}, main.SECRET_KEY, algorithm=main.ALGORITHM)
+
+    async def asyncTearDown(self):
+        await self.client.aclose()
+        del main.upstreams.clients["ai"]
+
+    async def leave(self, method: str):
+        """Send a request through the gateway app and disconnect once the backend has it"""
+        path = "/api/ai/slow"
+        scope = {
+            "type": "http", "asgi": {"version": "3.0"}, "http_version": "1.1", "method": method,
+            "scheme": "http", "path": path, "raw_path": path.encode(), "query_string": b"",
+            "headers": [(b"host", b"testserver"), (b"authorization", f"Bearer {self.token}".encode())],
+            "client": ("127.0.0.1", 50000), "server": ("testserver", 80),
+        }
+        calls = 0
+        self.reached.clear()
+
+        async def receive():
+            nonlocal calls
+            calls += 1
+            if calls == 1:
+                return {"type": "http.request", "body": b"", "more_body": False}
+            await self.reached.wait()
+            return {"type": "http.disconnect"}
+
+        sent = []
+
+        async def send(message):
+            await asyncio.sleep(0)
+            sent.append(message)
+
+        await asyncio.wait_for(main.app(scope, receive, send), timeout=5)
+        return sent[0]["status"]
+
+    async def test_disconnects_leave_the_breaker_closed(self):
+        breaker = main.breakers["ai"]
+        for method in ("GET", "POST"):
+            with self.subTest(method=method):
+                for _ in range(breaker.min_calls + 2):
+                    self.assertEqual(await self.leave(method), 499)
+                self.assertEqual(breaker.state, "closed")
+                self.assertEqual(list(breaker.outcomes), [])
+                self.assertEqual(main.admission_controllers["ai"].in_flight, 0)
+                instance = main.upstreams.instances["ai"][0]
+                self.assertEqual(instance.outstanding, 0)
+                self.assertEqual(instance.failures, 0)
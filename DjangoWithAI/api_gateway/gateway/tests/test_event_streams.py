@@ -0,0 +1,134 @@
+import asyncio
+import unittest
+from unittest import mock
+
+import httpx
+from jose import jwt
+
+import main
+from breaker import CircuitBreaker
+from streaming import KEEPALIVE_COMMENT, RelayResponse
+
+
+class EventStream(httpx.AsyncByteStream):
+    """Yields each chunk after awaiting its gate: a delay in seconds, or an asyncio.Event"""
+
+    def __init__(self, chunks: list):
+        self.chunks = chunks
+
+    async def __aiter__(self):
+        for gate, chunk in self.chunks:
+            if isinstance(gate, asyncio.Event):
+                await gate.wait()
+            else:
+                await asyncio.sleep(gate)
+            yield chunk
+
+
+class EventStreamTransport(httpx.AsyncBaseTransport):
+    """A backend answering every request with an event stream of `chunks`, sent as they are released"""
+
+    def __init__(self, chunks: list):
+        self.chunks = chunks
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        return httpx.Response(200, headers={"content-type": "text/event-stream"}, stream=EventStream(self.chunks))
+
+
+async def relayed_chunks(response: RelayResponse) -> list:
+    """Body chunks `response` sends"""
+    scope = {"type": "http", "method": "GET", "path": "/", "headers": []}
+    chunks = []
+
+    async def receive():
+        await asyncio.Event().wait()  # connection stays open
+
+    async def send(message):
+        if message.get("body"):
+            chunks.append(message["body"])
+
+    await response(scope, receive, send)
+    return chunks
+
+
+class KeepaliveTests(unittest.IsolatedAsyncioTestCase):
+    async def relay(self, chunks: list) -> list:
+        upstream = httpx.Response(200, headers={"content-type": "text/event-stream"}, stream=EventStream(chunks))
+        return await relayed_chunks(RelayResponse(upstream, lambda ok, sent: None, keepalive=0.05))
+
+    async def test_comments_fill_quiet_gaps_between_events(self):
+        chunks = await self.relay([(0, b"data: 1\n\n"), (0.12, b"data: 2\n\n")])
+        self.assertEqual(chunks[0], b"data: 1\n\n")
+        self.assertEqual(chunks[-1], b"data: 2\n\n")
+        self.assertGreaterEqual(len(chunks), 4)
+        self.assertEqual(set(chunks[1:-1]), {KEEPALIVE_COMMENT})
+
+    async def test_no_comment_in_the_middle_of_an_event(self):
+        chunks = await self.relay([(0, b"data: par"), (0.12, b"t\n\n"), (0.12, b"data: 2\n\n")])
+        self.assertEqual(chunks[:2], [b"data: par", b"t\n\n"])
+        self.assertIn(KEEPALIVE_COMMENT, chunks[2:-1])
+
+
+class EventStreamGatewayTests(unittest.IsolatedAsyncioTestCase):
+    """Event streams go through the gateway as they are produced, and as sent"""
+
+    async def asyncSetUp(self):
+        patcher = mock.patch.dict(main.breakers, {"ai": CircuitBreaker("ai")})
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        token = jwt.encode({"user_id": 9}, main.SECRET_KEY, algorithm=main.ALGORITHM)
+        self.headers = [(b"host", b"testserver"), (b"authorization", f"Bearer {token}".encode()),
+                        (b"accept", b"text/event-stream"), (b"accept-encoding", b"gzip, br")]
+
+    async def asyncTearDown(self):
+        await main.upstreams.clients.pop("ai").aclose()
+
+    async def stream(self, chunks: list, on_chunk=None) -> tuple:
+        """(response headers, body chunks) of an event stream relayed from /api/ai/stream"""
+        main.upstreams.clients["ai"] = httpx.AsyncClient(transport=EventStreamTransport(chunks))
+        path = "/api/ai/stream"
+        scope = {
+            "type": "http", "asgi": {"version": "3.0"}, "http_version": "1.1", "method": "GET",
+            "scheme": "http", "path": path, "raw_path": path.encode(), "query_string": b"",
+            "headers": self.headers, "client": ("127.0.0.1", 50000), "server": ("testserver", 80),
+        }
+        calls = 0
+
+        async def receive():
+            nonlocal calls
+            calls += 1
+            if calls == 1:
+                return {"type": "http.request", "body": b"", "more_body": False}
+            await asyncio.Event().wait()  # connection still open
+
+        sent = []
+
+        async def send(message):
+            await asyncio.sleep(0)
+            sent.append(message)
+            if message.get("body") and on_chunk is not None:
+                on_chunk(message["body"])
+
+        await asyncio.wait_for(main.app(scope, receive, send), timeout=5)
+        headers = {key.decode(): value.decode() for key, value in sent[0]["headers"]}
+        return headers, [message["body"] for message in sent[1:] if message.get("body")]
+
+    async def test_each_chunk_is_relayed_before_the_next_is_produced(self):
+        released = asyncio.Event()
+        # The backend only produces the second event once the client has the first
+        _, chunks = await self.stream([(0, b"data: 1\n\n"), (released, b"data: 2\n\n")],
+                                      on_chunk=lambda chunk: released.set())
+        self.assertEqual(chunks, [b"data: 1\n\n", b"data: 2\n\n"])
+
+    async def test_event_streams_are_never_compressed(self):
+        event = b"data: " + b"lorem ipsum " * 200 + b"\n\n"
+        headers, chunks = await self.stream([(0, event), (0, event)])
+        self.assertNotIn("content-encoding", headers)
+        self.assertEqual(headers["x-accel-buffering"], "no")
+        self.assertEqual(b"".join(chunks), event * 2)
+
+    async def test_quiet_stream_gets_keepalive_comments(self):
+        with mock.patch.object(main, "SSE_KEEPALIVE", 0.05):
+            _, chunks = await self.stream([(0, b"data: 1\n\n"), (0.12, b"data: 2\n\n")])
+        self.assertEqual((chunks[0], chunks[-1]), (b"data: 1\n\n", b"data: 2\n\n"))
+        self.assertIn(KEEPALIVE_COMMENT, chunks[1:-1])
@@ -0,0 +1,94 @@
+import unittest
+from unittest import mock
+
+import httpx
+from jose import jwt
+
+import main
+from health import HealthProber
+from upstreams import UpstreamPool
+
+
+class HealthProberTests(unittest.IsolatedAsyncioTestCase):
+    async def asyncSetUp(self):
+        self.upstreams = UpstreamPool({"content": ["http://a", "http://b"]})
+        self.a, self.b = self.upstreams.instances["content"]
+        self.statuses = {"a": 200, "b": 200}
+
+        async def handler(request):
+            return httpx.Response(self.statuses[request.url.host], request=request)
+
+        self.upstreams.clients["content"] = httpx.AsyncClient(transport=httpx.MockTransport(handler))
+        self.prober = HealthProber(self.upstreams, down_after=2)
+
+    async def asyncTearDown(self):
+        await self.upstreams.clients["content"].aclose()
+
+    async def test_instance_is_down_after_consecutive_failures(self):
+        self.statuses["a"] = 503
+        await self.prober.probe_all()
+        self.assertTrue(self.a.healthy)
+        await self.prober.probe_all()
+        self.assertFalse(self.a.healthy)
+        self.assertFalse(self.prober.is_down("content"))  # b still answers
+        self.assertEqual(self.prober.statuses["content"]["status"], "healthy")
+
+    async def test_service_is_down_once_every_instance_is(self):
+        self.statuses.update(a=503, b=500)
+        for _ in range(2):
+            await self.prober.probe_all()
+        self.assertTrue(self.prober.is_down("content"))
+
+        self.statuses["b"] = 200
+        await self.prober.probe_all()
+        self.assertFalse(self.prober.is_down("content"))
+        self.assertTrue(self.b.healthy)
+        self.assertEqual(self.prober.instance_statuses["http://b"]["uptime"], round(1 / 3, 2))
+
+
+class FailFastGatewayTests(unittest.IsolatedAsyncioTestCase):
+    """A service the prober has marked down is answered with 503 without calling it"""
+
+    async def asyncSetUp(self):
+        self.healthy = False
+        self.backend_calls = 0
+
+        async def backend(scope, receive, send):
+            if scope["path"] == "/health":
+                status = 200 if self.healthy else 503
+            else:
+                self.backend_calls += 1
+                status = 200
+            await send({"type": "http.response.start", "status": status, "headers": []})
+            await send({"type": "http.response.body", "body": b"{}"})
+
+        self.backend = httpx.AsyncClient(transport=httpx.ASGITransport(app=backend))
+        main.upstreams.clients["content"] = self.backend
+        self.prober = HealthProber(main.upstreams, down_after=2)
+        for patcher in (mock.patch.object(main, "health", self.prober),
+                        mock.patch.object(main, "HEALTH_FAIL_FAST", True)):
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        self.instance = main.upstreams.instances["content"][0]
+        self.addCleanup(setattr, self.instance, "healthy", True)
+        token = jwt.encode({"user_id": 10}, main.SECRET_KEY, algorithm=main.ALGORITHM)
+        self.gateway = httpx.AsyncClient(transport=httpx.ASGITransport(app=main.app), base_url="http://testserver",
+                                         headers={"authorization": f"Bearer {token}"})
+
+    async def asyncTearDown(self):
+        await self.gateway.aclose()
+        await self.backend.aclose()
+        del main.upstreams.clients["content"]
+
+    async def test_down_service_fails_fast_and_recovers_after_a_good_probe(self):
+        for _ in range(2):
+            await self.prober.probe("content", self.instance)
+        response = await self.gateway.get("/api/content/items/")
+        self.assertEqual(response.status_code, 503)
+        self.assertIn("retry-after", response.headers)
+        self.assertEqual(self.backend_calls, 0)
+
+        self.healthy = True
+        await self.prober.probe("content", self.instance)
+        self.assertEqual((await self.gateway.get("/api/content/items/")).status_code, 200)
+        self.assertEqual(self.backend_calls, 1)
@@ -0,0 +1,97 @@
+import time
+import unittest
+from unittest import mock
+
+import httpx
+from jose import jwt
+
+import jwt_cache as jwt_cache_module
+import main
+from gateway.tests.clock import Clock
+from jwt_cache import VerifiedTokenCache
+
+
+class VerifiedTokenCacheTests(unittest.TestCase):
+    def setUp(self):
+        self.clock = Clock().install(self, jwt_cache_module)
+        self.cache = VerifiedTokenCache(max_size=2, default_ttl=300)
+
+    def test_entry_expires_at_the_token_exp(self):
+        self.cache.put("a", {"user_id": 1, "exp": 1060})
+        self.clock.now = 1059
+        self.assertEqual(self.cache.get("a"), {"user_id": 1, "exp": 1060})
+        self.clock.now = 1060
+        self.assertIsNone(self.cache.get("a"))
+        self.assertEqual(len(self.cache.entries), 0)
+
+    def test_tokens_without_exp_use_the_default_ttl(self):
+        self.cache.put("a", {"user_id": 1})
+        self.clock.now += 299
+        self.assertIsNotNone(self.cache.get("a"))
+        self.clock.now += 1
+        self.assertIsNone(self.cache.get("a"))
+
+    def test_least_recently_used_is_dropped_at_the_cap(self):
+        self.cache.put("a", {"user_id": 1})
+        self.cache.put("b", {"user_id": 2})
+        self.cache.get("a")
+        self.cache.put("c", {"user_id": 3})
+        self.assertEqual(len(self.cache.entries), 2)
+        self.assertIsNone(self.cache.get("b"))
+        self.assertIsNotNone(self.cache.get("a"))
+        self.assertIsNotNone(self.cache.get("c"))
+
+    def test_hit_and_miss_counters(self):
+        self.cache.get("a")
+        self.cache.put("a", {"user_id": 1})
+        self.cache.get("a")
+        self.cache.get("a")
+        stats = self.cache.stats()
+        self.assertEqual((stats["hits"], stats["misses"], stats["hit_rate"]), (2, 1, 0.6667))
+        self.assertEqual((stats["size"], stats["max_size"]), (1, 2))
+
+
+class CachedAuthGatewayTests(unittest.IsolatedAsyncioTestCase):
+    """check_request only ever caches tokens that verified, and drops them at exp"""
+
+    async def asyncSetUp(self):
+        async def backend(scope, receive, send):
+            await send({"type": "http.response.start", "status": 200, "headers": []})
+            await send({"type": "http.response.body", "body": b"{}"})
+
+        self.backend = httpx.AsyncClient(transport=httpx.ASGITransport(app=backend))
+        main.upstreams.clients["content"] = self.backend
+        self.cache = VerifiedTokenCache(max_size=10)
+        patcher = mock.patch.object(main, "jwt_cache", self.cache)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.gateway = httpx.AsyncClient(transport=httpx.ASGITransport(app=main.app), base_url="http://testserver")
+
+    async def asyncTearDown(self):
+        await self.gateway.aclose()
+        await self.backend.aclose()
+        del main.upstreams.clients["content"]
+
+    async def get(self, token: str) -> httpx.Response:
+        return await self.gateway.get("/api/content/items/", headers={"authorization": f"Bearer {token}"})
+
+    async def test_cached_token_is_rejected_once_exp_passes(self):
+        clock = Clock(now=time.time()).install(self, jwt_cache_module)
+        token = jwt.encode({"user_id": 5, "exp": int(clock.now) + 60}, main.SECRET_KEY, algorithm=main.ALGORITHM)
+        self.assertEqual((await self.get(token)).status_code, 200)
+        self.assertEqual((await self.get(token)).status_code, 200)
+        self.assertEqual((self.cache.hits, self.cache.misses), (1, 1))
+
+        clock.now += 61
+        with mock.patch("jose.jwt.timegm", lambda _: int(clock.now)):
+            response = await self.get(token)
+        self.assertEqual(response.status_code, 401)
+        self.assertEqual(len(self.cache.entries), 0)
+
+    async def test_invalid_and_expired_tokens_are_not_cached(self):
+        forged = jwt.encode({"user_id": 5}, "not-the-secret", algorithm=main.ALGORITHM)
+        expired = jwt.encode({"user_id": 5, "exp": 1}, main.SECRET_KEY, algorithm=main.ALGORITHM)
+        for token in (forged, expired, forged):
+            self.assertEqual((await self.get(token)).status_code, 401)
+        self.assertEqual(len(self.cache.entries), 0)
+        self.assertEqual(self.cache.misses, 3)
@@ -0,0 +1,95 @@
+import re
+import unittest
+
+import httpx
+from jose import jwt
+
+import main
+from metrics import MetricsRegistry
+
+SAMPLE = re.compile(r'^([a-zA-Z_:][a-zA-Z0-9_:]*)(\{(?:[a-zA-Z_][a-zA-Z0-9_]*="(?:[^"\\]|\\.)*",?)*\})? (\S+)$')
+
+
+def samples(text: str) -> dict:
+    """'name{labels}' -> value for every sample line of an exposition, checking each line's format"""
+    values = {}
+    for line in text.splitlines():
+        if line.startswith("#"):
+            assert re.match(r"^# (HELP|TYPE) \w+ .+$", line), line
+            continue
+        match = SAMPLE.match(line)
+        assert match, line
+        values[match.group(1) + (match.group(2) or "")] = float(match.group(3))
+    return values
+
+
+class ExpositionTests(unittest.TestCase):
+    def setUp(self):
+        self.registry = MetricsRegistry()
+
+    def test_help_type_and_samples(self):
+        counter = self.registry.counter("requests_total", "Requests", ("service", "status"))
+        counter.inc("ai", 200)
+        counter.inc("ai", 200, amount=2)
+        self.assertEqual(self.registry.render(), "# HELP requests_total Requests\n"
+                                                 "# TYPE requests_total counter\n"
+                                                 'requests_total{service="ai",status="200"} 3\n')
+
+    def test_label_values_are_escaped(self):
+        self.registry.gauge("paths", "Paths", ("path",)).inc('a\\b"c\nd')
+        line = self.registry.render().splitlines()[-1]
+        self.assertEqual(line, r'paths{path="a\\b\"c\nd"} 1')
+        self.assertIn('paths{path="a\\\\b\\"c\\nd"}', samples(self.registry.render()))
+
+    def test_histogram_buckets_are_cumulative(self):
+        histogram = self.registry.histogram("latency_seconds", "Latency", ("service",), buckets=(0.1, 1.0))
+        for value in (0.05, 0.1, 0.5, 2.0):
+            histogram.observe(value, "ai")
+        values = samples(self.registry.render())
+        self.assertEqual(values['latency_seconds_bucket{service="ai",le="0.1"}'], 2)  # bounds are inclusive
+        self.assertEqual(values['latency_seconds_bucket{service="ai",le="1.0"}'], 3)
+        self.assertEqual(values['latency_seconds_bucket{service="ai",le="+Inf"}'], 4)
+        self.assertEqual(values['latency_seconds_count{service="ai"}'], 4)
+        self.assertAlmostEqual(values['latency_seconds_sum{service="ai"}'], 2.65)
+
+
+class MetricsEndpointTests(unittest.IsolatedAsyncioTestCase):
+    async def asyncSetUp(self):
+        async def backend(scope, receive, send):
+            await send({"type": "http.response.start", "status": 200, "headers": []})
+            await send({"type": "http.response.body", "body": b"{}"})
+
+        self.backend = httpx.AsyncClient(transport=httpx.ASGITransport(app=backend))
+        main.upstreams.clients["content"] = self.backend
+        token = jwt.encode({"user_id": 11}, main.SECRET_KEY, algorithm=main.ALGORITHM)
+        self.gateway = httpx.AsyncClient(transport=httpx.ASGITransport(app=main.app), base_url="http://testserver",
+                                         headers={"authorization": f"Bearer {token}"})
+
+    async def asyncTearDown(self):
+        await self.gateway.aclose()
+        await self.backend.aclose()
+        del main.upstreams.clients["content"]
+
+    async def scrape(self) -> dict:
+        response = await self.gateway.get("/metrics")
+        self.assertEqual(response.headers["content-type"], "text/plain; version=0.0.4; charset=utf-8")
+        return samples(response.text)
+
+    async def test_requests_show_up_in_the_exposition(self):
+        before = await self.scrape()
+        for _ in range(3):
+            await self.gateway.get("/api/content/items/")
+        await self.gateway.get("/api/nope/items/")
+        after = await self.scrape()
+
+        def delta(sample: str) -> float:
+            return after.get(sample, 0) - before.get(sample, 0)
+
+        self.assertEqual(delta('gateway_requests_total{service="content",status="200"}'), 3)
+        self.assertEqual(delta('gateway_requests_total{service="unknown",status="404"}'), 1)
+        buckets = [value for sample, value in after.items()
+                   if sample.startswith('gateway_request_duration_seconds_bucket{service="content"')]
+        self.assertEqual(buckets, sorted(buckets))
+        self.assertEqual(delta('gateway_request_duration_seconds_bucket{service="content",le="+Inf"}'), 3)
+        self.assertEqual(after['gateway_request_duration_seconds_count{service="content"}'],
+                         after['gateway_request_duration_seconds_bucket{service="content",le="+Inf"}'])
@@ -0,0 +1,66 @@
+import unittest
+from unittest import mock
+
+import httpx
+from jose import jwt
+
+import main
+from middleware import PrefixTable, RouteTable
+
+
+class PrefixTableTests(unittest.TestCase):
+    def test_longest_prefix_wins(self):
+        table = PrefixTable({"/api/": 1, "/api/ai/": 2, "/api/ai/generate": 3})
+        self.assertEqual(table.match("/api/ai/generate/long"), ("/api/ai/generate", 3))
+        self.assertEqual(table.match("/api/ai/chat"), ("/api/ai/", 2))
+        self.assertEqual(table.match("/api/content/"), ("/api/", 1))
+
+    def test_prefixes_are_literal(self):
+        table = PrefixTable({"/api/a.b/": 1, "/api/(x)": 2})
+        self.assertEqual(table.match("/api/a.b/c"), ("/api/a.b/", 1))
+        self.assertIsNone(table.match("/api/aXb/c"))
+        self.assertEqual(table.match("/api/(x)/y"), ("/api/(x)", 2))
+
+    def test_unknown_paths_do_not_match(self):
+        table = PrefixTable({"/api/ai/": 2})
+        self.assertIsNone(table.match("/health"))
+        self.assertIsNone(table.match("/x/api/ai/"))  # anchored at the start
+        self.assertIsNone(PrefixTable({}).match("/api/ai/"))
+
+
+class RouteTableTests(unittest.TestCase):
+    def setUp(self):
+        self.routes = RouteTable(public_paths=["/", "/health"],
+                                 public_prefixes=["/api/auth/signup", "/api/auth/login"])
+
+    def test_public_paths_and_prefixes(self):
+        for path in ("/", "/health", "/api/auth/signup", "/api/auth/login/", "/api/auth/login/refresh"):
+            with self.subTest(path=path):
+                self.assertFalse(self.routes.requires_auth(path))
+
+    def test_everything_else_under_api_needs_a_token(self):
+        for path in ("/api/auth/me", "/api/ai/generate", "/api/unknown/route", "/api/"):
+            with self.subTest(path=path):
+                self.assertTrue(self.routes.requires_auth(path))
+
+    def test_paths_outside_api_are_public(self):
+        for path in ("/metrics", "/gateway/stats", "/healthz"):
+            with self.subTest(path=path):
+                self.assertFalse(self.routes.requires_auth(path))
+
+
+class UnknownRouteTests(unittest.IsolatedAsyncioTestCase):
+    async def test_unmatched_route_gets_the_default_body_limit(self):
+        with mock.patch.object(main, "route_body_limits", PrefixTable({"/api/ai/": 100})), \
+                mock.patch.object(main, "MAX_BODY_SIZE", 1000):
+            self.assertEqual(main.body_limit("/api/ai/generate/"), 100)
+            self.assertEqual(main.body_limit("/api/unknown/"), 1000)
+
+    async def test_unknown_service_is_a_404_after_authentication(self):
+        token = jwt.encode({"user_id": 12}, main.SECRET_KEY, algorithm=main.ALGORITHM)
+        transport = httpx.ASGITransport(app=main.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://testserver") as gateway:
+            self.assertEqual((await gateway.get("/api/unknown/route")).status_code, 401)
+            response = await gateway.get("/api/unknown/route", headers={"authorization": f"Bearer {token}"})
+        self.assertEqual(response.status_code, 404)
+        self.assertIn("Service 'unknown' not found", response.json()["detail"])
@@ -0,0 +1,38 @@
+import time
+import unittest
+
+import httpx
+from jose import jwt
+
+import main
+
+
+class PdfUploadRouteTests(unittest.IsolatedAsyncioTestCase):
+    async def asyncSetUp(self):
+        self.seen = []
+
+        async def backend(scope, receive, send):
+            headers = dict(scope["headers"])
+            self.seen.append((scope["path"], float(headers[b"x-request-deadline"])))
+            await send({"type": "http.response.start", "status": 201,
+                        "headers": [(b"content-type", b"application/json")]})
+            await send({"type": "http.response.body", "body": b'{"id": 1}'})
+
+        self.backend = httpx.AsyncClient(transport=httpx.ASGITransport(app=backend))
+        main.upstreams.clients["pdf"] = self.backend
+        token = jwt.encode({"user_id": 4}, main.SECRET_KEY, algorithm=main.ALGORITHM)
+        self.gateway = httpx.AsyncClient(transport=httpx.ASGITransport(app=main.app), base_url="http://testserver",
+                                         headers={"authorization": f"Bearer {token}"})
+
+    async def asyncTearDown(self):
+        await self.gateway.aclose()
+        await self.backend.aclose()
+        del main.upstreams.clients["pdf"]
+
+    async def test_upload_gets_its_own_route_and_timeout(self):
+        started = time.time()
+        response = await self.gateway.post("/api/pdf/upload", files={"file": ("a.pdf", b"%PDF-1.4", "application/pdf")})
+        self.assertEqual(response.status_code, 201)
+        [(path, deadline)] = self.seen
+        self.assertEqual(path, "/api/pdf/upload/")
+        self.assertAlmostEqual(deadline - started, 60.0, delta=2)
@@ -0,0 +1,164 @@
+import asyncio
+import os
+import subprocess
+import sys
+import tempfile
+import unittest
+
+import ratelimit
+from benchmarks.redis_standin import RedisStandin
+from gateway.tests.clock import Clock
+from ratelimit import LeasedLimiter, RateLimit, RedisStore, SharedMemoryStore
+
+
+class RedisBackendTests(unittest.IsolatedAsyncioTestCase):
+    async def asyncSetUp(self):
+        self.redis = RedisStandin()
+        self.server = await asyncio.start_server(self.redis.handle, "127.0.0.1", 0)
+        port = self.server.sockets[0].getsockname()[1]
+        self.store = RedisStore(f"redis://127.0.0.1:{port}/0")
+        # Start just after a 60 s window boundary, so a test stays in one window
+        self.clock = Clock(1200.5).install(self, ratelimit)
+
+    async def asyncTearDown(self):
+        await self.store.close()
+        await asyncio.sleep(0.01)  # lets the stand-in see the connection close
+        self.server.close()
+        await self.server.wait_closed()
+
+    def counter(self, key: str) -> int:
+        return int(self.redis.data[f"gateway:rl:{key}:20".encode()][0])
+
+    async def test_rejected_reservations_are_not_counted(self):
+        limit = RateLimit(5, 60)
+        self.assertEqual(await self.store.reserve("ip:a", limit, 3), (3, 0.0))
+        self.assertEqual((await self.store.reserve("ip:a", limit, 3))[0], 2)
+        granted, retry_after = await self.store.reserve("ip:a", limit, 3)
+        self.assertEqual(granted, 0)
+        self.assertAlmostEqual(retry_after, 59.5)
+        self.assertEqual(self.counter("ip:a"), 5)
+
+    async def test_slow_client_is_charged_only_for_its_requests(self):
+        limiter = LeasedLimiter(self.store, batch=10, lease_ttl=1.0)
+        limit = RateLimit(100, 60)
+        allowed = 0
+        for _ in range(30):  # 30 requests a minute against a limit of 100
+            allowed += (await limiter.hit("ip:a", limit))[0]
+            self.clock.now += 2
+        self.assertEqual(allowed, 30)
+        # Every request but the last lease's unused one has been given back
+        self.assertEqual(self.counter("ip:a"), 31)
+
+    async def test_evicted_leases_return_their_requests(self):
+        limiter = LeasedLimiter(self.store, batch=10, lease_ttl=1.0)
+        limit = RateLimit(600, 60)  # leases of 10
+        await limiter.hit("ip:a", limit)
+        self.assertEqual(self.counter("ip:a"), 10)
+        self.clock.now += 2
+        self.assertEqual(limiter.evict_idle(), 1)
+        await limiter.return_unused()
+        self.assertEqual(self.counter("ip:a"), 1)
+        self.assertEqual(limiter.stats()["returned"], 9)
+
+
+class UnresponsiveRedisTests(unittest.IsolatedAsyncioTestCase):
+    """A Redis that accepts connections but never replies"""
+
+    async def asyncSetUp(self):
+        self.connections = 0
+
+        async def handle(reader, writer):
+            self.connections += 1
+            while await reader.read(65536):
+                pass
+            writer.close()
+
+        self.server = await asyncio.start_server(handle, "127.0.0.1", 0)
+        port = self.server.sockets[0].getsockname()[1]
+        self.store = RedisStore(f"redis://127.0.0.1:{port}/0", timeout=0.2, cooldown=5.0)
+
+    async def asyncTearDown(self):
+        await self.store.close()
+        self.server.close()
+        await self.server.wait_closed()
+
+    async def test_clients_fall_back_within_one_timeout(self):
+        limiter = LeasedLimiter(self.store)
+        limit = RateLimit(100, 60)
+        loop = asyncio.get_running_loop()
+        started = loop.time()
+        results = await asyncio.gather(*(limiter.hit(f"ip:{n}", limit) for n in range(20)))
+        self.assertLess(loop.time() - started, 0.5)
+        self.assertEqual(results, [(True, 0.0)] * 20)
+        self.assertTrue(self.store.stats()["down"])
+
+        # While cooling down, new clients do not touch Redis at all
+        started = loop.time()
+        self.assertEqual(await limiter.hit("ip:new", limit), (True, 0.0))
+        self.assertLess(loop.time() - started, 0.01)
+        self.assertEqual(self.connections, 1)
+
+
+class SharedMemoryBackendTests(unittest.IsolatedAsyncioTestCase):
+    async def asyncSetUp(self):
+        handle, self.path = tempfile.mkstemp()
+        os.close(handle)
+        self.store = SharedMemoryStore(self.path, slots=64)
+        self.clock = Clock(1000.0).install(self, ratelimit)
+
+    async def asyncTearDown(self):
+        await self.store.close()
+        os.unlink(self.path)
+
+    async def test_slow_client_is_charged_only_for_its_requests(self):
+        limiter = LeasedLimiter(self.store, batch=10, lease_ttl=1.0)
+        limit = RateLimit(100, 60)
+        allowed = 0
+        for _ in range(30):
+            allowed += (await limiter.hit("ip:a", limit))[0]
+            self.clock.now += 2
+        self.assertEqual(allowed, 30)
+        self.assertEqual(limiter.stats()["returned"], 29)
+
+    async def test_burst_is_limited(self):
+        limiter = LeasedLimiter(self.store, batch=10, lease_ttl=1.0)
+        limit = RateLimit(5, 60)
+        results = [(await limiter.hit("ip:a", limit))[0] for _ in range(8)]
+        self.assertEqual(results.count(True), 5)
+
+    async def test_full_table_displaces_the_oldest_lease(self):
+        limiter = LeasedLimiter(self.store, batch=10, lease_ttl=1.0, max_clients=2)
+        limit = RateLimit(600, 60)  # leases of 10
+        for key in ("ip:a", "ip:b", "ip:c"):
+            await limiter.hit(key, limit)
+        self.assertEqual(list(limiter.leases), ["ip:b", "ip:c"])
+        await limiter.return_unused()
+        self.assertEqual(limiter.stats()["returned"], 9)
+        # ip:a was charged only for its one request
+        allowed = [(await limiter.hit("ip:a", limit))[0] for _ in range(600)]
+        self.assertEqual(allowed.count(True), 599)
+
+    async def test_locked_bucket_does_not_block_the_loop(self):
+        # fcntl locks are per process, so another process holds the bucket
+        offset = (self.store.key_hash("ip:a") % self.store.buckets) * self.store.bucket_size
+        holder = subprocess.Popen(
+            [sys.executable, "-c", "import fcntl, os, sys; fd = os.open(sys.argv[1], os.O_RDWR); "
+             "fcntl.lockf(fd, fcntl.LOCK_EX, int(sys.argv[2]), int(sys.argv[3])); print(flush=True); sys.stdin.read()",
+             self.path, str(self.store.bucket_size), str(offset)],
+            stdin=subprocess.PIPE, stdout=subprocess.PIPE,
+        )
+        self.addCleanup(holder.wait)
+        self.addCleanup(holder.stdin.close)
+        holder.stdout.readline()
+
+        loop = asyncio.get_running_loop()
+        started = loop.time()
+        self.assertEqual(await self.store.reserve("ip:a", RateLimit(5, 60), 3), (1, 0.0))
+        self.assertLess(loop.time() - started, 0.1)
+        self.assertEqual(self.store.stats()["contended"], 1)
+
+    def test_lease_size_follows_the_rate(self):
+        limiter = LeasedLimiter(self.store, batch=10, lease_ttl=1.0)
+        self.assertEqual(limiter.lease_size(RateLimit(100, 60)), 2)
+        self.assertEqual(limiter.lease_size(RateLimit(5, 60)), 1)
+        self.assertEqual(limiter.lease_size(RateLimit(10000, 60)), 10)
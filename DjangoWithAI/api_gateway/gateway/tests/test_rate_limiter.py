@@ -0,0 +1,60 @@
+import unittest
+
+from ratelimit import RateLimit, RateLimiter, parse_limit, parse_route_limits
+
+
+class RateLimiterTests(unittest.TestCase):
+    def setUp(self):
+        self.limiter = RateLimiter(max_clients=3)
+        self.limit = RateLimit(5, 10)  # one request every 2 s, bursts of 5
+
+    def test_burst_then_retry_after(self):
+        results = [self.limiter.check("a", self.limit, now=100.0) for _ in range(6)]
+        self.assertEqual([allowed for allowed, _ in results], [True] * 5 + [False])
+        self.assertAlmostEqual(results[-1][1], 2.0)
+
+    def test_refills_at_the_limit_rate(self):
+        for _ in range(5):
+            self.limiter.check("a", self.limit, now=100.0)
+        self.assertFalse(self.limiter.check("a", self.limit, now=101.0)[0])
+        self.assertTrue(self.limiter.check("a", self.limit, now=102.0)[0])
+        self.assertFalse(self.limiter.check("a", self.limit, now=102.0)[0])
+
+    def test_clients_are_limited_separately(self):
+        for _ in range(5):
+            self.limiter.check("a", self.limit, now=100.0)
+        self.assertTrue(self.limiter.check("b", self.limit, now=100.0)[0])
+
+    def test_idle_clients_are_evicted(self):
+        self.limiter.check("a", self.limit, now=100.0)
+        for _ in range(5):
+            self.limiter.check("b", self.limit, now=100.0)
+        # a's bucket is full again at 102, b's only at 110
+        self.assertEqual(self.limiter.evict_idle(now=105.0), 1)
+        self.assertEqual(list(self.limiter.tats), ["b"])
+
+    def test_memory_is_bounded(self):
+        for client in range(10):
+            self.limiter.check(str(client), self.limit, now=100.0)
+        self.assertEqual(len(self.limiter.tats), 3)
+        self.assertEqual(self.limiter.stats()["evicted"], 7)
+
+    def test_full_table_drops_the_least_recently_seen(self):
+        for client in "abc":
+            self.limiter.check(client, self.limit, now=100.0)
+        for _ in range(5):
+            self.limiter.check("a", self.limit, now=101.0)  # the last is rejected, but still counts as seen
+        self.limiter.check("d", self.limit, now=102.0)
+        self.assertEqual(list(self.limiter.tats), ["c", "a", "d"])
+
+
+class ParseLimitTests(unittest.TestCase):
+    def test_parse_limit(self):
+        limit = parse_limit("100/60")
+        self.assertEqual((limit.requests, limit.window), (100, 60.0))
+        self.assertIsNone(parse_limit(""))
+
+    def test_most_specific_route_first(self):
+        routes = parse_route_limits("/api/=100/60, /api/ai/=20/60")
+        self.assertEqual([prefix for prefix, _ in routes], ["/api/ai/", "/api/"])
+        self.assertEqual(routes[0][1].requests, 20)
@@ -0,0 +1,78 @@
+import asyncio
+import unittest
+
+import httpx
+from jose import jwt
+
+import main
+
+
+async def backend(scope, receive, send):
+    """Answers every call with a small body, as an event stream for /events"""
+    content_type = b"text/event-stream" if scope["path"].endswith("/events") else b"application/json"
+    await send({"type": "http.response.start", "status": 200, "headers": [(b"content-type", content_type)]})
+    await send({"type": "http.response.body", "body": b'{"items": []}'})
+
+
+class RelayReleaseTests(unittest.IsolatedAsyncioTestCase):
+    """Slots held while a body is relayed are given back however the client leaves"""
+
+    async def asyncSetUp(self):
+        self.responses = []
+
+        async def keep(response):
+            self.responses.append(response)
+
+        self.client = httpx.AsyncClient(transport=httpx.ASGITransport(app=backend),
+                                        event_hooks={"response": [keep]})
+        main.upstreams.clients["content"] = self.client
+        self.token = jwt.encode({"user_id": 1, "email": "a@example.com"}, main.SECRET_KEY, algorithm=main.ALGORITHM)
+
+    async def asyncTearDown(self):
+        await self.client.aclose()
+        del main.upstreams.clients["content"]
+
+    async def get(self, path: str, disconnect_after: int) -> list:
+        """GET through the gateway app. The client disconnects on its `disconnect_after`th receive."""
+        scope = {
+            "type": "http", "asgi": {"version": "3.0"}, "http_version": "1.1", "method": "GET",
+            "scheme": "http", "path": path, "raw_path": path.encode(), "query_string": b"",
+            "headers": [(b"host", b"testserver"), (b"authorization", f"Bearer {self.token}".encode())],
+            "client": ("127.0.0.1", 50000), "server": ("testserver", 80),
+        }
+        calls = 0
+
+        async def receive():
+            nonlocal calls
+            calls += 1
+            if calls == 1:
+                return {"type": "http.request", "body": b"", "more_body": False}
+            if calls < disconnect_after:
+                await asyncio.Event().wait()  # connection still open
+            return {"type": "http.disconnect"}
+
+        sent = []
+
+        async def send(message):
+            await asyncio.sleep(0)  # a real server yields while writing
+            sent.append(message)
+
+        await main.app(scope, receive, send)
+        return sent
+
+    def assert_released(self):
+        self.assertEqual(main.admission_controllers["content"].in_flight, 0)
+        self.assertEqual(main.upstreams.instances["content"][0].outstanding, 0)
+        self.assertTrue(self.responses and all(response.is_closed for response in self.responses))
+
+    async def test_disconnect_before_the_body_starts(self):
+        for path in ("/api/content/items/", "/api/content/events"):
+            with self.subTest(path=path):
+                # 1: request body, 2: disconnect watcher (cancelled), 3: the response's own listener
+                await self.get(path, disconnect_after=3)
+                self.assert_released()
+
+    async def test_body_relayed_to_the_end(self):
+        sent = await self.get("/api/content/items/", disconnect_after=4)
+        self.assertEqual(b"".join(message.get("body", b"") for message in sent[1:]), b'{"items": []}')
+        self.assert_released()
@@ -0,0 +1,120 @@
+import unittest
+from unittest import mock
+
+import httpx
+from fastapi import Response
+from jose import jwt
+
+import main
+import response_cache as response_cache_module
+from gateway.tests.clock import Clock
+from response_cache import ResponseCache, etag_matches
+
+
+class ResponseCacheTests(unittest.TestCase):
+    def setUp(self):
+        self.clock = Clock().install(self, response_cache_module)
+        self.cache = ResponseCache([("/api/content/", 30.0)])
+
+    def store(self, cache_control: str = None):
+        headers = {"cache-control": cache_control} if cache_control else {}
+        return self.cache.store(("/api/content/a/", "", 1), Response(b"{}", headers=headers), 30.0)
+
+    def test_no_store_and_no_cache_are_not_stored(self):
+        for cache_control in ("no-store", "no-cache", "private, no-store"):
+            with self.subTest(cache_control=cache_control):
+                self.assertIsNone(self.store(cache_control))
+
+    def test_private_is_stored_since_entries_are_per_user(self):
+        self.assertIsNotNone(self.store("private, max-age=60"))
+
+    def test_max_age_overrides_the_route_ttl(self):
+        self.store("max-age=5")
+        self.clock.now += 4
+        self.assertIsNotNone(self.cache.get(("/api/content/a/", "", 1)))
+        self.clock.now += 1
+        self.assertIsNone(self.cache.get(("/api/content/a/", "", 1)))
+
+    def test_s_maxage_wins_over_max_age(self):
+        self.store("max-age=5, s-maxage=60")
+        self.clock.now += 30
+        self.assertIsNotNone(self.cache.get(("/api/content/a/", "", 1)))
+
+    def test_max_age_zero_is_not_stored(self):
+        self.assertIsNone(self.store("max-age=0"))
+
+    def test_etag_matches_strong_and_weak_tags(self):
+        self.assertTrue(etag_matches('"v1"', '"v1"'))
+        self.assertTrue(etag_matches('W/"v1"', '"v1"'))
+        self.assertTrue(etag_matches('"v0", W/"v1"', '"v1"'))
+        self.assertTrue(etag_matches("*", '"v1"'))
+        self.assertFalse(etag_matches('"v2"', '"v1"'))
+
+
+class CachedGetGatewayTests(unittest.IsolatedAsyncioTestCase):
+    async def asyncSetUp(self):
+        self.backend_calls = 0
+        self.cache_control = None
+
+        async def backend(scope, receive, send):
+            self.backend_calls += 1
+            user = dict(scope["headers"]).get(b"x-user-id", b"")
+            headers = [(b"content-type", b"application/json")]
+            if self.cache_control:
+                headers.append((b"cache-control", self.cache_control.encode()))
+            await send({"type": "http.response.start", "status": 200, "headers": headers})
+            await send({"type": "http.response.body", "body": b'{"user": "' + user + b'"}'})
+
+        self.backend = httpx.AsyncClient(transport=httpx.ASGITransport(app=backend))
+        main.upstreams.clients["content"] = self.backend
+        self.cache = ResponseCache([("/api/content/", 30.0)])
+        patcher = mock.patch.object(main, "response_cache", self.cache)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.gateway = httpx.AsyncClient(transport=httpx.ASGITransport(app=main.app), base_url="http://testserver")
+
+    async def asyncTearDown(self):
+        await self.gateway.aclose()
+        await self.backend.aclose()
+        del main.upstreams.clients["content"]
+
+    async def request(self, user_id: int, method: str = "GET", path: str = "/api/content/items/",
+                      **headers) -> httpx.Response:
+        token = jwt.encode({"user_id": user_id}, main.SECRET_KEY, algorithm=main.ALGORITHM)
+        headers = {name.replace("_", "-"): value for name, value in headers.items()}
+        headers["authorization"] = f"Bearer {token}"
+        return await self.gateway.request(method, path, headers=headers)
+
+    async def test_one_users_response_is_never_served_to_another(self):
+        first = await self.request(1)
+        other = await self.request(2)
+        again = await self.request(1)
+        self.assertEqual((first.json(), other.json(), again.json()), ({"user": "1"}, {"user": "2"}, {"user": "1"}))
+        self.assertEqual([r.headers["x-cache"] for r in (first, other, again)], ["MISS", "MISS", "HIT"])
+        self.assertEqual(self.backend_calls, 2)
+
+    async def test_if_none_match_is_answered_with_304(self):
+        etag = (await self.request(1)).headers["etag"]
+        for tag in (etag, f"W/{etag}", f'"other", {etag}'):
+            with self.subTest(if_none_match=tag):
+                response = await self.request(1, if_none_match=tag)
+                self.assertEqual(response.status_code, 304)
+                self.assertEqual(response.content, b"")
+        self.assertEqual((await self.request(1, if_none_match='"other"')).status_code, 200)
+        self.assertEqual(self.backend_calls, 1)
+        self.assertEqual(self.cache.not_modified, 3)
+
+    async def test_no_store_responses_are_fetched_every_time(self):
+        self.cache_control = "no-store"
+        for _ in range(2):
+            self.assertNotIn("x-cache", (await self.request(1)).headers)
+        self.assertEqual(self.backend_calls, 2)
+
+    async def test_writes_invalidate_the_users_cached_reads(self):
+        await self.request(1)
+        await self.request(2)
+        for method in ("POST", "PUT", "DELETE"):
+            with self.subTest(method=method):
+                await self.request(1, method, "/api/content/items/7/")
+                self.assertEqual((await self.request(1)).headers["x-cache"], "MISS")
+        self.assertEqual((await self.request(2)).headers["x-cache"], "HIT")
@@ -0,0 +1,171 @@
+import asyncio
+import time
+import unittest
+from unittest import mock
+
+import httpx
+from jose import jwt
+
+import main
+import retries
+from breaker import CircuitBreaker
+from gateway.tests.clock import Clock
+from retries import RetryBudget, RetryPolicy
+from upstreams import UpstreamPool
+
+
+class RetryBudgetTests(unittest.TestCase):
+    def setUp(self):
+        self.clock = Clock().install(self, retries)
+
+    def test_spends_down_to_empty(self):
+        budget = RetryBudget(ratio=0.5, min_per_second=1.0, window=10.0)
+        self.assertEqual(budget.capacity, 10.0)
+        self.assertEqual(sum(budget.withdraw() for _ in range(12)), 10)
+        self.assertEqual(budget.stats()["exhausted"], 2)
+
+    def test_refills_from_requests_and_time(self):
+        budget = RetryBudget(ratio=0.5, min_per_second=1.0, window=10.0)
+        budget.tokens = 0.0
+        budget.deposit()
+        self.assertFalse(budget.withdraw())
+        budget.deposit()
+        self.assertTrue(budget.withdraw())
+        self.clock.now += 2
+        self.assertEqual(sum(budget.withdraw() for _ in range(3)), 2)
+
+
+class RetryPolicyTests(unittest.IsolatedAsyncioTestCase):
+    async def asyncSetUp(self):
+        self.upstreams = UpstreamPool({"content": ["http://a", "http://b"]})
+        self.a, self.b = self.upstreams.instances["content"]
+        self.replies = {}  # host -> status, or an exception to raise
+        self.delays = {}
+
+        async def handler(request):
+            await asyncio.sleep(self.delays.get(request.url.host, 0))
+            reply = self.replies.get(request.url.host, 200)
+            if isinstance(reply, Exception):
+                raise reply
+            return httpx.Response(reply, request=request)
+
+        self.client = httpx.AsyncClient(transport=httpx.MockTransport(handler))
+
+    async def asyncTearDown(self):
+        await self.client.aclose()
+
+    def build(self, instance):
+        return self.client.build_request("GET", instance.url + "/api/content/items/")
+
+    async def send(self, policy, deadline=None):
+        # Start on instance a, the one with fewer requests on a tie
+        self.b.requests = 1
+        return await policy.send("content", self.client, self.build, stream=False, deadline=deadline)
+
+    async def test_retries_a_503_on_the_other_instance(self):
+        self.replies["a"] = 503
+        policy = RetryPolicy(self.upstreams, attempts=2, backoff=0)
+        response, instance = await self.send(policy)
+        self.assertEqual((response.status_code, instance), (200, self.b))
+        self.assertEqual(policy.counts["content"]["retries"], 1)
+        self.assertEqual((self.a.outstanding, self.a.failures), (0, 1))
+        self.assertEqual(self.b.outstanding, 1)  # released by the caller
+
+    async def test_exhausted_budget_returns_the_failure(self):
+        self.replies["a"] = 503
+        budget = RetryBudget(min_per_second=0.0)
+        budget.tokens = 0.0
+        policy = RetryPolicy(self.upstreams, attempts=2, budget=budget, backoff=0)
+        response, instance = await self.send(policy)
+        self.assertEqual((response.status_code, instance), (503, self.a))
+        self.assertEqual(policy.counts["content"]["budget_exhausted"], 1)
+
+    async def test_read_timeouts_are_not_retried(self):
+        self.replies["a"] = httpx.ReadTimeout("slow")
+        policy = RetryPolicy(self.upstreams, attempts=2, backoff=0)
+        with self.assertRaises(httpx.ReadTimeout):
+            await self.send(policy)
+        self.assertEqual(policy.counts["content"]["retries"], 0)
+        self.assertEqual(self.a.outstanding, 0)
+
+    async def test_hedge_wins_and_the_loser_is_released_neutrally(self):
+        self.delays["a"] = 1.0
+        policy = RetryPolicy(self.upstreams, attempts=2, hedge_services={"content"})
+        policy.latency["content"].p95 = 0.02
+        response, instance = await asyncio.wait_for(self.send(policy), timeout=0.5)
+        self.assertEqual((response.status_code, instance), (200, self.b))
+        self.assertEqual(policy.counts["content"]["hedges"], 1)
+        self.assertEqual(policy.counts["content"]["hedge_wins"], 1)
+        await asyncio.sleep(0)  # the losing attempt's cancellation lands
+        self.assertEqual((self.a.outstanding, self.a.failures), (0, 0))
+
+    async def test_no_retry_with_too_little_time_left(self):
+        self.replies["a"] = 503
+        policy = RetryPolicy(self.upstreams, attempts=2, backoff=0, min_attempt_time=0.1)
+        response, instance = await self.send(policy, deadline=time.time() + 0.05)
+        self.assertEqual((response.status_code, instance), (503, self.a))
+        self.assertEqual(policy.counts["content"]["out_of_time"], 1)
+        self.assertEqual(policy.counts["content"]["retries"], 0)
+
+    async def test_no_hedge_with_too_little_time_left(self):
+        self.delays["a"] = 0.1
+        policy = RetryPolicy(self.upstreams, attempts=2, hedge_services={"content"}, min_attempt_time=0.1)
+        policy.latency["content"].p95 = 0.02
+        response, instance = await self.send(policy, deadline=time.time() + 0.1)
+        self.assertEqual((response.status_code, instance), (200, self.a))
+        self.assertEqual(policy.counts["content"]["hedges"], 0)
+        self.assertEqual(policy.counts["content"]["out_of_time"], 1)
+
+
+class AttemptDeadlineGatewayTests(unittest.IsolatedAsyncioTestCase):
+    """A retry through the gateway gets what is left of the deadline, not the full timeout"""
+
+    async def asyncSetUp(self):
+        self.timeouts = []
+
+        async def backend(scope, receive, send):
+            if len(self.timeouts) == 1:
+                await asyncio.sleep(0.3)
+                status = 503
+            else:
+                status = 200
+            await send({"type": "http.response.start", "status": status, "headers": []})
+            await send({"type": "http.response.body", "body": b"{}"})
+
+        test = self
+
+        class RecordingTransport(httpx.ASGITransport):
+            async def handle_async_request(self, request):
+                test.timeouts.append(request.extensions["timeout"]["read"])
+                return await super().handle_async_request(request)
+
+        self.backend = httpx.AsyncClient(transport=RecordingTransport(app=backend))
+        main.upstreams.clients["content"] = self.backend
+        for patcher in (mock.patch.dict(main.breakers, {"content": CircuitBreaker("content")}),
+                        mock.patch.object(main.retry_policy, "backoff", 0)):
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        token = jwt.encode({"user_id": 7}, main.SECRET_KEY, algorithm=main.ALGORITHM)
+        self.gateway = httpx.AsyncClient(transport=httpx.ASGITransport(app=main.app), base_url="http://testserver",
+                                         headers={"authorization": f"Bearer {token}"})
+
+    async def asyncTearDown(self):
+        await self.gateway.aclose()
+        await self.backend.aclose()
+        del main.upstreams.clients["content"]
+
+    async def get(self, seconds: float) -> httpx.Response:
+        deadline = f"{time.time() + seconds:.3f}"
+        return await self.gateway.get("/api/content/items/", headers={"x-request-deadline": deadline})
+
+    async def test_retry_gets_the_time_left(self):
+        response = await self.get(1.0)
+        self.assertEqual(response.status_code, 200)
+        first, second = self.timeouts
+        self.assertGreater(first, 0.9)
+        self.assertLess(second, 0.75)
+
+    async def test_retry_is_skipped_close_to_the_deadline(self):
+        response = await self.get(0.35)
+        self.assertEqual(response.status_code, 503)
+        self.assertEqual(len(self.timeouts), 1)
@@ -0,0 +1,97 @@
+import unittest
+from unittest import mock
+
+import upstreams
+from gateway.tests.clock import Clock
+from upstreams import OUTLIER_BASE_EJECTION, OUTLIER_CONSECUTIVE_FAILURES, UpstreamPool
+
+
+class PickTests(unittest.TestCase):
+    def pool(self, policy: str, count: int = 3) -> UpstreamPool:
+        return UpstreamPool({"content": [f"http://{name}" for name in "abcd"[:count]]}, policy=policy)
+
+    def test_least_outstanding_then_fewest_requests(self):
+        pool = self.pool("least_outstanding")
+        a, b, c = pool.instances["content"]
+        a.outstanding, b.outstanding, c.outstanding = 2, 1, 1
+        b.requests = 5
+        self.assertIs(pool.pick("content"), c)
+        self.assertEqual((c.outstanding, c.requests), (2, 1))
+        self.assertIs(pool.pick("content"), b)
+
+    def test_p2c_takes_the_less_loaded_of_two(self):
+        pool = self.pool("p2c")
+        a, b, c = pool.instances["content"]
+        a.outstanding, b.outstanding, c.outstanding = 0, 3, 4
+        with mock.patch("random.sample", return_value=[b, c]) as sample:
+            self.assertIs(pool.pick("content"), b)  # a is not among the two
+        self.assertEqual(sample.call_args.args[1], 2)
+
+    def test_p2c_never_picks_the_busiest(self):
+        pool = self.pool("p2c")
+        a, b, c = pool.instances["content"]
+        c.outstanding = 100
+        picked = set()
+        for _ in range(200):
+            instance = pool.pick("content")
+            picked.add(instance.url)
+            pool.release("content", instance, True)
+        self.assertEqual(picked, {a.url, b.url})
+
+    def test_retries_avoid_instances_already_tried(self):
+        pool = self.pool("least_outstanding", count=2)
+        a, b = pool.instances["content"]
+        b.outstanding = 5
+        self.assertIs(pool.pick("content", exclude=[a]), b)
+
+    def test_unhealthy_instances_are_skipped(self):
+        pool = self.pool("least_outstanding", count=2)
+        a, b = pool.instances["content"]
+        a.healthy = False
+        b.outstanding = 5
+        self.assertIs(pool.pick("content"), b)
+
+
+class EjectionTests(unittest.TestCase):
+    def setUp(self):
+        self.clock = Clock().install(self, upstreams)
+        self.pool = UpstreamPool({"content": ["http://a", "http://b", "http://c", "http://d"]},
+                                 policy="least_outstanding")
+        self.a, self.b, self.c, self.d = self.pool.instances["content"]
+
+    def fail(self, instance, times: int = OUTLIER_CONSECUTIVE_FAILURES):
+        for _ in range(times):
+            instance.outstanding += 1
+            self.pool.release("content", instance, False)
+
+    def test_ejected_after_consecutive_failures(self):
+        self.fail(self.a, OUTLIER_CONSECUTIVE_FAILURES - 1)
+        self.a.outstanding += 1
+        self.pool.release("content", self.a, True)  # a success starts the count again
+        self.fail(self.a, OUTLIER_CONSECUTIVE_FAILURES - 1)
+        self.assertTrue(self.a.available(self.clock.now))
+
+        self.fail(self.a, 1)
+        self.assertFalse(self.a.available(self.clock.now))
+        self.assertEqual(self.a.ejections, 1)
+        self.assertNotIn(self.a, [self.pool.pick("content") for _ in range(4)])
+
+    @mock.patch.object(upstreams, "OUTLIER_MAX_EJECTED_PERCENT", 50)
+    def test_never_ejects_more_than_the_cap(self):
+        for instance in (self.a, self.b, self.c):
+            self.fail(instance)
+        # At most half of the four instances are out at once
+        self.assertEqual([i.ejections for i in (self.a, self.b, self.c)], [1, 1, 0])
+        self.assertTrue(self.c.available(self.clock.now))
+
+    def test_readmitted_after_the_ejection_window(self):
+        self.fail(self.a)
+        self.clock.now += OUTLIER_BASE_EJECTION - 1
+        self.assertFalse(self.a.available(self.clock.now))
+        self.clock.now += 1
+        self.assertTrue(self.a.available(self.clock.now))
+        self.assertIs(self.pool.pick("content"), self.a)  # fewest requests so far
+
+        # Ejected again, for twice as long
+        self.fail(self.a)
+        self.assertEqual(self.a.ejected_until, self.clock.now + 2 * OUTLIER_BASE_EJECTION)
@@ -0,0 +1,95 @@
+"""
+PDF text extraction benchmark over a synthetic corpus.
+
+Builds documents of several hundred text-heavy pages and extracts each one
+inline (workers=1) and with ExtractionEngine at every --workers count. It
+reports seconds per document, pages per second and the speedup over inline.
+The speedup is bounded by the cores on the machine, so the CPU count is
+printed with the results. Run from DjangoWithAI/pdf_service:
+
+    python benchmarks/extraction.py --documents 3 --pages 400 --workers 2,4,8
+    python benchmarks/extraction.py --pages 400 --workers 4 --no-reuse --json result.json
+"""
+import argparse
+import json
+import os
+import sys
+import time
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(HERE))
+
+import fitz  # noqa: E402
+
+from pdfs.extraction import ExtractionEngine  # noqa: E402
+
+WORDS = ("extraction lecture chapter theorem example exercise figure table summary definition "
+         "proof lemma corollary reference appendix notation student teacher handout").split()
+
+
+def make_document(pages: int, seed: int) -> bytes:
+    """A PDF whose pages are filled with lines of pseudo-random words"""
+    doc = fitz.open()
+    for number in range(pages):
+        page = doc.new_page()
+        lines = []
+        for line in range(60):
+            offset = (seed * 7919 + number * 131 + line * 17) % len(WORDS)
+            lines.append(" ".join(WORDS[(offset + i * 3) % len(WORDS)] for i in range(12)))
+        page.insert_textbox(page.rect + (36, 36, -36, -36), "\n".join(lines), fontsize=8)
+    data = doc.tobytes()
+    doc.close()
+    return data
+
+
+def run(engine: ExtractionEngine, corpus: list, repeat: int) -> float:
+    """Best seconds per document over `repeat` passes of the corpus"""
+    best = None
+    for _ in range(repeat):
+        started = time.perf_counter()
+        for data in corpus:
+            engine.extract(data)
+        elapsed = (time.perf_counter() - started) / len(corpus)
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(description="PDF text extraction benchmark")
+    parser.add_argument("--documents", type=int, default=3)
+    parser.add_argument("--pages", type=int, default=400, help="pages per document")
+    parser.add_argument("--workers", default="2,4", help="comma-separated pool sizes to compare")
+    parser.add_argument("--repeat", type=int, default=3, help="passes per configuration, best is kept")
+    parser.add_argument("--no-reuse", action="store_true", help="start a pool per document")
+    parser.add_argument("--json", help="write the result to this file")
+    args = parser.parse_args()
+
+    started = time.perf_counter()
+    corpus = [make_document(args.pages, seed) for seed in range(args.documents)]
+    size_mb = sum(len(data) for data in corpus) / len(corpus) / 1024 ** 2
+    print(f"corpus: {args.documents} x {args.pages} pages ({size_mb:.1f} MiB each), "
+          f"built in {time.perf_counter() - started:.1f}s, {os.cpu_count()} CPUs")
+
+    inline = run(ExtractionEngine(workers=1), corpus, args.repeat)
+    results = [{"workers": 1, "seconds": inline, "pages_per_second": args.pages / inline, "speedup": 1.0}]
+    for workers in (int(value) for value in args.workers.split(",")):
+        engine = ExtractionEngine(workers=workers, reuse_pool=not args.no_reuse, min_pages=1)
+        if not args.no_reuse:
+            engine.extract(corpus[0])  # start the pool outside the timing
+        seconds = run(engine, corpus, args.repeat)
+        engine.shutdown()
+        results.append({"workers": workers, "seconds": seconds,
+                        "pages_per_second": args.pages / seconds, "speedup": inline / seconds})
+
+    print(f"{'workers':>8} {'s/doc':>8} {'pages/s':>9} {'speedup':>8}")
+    for result in results:
+        print(f"{result['workers']:>8} {result['seconds']:>8.3f} {result['pages_per_second']:>9.0f} "
+              f"{result['speedup']:>7.2f}x")
+
+    if args.json:
+        with open(args.json, "w") as output:
+            json.dump({"config": vars(args), "cpus": os.cpu_count(), "results": results}, output, indent=2)
+
+
+if __name__ == "__main__":
+    main()
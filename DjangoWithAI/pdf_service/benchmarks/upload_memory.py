@@ -0,0 +1,142 @@
+"""
+Peak memory of one PDF upload, for each way of sending the PDF.
+
+Each mode runs in a fresh process, with the extraction cache off and
+extraction inline, so only the upload path differs. The request is built
+before measuring starts, so the client's copy of the body is not counted.
+For each upload it reports:
+
+- python_peak: the most memory Python objects held during the view (tracemalloc)
+- rss_growth: how far the process's peak RSS rose during the view, which
+  includes MuPDF's own allocations
+
+Run from DjangoWithAI/pdf_service:
+
+    python benchmarks/upload_memory.py --size-mb 20
+"""
+import argparse
+import base64
+import json
+import os
+import subprocess
+import sys
+import tracemalloc
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+SERVICE_DIR = os.path.dirname(HERE)
+MODES = ("multipart", "base64", "raw")
+
+
+def peak_rss_bytes() -> int:
+    with open("/proc/self/status") as status:
+        for line in status:
+            if line.startswith("VmHWM:"):
+                return int(line.split()[1]) * 1024
+    return 0
+
+
+def reset_peak_rss():
+    """Start VmHWM from the current RSS again (Linux 4.0+)"""
+    try:
+        with open("/proc/self/clear_refs", "w") as clear_refs:
+            clear_refs.write("5")
+    except OSError:
+        pass
+
+
+def make_pdf(size_mb: float, pages: int = 20) -> bytes:
+    """A PDF with a few text pages, padded to about size_mb with an incompressible attachment"""
+    import fitz
+
+    doc = fitz.open()
+    for number in range(pages):
+        doc.new_page().insert_text((72, 72), f"page {number} " + "lorem ipsum dolor sit amet " * 10)
+    doc.embfile_add("padding.bin", os.urandom(int(size_mb * 1024 * 1024)))
+    data = doc.tobytes()
+    doc.close()
+    return data
+
+
+def measure(mode: str, size_mb: float) -> dict:
+    """Runs in the child process"""
+    os.environ.setdefault("DJANGO_SETTINGS_MODULE", "pdf_service.settings")
+    os.environ["PDF_CACHE_ENABLED"] = "false"
+    os.environ["PDF_EXTRACT_WORKERS"] = "1"
+    sys.path.insert(0, SERVICE_DIR)
+    import django
+
+    django.setup()
+    from django.core.files.uploadedfile import SimpleUploadedFile
+    from django.test import RequestFactory
+
+    from pdfs.views import PDFRawUploadView, PDFUploadView
+
+    pdf = make_pdf(size_mb)
+    factory = RequestFactory()
+    if mode == "multipart":
+        request = factory.post("/api/pdf/upload/", {"file": SimpleUploadedFile("bench.pdf", pdf)})
+        view = PDFUploadView.as_view()
+    elif mode == "base64":
+        request = factory.post("/api/pdf/upload/", {"file_base64": base64.b64encode(pdf).decode()},
+                               content_type="application/json")
+        view = PDFUploadView.as_view()
+    else:
+        request = factory.post("/api/pdf/upload/raw/?filename=bench.pdf", pdf, content_type="application/pdf")
+        view = PDFRawUploadView.as_view()
+    body_bytes = int(request.META["CONTENT_LENGTH"])
+    del pdf
+
+    reset_peak_rss()
+    rss_before = peak_rss_bytes()
+    tracemalloc.start()
+    try:
+        response = view(request)
+        response.render()
+        outcome = response.status_code
+    except Exception as e:
+        # e.g. base64 bodies over DATA_UPLOAD_MAX_MEMORY_SIZE
+        outcome = type(e).__name__
+    _, python_peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return {
+        "mode": mode,
+        "status": outcome,
+        "body_bytes": body_bytes,
+        "python_peak": python_peak,
+        "rss_growth": peak_rss_bytes() - rss_before,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Peak memory per PDF upload, by upload mode")
+    parser.add_argument("--size-mb", type=float, default=20.0, help="approximate PDF size")
+    parser.add_argument("--modes", default=",".join(MODES))
+    parser.add_argument("--json", help="write the result to this file")
+    parser.add_argument("--child", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        print(json.dumps(measure(args.child, args.size_mb)))
+        return
+
+    results = []
+    for mode in args.modes.split(","):
+        output = subprocess.run(
+            [sys.executable, __file__, "--child", mode, "--size-mb", str(args.size_mb)],
+            check=True, capture_output=True, text=True
+        ).stdout
+        results.append(json.loads(output.strip().splitlines()[-1]))
+
+    mib = 1024 ** 2
+    print(f"{'mode':>10} {'status':>20} {'body MiB':>9} {'python peak MiB':>16} {'RSS growth MiB':>15}")
+    for result in results:
+        print(f"{result['mode']:>10} {result['status']:>20} {result['body_bytes'] / mib:>9.1f} "
+              f"{result['python_peak'] / mib:>16.1f} {result['rss_growth'] / mib:>15.1f}")
+
+    if args.json:
+        with open(args.json, "w") as output:
+            json.dump({"config": {"size_mb": args.size_mb}, "results": results}, output, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -10,6 +10,7 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/5.2/ref/settings/
 """
 
+import os
 from pathlib import Path
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
@@ -133,3 +134,25 @@ STATIC_URL = 'static/'
 # https://docs.djangoproject.com/en/5.2/ref/settings/#default-auto-field
 
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
+
+
+# PDF text extraction - large documents are split into page ranges that are
+# extracted in parallel by a process pool
+PDF_EXTRACT_WORKERS = int(os.getenv('PDF_EXTRACT_WORKERS', os.cpu_count() or 1))
+# Keep the worker processes between requests instead of starting a pool per upload
+PDF_EXTRACT_REUSE_POOL = os.getenv('PDF_EXTRACT_REUSE_POOL', 'true').lower() == 'true'
+# Smaller documents are extracted on the request thread, where the pool costs more than it saves
+PDF_EXTRACT_PARALLEL_MIN_PAGES = int(os.getenv('PDF_EXTRACT_PARALLEL_MIN_PAGES', '32'))
+
+# Extracted text cache, keyed by the SHA-256 of the PDF - repeat uploads skip extraction
+PDF_CACHE_ENABLED = os.getenv('PDF_CACHE_ENABLED', 'true').lower() == 'true'
+PDF_CACHE_DIR = os.getenv('PDF_CACHE_DIR', str(BASE_DIR / 'extraction_cache'))
+# Compressed size of the disk tier before least recently used entries are deleted
+PDF_CACHE_MAX_BYTES = int(os.getenv('PDF_CACHE_MAX_BYTES', str(512 * 1024 * 1024)))
+# Text kept in memory for the most recently used documents
+PDF_CACHE_MEMORY_BYTES = int(os.getenv('PDF_CACHE_MEMORY_BYTES', str(32 * 1024 * 1024)))
+
+# Raw application/pdf uploads (upload/raw/) - bodies up to PDF_RAW_MEMORY_BYTES
+# are read into memory once, larger ones are spooled to a temporary file
+PDF_RAW_MAX_BYTES = int(os.getenv('PDF_RAW_MAX_BYTES', str(50 * 1024 * 1024)))
+PDF_RAW_MEMORY_BYTES = int(os.getenv('PDF_RAW_MEMORY_BYTES', str(4 * 1024 * 1024)))
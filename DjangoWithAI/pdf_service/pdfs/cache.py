@@ -0,0 +1,198 @@
+"""
+Content-addressed cache of extracted PDF text.
+
+Entries are keyed by the SHA-256 of the PDF bytes plus the extractor version,
+so the same handout uploaded again never reaches fitz, whatever its filename.
+A new PyMuPDF release or extraction change gets a fresh key space.
+
+There are two tiers:
+
+- memory: the page lists of recently used documents, up to `memory_bytes` of text
+- disk: one zlib-compressed JSON file per document, with the least recently
+  used files deleted once the directory passes `max_bytes`
+
+Disk entries are written to a temporary file and renamed into place, so a
+reader never sees a half-written entry. The LRU index of each process is
+rebuilt from file modification times at startup.
+"""
+import hashlib
+import json
+import os
+import tempfile
+import threading
+import zlib
+from collections import OrderedDict
+
+
+class ExtractionCache:
+    def __init__(self, directory, version: str, max_bytes: int, memory_bytes: int):
+        self.directory = str(directory)
+        self.version = version
+        self.max_bytes = max_bytes
+        self.memory_bytes = memory_bytes
+        self._lock = threading.Lock()
+        self._memory = OrderedDict()  # key -> (page texts, text bytes)
+        self._memory_size = 0
+        self._disk = OrderedDict()    # key -> file size, least recently used first
+        self._disk_size = 0
+
+        self.memory_hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.pdf_bytes_saved = 0    # PDF bytes that did not need extracting
+        self.pages_saved = 0
+        self.text_bytes_stored = 0  # uncompressed size of what was written to disk
+        self.disk_bytes_stored = 0  # compressed size of the same
+        self.evictions = 0
+
+        os.makedirs(self.directory, exist_ok=True)
+        self._load_index()
+
+    def key(self, source) -> str:
+        """Cache key for PDF bytes, or for the PDF file at a path"""
+        if isinstance(source, str):
+            digest = hashlib.sha256()
+            with open(source, "rb") as pdf:
+                for block in iter(lambda: pdf.read(1024 * 1024), b""):
+                    digest.update(block)
+        else:
+            digest = hashlib.sha256(source)
+        return f"{digest.hexdigest()}-{self.version}"
+
+    def get(self, key: str, pdf_size: int = 0):
+        """The cached page texts for `key`, or None"""
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is not None:
+                self._memory.move_to_end(key)
+                self.memory_hits += 1
+                self._saved(pdf_size, entry[0])
+                return entry[0]
+            on_disk = key in self._disk
+
+        if on_disk:
+            pages = self._read(key)
+            if pages is not None:
+                with self._lock:
+                    self.disk_hits += 1
+                    self._saved(pdf_size, pages)
+                    self._remember(key, pages)
+                return pages
+
+        with self._lock:
+            self.misses += 1
+        return None
+
+    def put(self, key: str, pages: list):
+        raw = json.dumps(pages).encode()
+        data = zlib.compress(raw, 6)
+        path = self._path(key)
+        handle, temp_path = tempfile.mkstemp(dir=self.directory, suffix=".tmp")
+        try:
+            with os.fdopen(handle, "wb") as temp:
+                temp.write(data)
+            os.replace(temp_path, path)
+        except OSError:
+            # The cache is an optimization - a full or read-only disk must not fail the upload
+            try:
+                os.unlink(temp_path)
+            except OSError:
+                pass
+            return
+
+        with self._lock:
+            self.text_bytes_stored += len(raw)
+            self.disk_bytes_stored += len(data)
+            self._disk_size += len(data) - self._disk.pop(key, 0)
+            self._disk[key] = len(data)
+            self._evict()
+            self._remember(key, pages)
+
+    def _read(self, key: str):
+        path = self._path(key)
+        try:
+            with open(path, "rb") as cached:
+                pages = json.loads(zlib.decompress(cached.read()))
+            os.utime(path)  # keeps the LRU order across restarts
+        except (OSError, ValueError, zlib.error):
+            # Evicted by another process, or damaged - treat as a miss
+            with self._lock:
+                self._disk_size -= self._disk.pop(key, 0)
+            return None
+        with self._lock:
+            if key in self._disk:
+                self._disk.move_to_end(key)
+        return pages
+
+    def _remember(self, key: str, pages: list):
+        size = sum(len(text) for text in pages)
+        if size > self.memory_bytes:
+            return
+        if key in self._memory:
+            self._memory_size -= self._memory.pop(key)[1]
+        self._memory[key] = (pages, size)
+        self._memory_size += size
+        while self._memory_size > self.memory_bytes:
+            _, (_, evicted) = self._memory.popitem(last=False)
+            self._memory_size -= evicted
+
+    def _evict(self):
+        while self._disk_size > self.max_bytes and len(self._disk) > 1:
+            key, size = self._disk.popitem(last=False)
+            self._disk_size -= size
+            self.evictions += 1
+            try:
+                os.unlink(self._path(key))
+            except OSError:
+                pass
+
+    def _saved(self, pdf_size: int, pages: list):
+        self.pdf_bytes_saved += pdf_size
+        self.pages_saved += len(pages)
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.directory, key + ".json.z")
+
+    def _load_index(self):
+        entries = []
+        for name in os.listdir(self.directory):
+            path = os.path.join(self.directory, name)
+            if name.endswith(".tmp"):
+                # Left behind by a crash mid-write
+                try:
+                    os.unlink(path)
+                except OSError:
+                    pass
+            elif name.endswith(".json.z"):
+                try:
+                    stat = os.stat(path)
+                except OSError:
+                    continue
+                entries.append((stat.st_mtime, name[:-len(".json.z")], stat.st_size))
+        for _, key, size in sorted(entries):
+            self._disk[key] = size
+            self._disk_size += size
+        with self._lock:
+            self._evict()
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.memory_hits + self.disk_hits + self.misses
+            return {
+                "version": self.version,
+                "memory_hits": self.memory_hits,
+                "disk_hits": self.disk_hits,
+                "misses": self.misses,
+                "hit_rate": round((self.memory_hits + self.disk_hits) / lookups, 3) if lookups else None,
+                "pdf_bytes_saved": self.pdf_bytes_saved,
+                "pages_saved": self.pages_saved,
+                "compression_ratio": (
+                    round(self.disk_bytes_stored / self.text_bytes_stored, 3) if self.text_bytes_stored else None
+                ),
+                "memory_entries": len(self._memory),
+                "memory_bytes": self._memory_size,
+                "disk_entries": len(self._disk),
+                "disk_bytes": self._disk_size,
+                "max_bytes": self.max_bytes,
+                "evictions": self.evictions,
+            }
@@ -0,0 +1,22 @@
+"""
+Deadline handling for requests coming through the API gateway, which sets
+X-Request-Deadline to the Unix time at which the caller stops waiting.
+"""
+from rest_framework import status
+from rest_framework.response import Response
+
+
+def request_deadline(request):
+    """Unix time after which the result is no longer wanted, or None"""
+    value = request.META.get("HTTP_X_REQUEST_DEADLINE")
+    try:
+        return float(value) if value else None
+    except ValueError:
+        return None
+
+
+def deadline_exceeded():
+    return Response(
+        {"error": "Request deadline exceeded"},
+        status=status.HTTP_504_GATEWAY_TIMEOUT
+    )
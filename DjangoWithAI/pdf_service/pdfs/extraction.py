@@ -0,0 +1,286 @@
+"""
+Page-parallel PDF text extraction.
+
+A single document's pages are extracted one after another on one core. Large
+documents are instead split into page ranges that run in a process pool.
+Every worker opens the same PDF bytes itself, and the ranges are merged back
+in page order. Small documents are extracted inline, because handing them to
+another process would cost more than it saves.
+
+Both can be limited to a selection of pages such as "10-25,40", and only
+those pages are loaded. document_outline() describes a document (page
+count, table of contents, rough characters per page) without extracting
+any text, so callers can choose the pages they need.
+
+iter_pages() yields pages one by one for streaming responses. Its ranges
+start small and grow, so the first page arrives quickly whatever the
+document's length, and only a few ranges are in flight at once.
+
+This module does not import Django, so pool workers can import it cheaply.
+"""
+import multiprocessing
+import os
+import re
+import threading
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+import fitz  # PyMuPDF
+
+# Part of the extraction cache key - bump the suffix when extracted text changes
+EXTRACTOR_VERSION = f"{fitz.VersionBind}-1"
+
+
+class DeadlineExceeded(Exception):
+    """The caller's deadline passed before every page was extracted"""
+
+
+class InvalidPageSelection(ValueError):
+    """A pages= value that is malformed or outside the document"""
+
+
+def select_pages(spec: str, page_count: int) -> list:
+    """
+    0-based page numbers for a 1-based selection like "10-25,40" or "300-",
+    sorted and without duplicates. None selects every page.
+    """
+    if spec is None:
+        return list(range(page_count))
+    selected = set()
+    for part in filter(None, (part.strip() for part in spec.split(","))):
+        first, dash, last = part.partition("-")
+        try:
+            first = int(first)
+            last = (int(last) if last.strip() else page_count) if dash else first
+        except ValueError:
+            raise InvalidPageSelection(f"Invalid page selection {part!r}")
+        if not 1 <= first <= last <= page_count:
+            raise InvalidPageSelection(f"Pages {part!r} are outside the document's {page_count} pages")
+        selected.update(range(first - 1, last))
+    if not selected:
+        raise InvalidPageSelection("No pages selected")
+    return sorted(selected)
+
+
+def open_document(source):
+    """Open a PDF from its bytes or from a file path"""
+    if isinstance(source, str):
+        return fitz.open(source, filetype="pdf")
+    return fitz.open(stream=source, filetype="pdf")
+
+
+def source_size(source) -> int:
+    return os.path.getsize(source) if isinstance(source, str) else len(source)
+
+
+def extract_range(source, numbers: list, deadline: float = None) -> list:
+    """Text of the given 0-based pages of a PDF, one string per page"""
+    doc = open_document(source)
+    try:
+        return extract_pages(doc, numbers, deadline)
+    finally:
+        doc.close()
+
+
+def extract_pages(doc, numbers, deadline: float = None) -> list:
+    texts = []
+    for number in numbers:
+        if deadline is not None and time.time() > deadline:
+            raise DeadlineExceeded()
+        texts.append(doc[number].get_text())
+    return texts
+
+
+def page_ranges(page_count: int, parts: int) -> list:
+    """Split 0..page_count into `parts` contiguous, near-equal (start, stop) ranges"""
+    parts = max(1, min(parts, page_count))
+    size, extra = divmod(page_count, parts)
+    ranges = []
+    start = 0
+    for part in range(parts):
+        stop = start + size + (1 if part < extra else 0)
+        ranges.append((start, stop))
+        start = stop
+    return ranges
+
+
+def growing_ranges(page_count: int, first: int, largest: int) -> list:
+    """(start, stop) ranges covering every page, doubling from `first` pages up to `largest`"""
+    ranges = []
+    start, size = 0, max(1, first)
+    while start < page_count:
+        stop = min(page_count, start + size)
+        ranges.append((start, stop))
+        start, size = stop, min(size * 2, max(1, largest))
+    return ranges
+
+
+# Literal (...) and hex <...> strings in a content stream - what text operators draw
+CONTENT_STRING = re.compile(rb"\((?:\\.|[^\\)])*\)|<[0-9A-Fa-f\s]+>")
+
+
+def estimate_chars(page) -> int:
+    """
+    Rough character count of a page from the strings in its content stream,
+    without laying out any text. Text drawn inside form XObjects is not counted.
+    """
+    estimate = 0
+    for match in CONTENT_STRING.finditer(page.read_contents()):
+        string = match.group()
+        if string.startswith(b"("):
+            estimate += len(string) - 2
+        else:
+            # Two hex digits per byte
+            estimate += len(b"".join(string[1:-1].split())) // 2
+    return estimate
+
+
+def document_outline(source) -> dict:
+    """Page count, metadata, table of contents and per-page character estimates"""
+    doc = open_document(source)
+    try:
+        return {
+            "pages": len(doc),
+            "metadata": {key: value for key, value in (doc.metadata or {}).items() if value},
+            "toc": [{"level": level, "title": title, "page": page} for level, title, page in doc.get_toc()],
+            "page_chars": [estimate_chars(page) for page in doc],
+        }
+    finally:
+        doc.close()
+
+
+class ExtractionEngine:
+    """
+    Extracts the text of every page of a PDF, in page order.
+
+    `workers` is the pool size (1 extracts everything inline). With
+    `reuse_pool` the pool lives for the whole process; otherwise each
+    document starts and stops its own.
+    """
+
+    def __init__(self, workers: int, reuse_pool: bool = True, min_pages: int = 32,
+                 start_method: str = "forkserver"):
+        self.workers = max(1, workers)
+        self.reuse_pool = reuse_pool
+        self.min_pages = min_pages
+        # Workers are not forked from the threaded server process itself
+        self.context = multiprocessing.get_context(start_method)
+        if start_method == "forkserver":
+            self.context.set_forkserver_preload([__name__])
+        self._pool = None
+        self._lock = threading.Lock()
+
+        self.documents = 0
+        self.parallel_documents = 0
+        self.pages = 0
+
+    def extract(self, source, deadline: float = None, pages: str = None) -> list:
+        """
+        (1-based page number, text) for each page of the PDF in `source`
+        (bytes or a file path), or for the pages selected by `pages`
+        """
+        doc = open_document(source)
+        try:
+            numbers = select_pages(pages, len(doc))
+            parallel = self._parallel(len(numbers))
+            if not parallel:
+                texts = extract_pages(doc, numbers, deadline)
+        finally:
+            doc.close()
+
+        if parallel:
+            texts = []
+            ranges = page_ranges(len(numbers), self.workers)
+            for range_texts in self._run_ranges(source, numbers, ranges, deadline):
+                texts.extend(range_texts)
+        self._count(len(numbers), parallel)
+        return [(number + 1, text) for number, text in zip(numbers, texts)]
+
+    def iter_pages(self, source, deadline: float = None, pages: str = None, first_range: int = 4):
+        """
+        Yield (1-based page number, text) for each page, or each selected
+        page, in order and as soon as it has been extracted
+        """
+        doc = open_document(source)
+        try:
+            numbers = select_pages(pages, len(doc))
+            parallel = self._parallel(len(numbers))
+            if not parallel:
+                for number in numbers:
+                    yield number + 1, extract_pages(doc, [number], deadline)[0]
+        finally:
+            doc.close()
+
+        if parallel:
+            ranges = growing_ranges(len(numbers), first_range, -(-len(numbers) // self.workers))
+            position = 0
+            for range_texts in self._run_ranges(source, numbers, ranges, deadline):
+                for text in range_texts:
+                    yield numbers[position] + 1, text
+                    position += 1
+        self._count(len(numbers), parallel)
+
+    def _parallel(self, page_count: int) -> bool:
+        return self.workers > 1 and page_count >= self.min_pages
+
+    def _count(self, page_count: int, parallel: bool):
+        self.documents += 1
+        self.parallel_documents += parallel
+        self.pages += page_count
+
+    def _run_ranges(self, source, numbers: list, ranges: list, deadline: float):
+        """
+        Yield the page texts of each (start, stop) slice of `numbers` in order,
+        with at most 2 x workers slices in flight
+        """
+        if isinstance(source, memoryview):
+            source = source.tobytes()  # workers need something picklable
+        pool = self._get_pool()
+        ranges = deque(ranges)
+        in_flight = deque()
+        try:
+            while ranges or in_flight:
+                while ranges and len(in_flight) < 2 * self.workers:
+                    start, stop = ranges.popleft()
+                    in_flight.append(pool.submit(extract_range, source, numbers[start:stop], deadline))
+                yield in_flight.popleft().result()
+        except BrokenProcessPool:
+            # A worker died (e.g. killed for memory) - start a fresh pool next time
+            self._discard_pool(pool)
+            raise
+        finally:
+            for future in in_flight:
+                future.cancel()
+            if not self.reuse_pool:
+                pool.shutdown(wait=False, cancel_futures=True)
+
+    def _get_pool(self) -> ProcessPoolExecutor:
+        if not self.reuse_pool:
+            return ProcessPoolExecutor(self.workers, mp_context=self.context)
+        with self._lock:
+            if self._pool is None:
+                self._pool = ProcessPoolExecutor(self.workers, mp_context=self.context)
+            return self._pool
+
+    def _discard_pool(self, pool: ProcessPoolExecutor):
+        with self._lock:
+            if self._pool is pool:
+                self._pool = None
+        pool.shutdown(wait=False, cancel_futures=True)
+
+    def shutdown(self):
+        with self._lock:
+            pool, self._pool = self._pool, None
+        if pool is not None:
+            pool.shutdown()
+
+    def stats(self) -> dict:
+        return {
+            "workers": self.workers,
+            "reuse_pool": self.reuse_pool,
+            "documents": self.documents,
+            "parallel_documents": self.parallel_documents,
+            "pages": self.pages,
+        }
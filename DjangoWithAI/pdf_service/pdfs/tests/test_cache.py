@@ -0,0 +1,99 @@
+import os
+import tempfile
+from unittest import mock
+
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.test import SimpleTestCase
+
+from pdfs import views
+from pdfs.cache import ExtractionCache
+from pdfs.tests.test_extraction import numbered_pdf
+
+
+class ExtractionCacheTests(SimpleTestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.directory = directory.name
+
+    def cache(self, version="1.0-1", max_bytes=1 << 20, memory_bytes=1 << 20):
+        return ExtractionCache(self.directory, version=version, max_bytes=max_bytes, memory_bytes=memory_bytes)
+
+    def test_key_is_the_content_hash_and_version(self):
+        cache = self.cache()
+        path = os.path.join(self.directory, "upload.pdf")
+        with open(path, "wb") as pdf:
+            pdf.write(b"%PDF-1.4 handout")
+        self.assertEqual(cache.key(path), cache.key(b"%PDF-1.4 handout"))
+        self.assertNotEqual(cache.key(b"%PDF-1.4 handout"), cache.key(b"%PDF-1.4 other"))
+        self.assertNotEqual(cache.key(b"%PDF-1.4 handout"), self.cache(version="1.0-2").key(b"%PDF-1.4 handout"))
+
+    def test_memory_then_disk_hits(self):
+        cache = self.cache()
+        key = cache.key(b"pdf")
+        self.assertIsNone(cache.get(key))
+        cache.put(key, ["one", "two"])
+        self.assertEqual(cache.get(key, pdf_size=3), ["one", "two"])
+
+        # A restarted process finds the entry on disk
+        restarted = self.cache()
+        self.assertEqual(restarted.get(key, pdf_size=3), ["one", "two"])
+        self.assertEqual(restarted.get(key, pdf_size=3), ["one", "two"])
+        stats = restarted.stats()
+        self.assertEqual((stats["disk_hits"], stats["memory_hits"]), (1, 1))
+        self.assertEqual((stats["pdf_bytes_saved"], stats["pages_saved"]), (6, 4))
+
+    def test_least_recently_used_entries_are_evicted(self):
+        cache = self.cache(memory_bytes=0)
+        keys = [cache.key(bytes([n])) for n in range(3)]
+        cache.put(keys[0], ["a" * 500])
+        entry_size = cache.stats()["disk_bytes"]
+        cache.max_bytes = 2 * entry_size
+        cache.put(keys[1], ["b" * 500])
+        cache.get(keys[0])
+        cache.put(keys[2], ["c" * 500])
+        self.assertIsNone(cache.get(keys[1]))
+        self.assertEqual(cache.get(keys[0]), ["a" * 500])
+        self.assertEqual(cache.stats()["evictions"], 1)
+
+    def test_memory_tier_is_bounded(self):
+        cache = self.cache(memory_bytes=1000)
+        for n in range(3):
+            cache.put(cache.key(bytes([n])), ["x" * 400])
+        self.assertEqual(cache.stats()["memory_entries"], 2)
+        self.assertLessEqual(cache.stats()["memory_bytes"], 1000)
+
+    def test_damaged_entry_is_a_miss(self):
+        cache = self.cache(memory_bytes=0)
+        key = cache.key(b"pdf")
+        cache.put(key, ["text"])
+        with open(os.path.join(self.directory, key + ".json.z"), "wb") as entry:
+            entry.write(b"not zlib")
+        self.assertIsNone(cache.get(key))
+        self.assertEqual(cache.stats()["disk_entries"], 0)
+
+
+class CachedUploadTests(SimpleTestCase):
+    pdf = numbered_pdf(2)
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.cache = ExtractionCache(directory.name, version="test", max_bytes=1 << 20, memory_bytes=1 << 20)
+        for patcher in (mock.patch.object(views, "cache", self.cache),
+                        mock.patch.object(views.extractor, "extract", wraps=views.extractor.extract)):
+            self.extract = patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def upload(self, name, query=""):
+        upload = SimpleUploadedFile(name, self.pdf, content_type="application/pdf")
+        return self.client.post("/api/pdf/upload/" + query, {"file": upload}).json()
+
+    def test_repeat_upload_skips_extraction(self):
+        first = self.upload("week1.pdf")
+        again = self.upload("week1-copy.pdf")
+        chapter = self.upload("week1.pdf", "?pages=2")
+        self.assertEqual(self.extract.call_count, 1)
+        self.assertEqual(again["extracted_text"], first["extracted_text"])
+        self.assertEqual(chapter["page_numbers"], [2])
+        self.assertEqual(self.cache.stats()["memory_hits"], 2)
@@ -0,0 +1,53 @@
+import fitz
+from django.test import SimpleTestCase
+
+from pdfs.extraction import DeadlineExceeded, ExtractionEngine, growing_ranges, page_ranges
+
+
+def numbered_pdf(page_count: int) -> bytes:
+    doc = fitz.open()
+    for number in range(1, page_count + 1):
+        doc.new_page().insert_text((72, 72), f"Page text {number}")
+    try:
+        return doc.tobytes()
+    finally:
+        doc.close()
+
+
+class PageRangeTests(SimpleTestCase):
+    def test_page_ranges_are_contiguous_and_near_equal(self):
+        self.assertEqual(page_ranges(10, 3), [(0, 4), (4, 7), (7, 10)])
+        self.assertEqual(page_ranges(2, 8), [(0, 1), (1, 2)])
+
+    def test_growing_ranges_double_up_to_the_largest(self):
+        self.assertEqual(growing_ranges(30, 2, 8), [(0, 2), (2, 6), (6, 14), (14, 22), (22, 30)])
+
+
+class ExtractionEngineTests(SimpleTestCase):
+    pdf = numbered_pdf(12)
+
+    def texts(self, pages):
+        return [(number, text.strip()) for number, text in pages]
+
+    def test_inline_extraction(self):
+        engine = ExtractionEngine(workers=1)
+        pages = engine.extract(self.pdf)
+        self.assertEqual(self.texts(pages), [(n, f"Page text {n}") for n in range(1, 13)])
+        self.assertEqual(engine.stats()["parallel_documents"], 0)
+
+    def test_parallel_extraction_keeps_page_order(self):
+        engine = ExtractionEngine(workers=3, min_pages=4)
+        self.addCleanup(engine.shutdown)
+        expected = [(n, f"Page text {n}") for n in range(1, 13)]
+        self.assertEqual(self.texts(engine.extract(self.pdf)), expected)
+        self.assertEqual(self.texts(engine.iter_pages(self.pdf, first_range=1)), expected)
+        self.assertEqual(engine.stats()["parallel_documents"], 2)
+
+    def test_pool_is_started_per_document_without_reuse(self):
+        engine = ExtractionEngine(workers=2, reuse_pool=False, min_pages=4)
+        self.assertEqual(len(engine.extract(self.pdf)), 12)
+        self.assertIsNone(engine._pool)
+
+    def test_passed_deadline_stops_extraction(self):
+        with self.assertRaises(DeadlineExceeded):
+            ExtractionEngine(workers=1).extract(self.pdf, deadline=0.0)
@@ -0,0 +1,66 @@
+import base64
+from unittest import mock
+
+import fitz
+from django.test import SimpleTestCase
+
+from pdfs.extraction import InvalidPageSelection, document_outline, select_pages
+from pdfs.tests.test_extraction import numbered_pdf
+
+
+class SelectPagesTests(SimpleTestCase):
+    def test_ranges_and_single_pages(self):
+        self.assertEqual(select_pages("2-4,7", 10), [1, 2, 3, 6])
+        self.assertEqual(select_pages(" 9- , 3,3-4 ", 10), [2, 3, 8, 9])
+        self.assertEqual(select_pages(None, 3), [0, 1, 2])
+
+    def test_invalid_selections(self):
+        for spec in ("", ",", "a", "3-x", "0", "4-2", "11", "5-11"):
+            with self.subTest(spec=spec), self.assertRaises(InvalidPageSelection):
+                select_pages(spec, 10)
+
+
+class DocumentOutlineTests(SimpleTestCase):
+    def setUp(self):
+        doc = fitz.open()
+        doc.new_page().insert_text((72, 72), "Introduction")
+        doc.new_page()
+        doc.set_toc([[1, "Intro", 1], [2, "Blank", 2]])
+        doc.set_metadata({"title": "Handout"})
+        self.pdf = doc.tobytes()
+        doc.close()
+
+    def test_outline_without_extracting_text(self):
+        with mock.patch.object(fitz.Page, "get_text", side_effect=AssertionError("text extracted")):
+            outline = document_outline(self.pdf)
+        self.assertEqual(outline["pages"], 2)
+        self.assertEqual(outline["metadata"]["title"], "Handout")
+        self.assertEqual(outline["toc"], [{"level": 1, "title": "Intro", "page": 1},
+                                          {"level": 2, "title": "Blank", "page": 2}])
+        self.assertEqual(outline["page_chars"], [len("Introduction"), 0])
+
+    def test_metadata_endpoint(self):
+        raw = self.client.post("/api/pdf/metadata/?filename=h.pdf", self.pdf, content_type="application/pdf")
+        encoded = self.client.post("/api/pdf/metadata/", {"file_base64": base64.b64encode(self.pdf).decode()},
+                                   content_type="application/json")
+        for response in (raw, encoded):
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(response.json()["pages"], 2)
+            self.assertNotIn("extracted_text", response.json())
+
+
+@mock.patch("pdfs.views.cache", None)
+class PageSelectionEndpointTests(SimpleTestCase):
+    pdf = numbered_pdf(6)
+
+    def post(self, pages):
+        return self.client.post(f"/api/pdf/upload/raw/?pages={pages}", self.pdf, content_type="application/pdf")
+
+    def test_only_selected_pages_are_extracted(self):
+        result = self.post("2-3,6").json()
+        self.assertEqual((result["pages"], result["page_numbers"]), (3, [2, 3, 6]))
+        self.assertIn("Page text 6", result["extracted_text"])
+        self.assertNotIn("Page text 1", result["extracted_text"])
+
+    def test_selection_outside_the_document(self):
+        self.assertEqual(self.post("5-9").status_code, 400)
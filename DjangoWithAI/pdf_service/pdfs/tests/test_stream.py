@@ -0,0 +1,53 @@
+import json
+import time
+from unittest import mock
+
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.test import SimpleTestCase
+
+from pdfs.extraction import DeadlineExceeded
+from pdfs.tests.test_extraction import numbered_pdf
+from pdfs.views import PDFStreamView
+
+
+@mock.patch("pdfs.views.cache", None)
+class StreamEndpointTests(SimpleTestCase):
+    pdf = numbered_pdf(3)
+
+    def post(self, accept, path="/api/pdf/upload/stream/", **headers):
+        upload = SimpleUploadedFile("notes.pdf", self.pdf, content_type="application/pdf")
+        return self.client.post(path, {"file": upload}, HTTP_ACCEPT=accept, **headers)
+
+    def test_ndjson_line_per_page_then_summary(self):
+        response = self.post("application/x-ndjson")
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response["Content-Type"], "application/x-ndjson")
+        lines = [json.loads(line) for line in b"".join(response.streaming_content).splitlines()]
+        self.assertEqual([(line["page"], line["text"].strip()) for line in lines[:3]],
+                         [(1, "Page text 1"), (2, "Page text 2"), (3, "Page text 3")])
+        self.assertEqual(lines[3], {"success": True, "filename": "notes.pdf", "pages": 3})
+
+    def test_sse_event_per_page_then_done(self):
+        response = self.post("text/event-stream")
+        self.assertEqual(response["Content-Type"], "text/event-stream")
+        self.assertEqual(response["X-Accel-Buffering"], "no")
+        events = b"".join(response.streaming_content).decode().strip().split("\n\n")
+        self.assertEqual([event.split("\n")[0] for event in events], ["event: page"] * 3 + ["event: done"])
+        self.assertEqual(json.loads(events[0].split("data: ")[1])["page"], 1)
+
+    def test_errors_before_the_first_page_get_a_status(self):
+        response = self.post("application/x-ndjson", path="/api/pdf/upload/stream/?pages=7")
+        self.assertEqual(response.status_code, 400)
+        self.assertIn("outside", json.loads(response.content)["error"])
+
+        response = self.post("text/event-stream", HTTP_X_REQUEST_DEADLINE=str(time.time() - 1))
+        self.assertEqual(response.status_code, 504)
+        self.assertTrue(response.content.startswith(b"event: error\n"))
+
+    def test_failure_after_the_first_page_ends_the_stream(self):
+        def pages():
+            yield 1, "first"
+            raise DeadlineExceeded()
+
+        lines = [json.loads(line) for line in PDFStreamView().stream_pages(pages(), "notes.pdf", sse=False)]
+        self.assertEqual(lines, [{"page": 1, "text": "first"}, {"error": "Request deadline exceeded", "pages": 1}])
@@ -0,0 +1,75 @@
+import io
+import os
+from unittest import mock
+
+from django.test import SimpleTestCase
+
+from pdfs import views
+from pdfs.tests.test_extraction import numbered_pdf
+from pdfs.uploads import CHUNK_SIZE, IncompleteUpload, UploadReceiver, UploadTooLarge
+
+
+class Unreadable(io.RawIOBase):
+    def read(self, size=-1):
+        raise AssertionError("body read after the upload was refused")
+
+
+class UploadReceiverTests(SimpleTestCase):
+    body = b"%PDF" + b"x" * (3 * CHUNK_SIZE)
+
+    def setUp(self):
+        self.receiver = UploadReceiver(max_bytes=4 * CHUNK_SIZE, memory_bytes=CHUNK_SIZE)
+
+    def test_small_body_is_read_into_memory_once(self):
+        with self.receiver.receive(io.BytesIO(b"%PDF-1.4"), 8) as source:
+            self.assertIsInstance(source, memoryview)
+            self.assertEqual(bytes(source), b"%PDF-1.4")
+        self.assertEqual(self.receiver.stats()["largest_in_memory"], 8)
+
+    def test_large_or_unsized_body_is_spooled(self):
+        for length in (len(self.body), None):
+            with self.subTest(length=length):
+                with self.receiver.receive(io.BytesIO(self.body), length) as source:
+                    with open(source, "rb") as spooled:
+                        self.assertEqual(spooled.read(), self.body)
+                self.assertFalse(os.path.exists(source))
+        stats = self.receiver.stats()
+        self.assertEqual((stats["spooled_to_disk"], stats["largest_in_memory"]), (2, CHUNK_SIZE))
+
+    def test_oversized_body_is_refused(self):
+        with self.assertRaises(UploadTooLarge):
+            with self.receiver.receive(Unreadable(), 5 * CHUNK_SIZE):
+                pass
+        with self.assertRaises(UploadTooLarge):
+            with self.receiver.receive(io.BytesIO(b"x" * (5 * CHUNK_SIZE))):
+                pass
+        self.assertEqual(self.receiver.stats()["rejected"], 2)
+
+    def test_short_body_is_incomplete(self):
+        for length in (100, len(self.body) + 1):
+            with self.subTest(length=length), self.assertRaises(IncompleteUpload):
+                with self.receiver.receive(io.BytesIO(self.body[:length - 1]), length):
+                    pass
+
+
+@mock.patch("pdfs.views.cache", None)
+class RawUploadEndpointTests(SimpleTestCase):
+    pdf = numbered_pdf(2)
+
+    def post(self, body, content_type="application/pdf"):
+        return self.client.post("/api/pdf/upload/raw/?filename=notes.pdf", body, content_type=content_type)
+
+    def test_raw_pdf_body(self):
+        response = self.post(self.pdf)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual((response.json()["filename"], response.json()["pages"]), ("notes.pdf", 2))
+
+    def test_spooled_pdf_body(self):
+        receiver = UploadReceiver(max_bytes=len(self.pdf), memory_bytes=16)
+        with mock.patch.object(views, "raw_uploads", receiver):
+            self.assertEqual(self.post(self.pdf).json()["pages"], 2)
+            self.assertEqual(self.post(self.pdf + b"\n").status_code, 413)
+        self.assertEqual(receiver.stats()["spooled_to_disk"], 1)
+
+    def test_other_content_types_are_refused(self):
+        self.assertEqual(self.post(self.pdf, content_type="application/octet-stream").status_code, 415)
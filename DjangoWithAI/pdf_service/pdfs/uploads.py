@@ -0,0 +1,113 @@
+"""
+Raw PDF request bodies, received with a bounded amount of memory.
+
+A body whose Content-Length fits in `memory_bytes` is read straight into one
+preallocated buffer, so the PDF exists in memory exactly once. Anything
+larger, or of unknown length, is copied to a temporary file in fixed-size
+chunks and handed to fitz by path. MuPDF then reads the file on demand, and
+pool workers open the same file instead of each getting a copy of the bytes.
+Either way a body over `max_bytes` is refused as soon as it passes the limit.
+"""
+import os
+import tempfile
+import threading
+from contextlib import contextmanager
+
+CHUNK_SIZE = 64 * 1024
+
+
+class UploadTooLarge(Exception):
+    def __init__(self, limit: int):
+        self.limit = limit
+        super().__init__(f"PDF larger than {limit} bytes")
+
+
+class IncompleteUpload(Exception):
+    """The client sent less than its Content-Length"""
+
+
+class UploadReceiver:
+    def __init__(self, max_bytes: int, memory_bytes: int, directory: str = None):
+        self.max_bytes = max_bytes
+        self.memory_bytes = memory_bytes
+        self.directory = directory
+        self._lock = threading.Lock()
+
+        self.uploads = 0
+        self.spooled = 0             # uploads that went to a temporary file
+        self.largest_in_memory = 0   # bytes, the most one upload held in memory
+        self.rejected = 0
+
+    @contextmanager
+    def receive(self, stream, length: int = None):
+        """
+        Yield the body of `stream` as a memoryview or as a temporary file path.
+        The file is deleted when the block exits.
+        """
+        if length is not None and length > self.max_bytes:
+            self._count(rejected=True)
+            raise UploadTooLarge(self.max_bytes)
+
+        if length is not None and length <= self.memory_bytes:
+            body = self._read_into_memory(stream, length)
+            self._count(in_memory=length)
+            # fitz copies a bytearray but reads a memoryview in place
+            yield memoryview(body)
+            return
+
+        handle, path = tempfile.mkstemp(suffix=".pdf", dir=self.directory)
+        try:
+            with os.fdopen(handle, "wb") as spool:
+                self._copy(stream, spool, length)
+            self._count(in_memory=CHUNK_SIZE, spooled=True)
+            yield path
+        finally:
+            try:
+                os.unlink(path)
+            except OSError:
+                pass
+
+    def _read_into_memory(self, stream, length: int) -> bytearray:
+        body = bytearray(length)
+        view = memoryview(body)
+        received = 0
+        while received < length:
+            chunk = stream.read(min(CHUNK_SIZE, length - received))
+            if not chunk:
+                raise IncompleteUpload()
+            view[received:received + len(chunk)] = chunk
+            received += len(chunk)
+        return body
+
+    def _copy(self, stream, spool, length: int = None):
+        received = 0
+        while True:
+            chunk = stream.read(CHUNK_SIZE)
+            if not chunk:
+                break
+            received += len(chunk)
+            if received > self.max_bytes:
+                self._count(rejected=True)
+                raise UploadTooLarge(self.max_bytes)
+            spool.write(chunk)
+        if length is not None and received < length:
+            raise IncompleteUpload()
+
+    def _count(self, in_memory: int = 0, spooled: bool = False, rejected: bool = False):
+        with self._lock:
+            if rejected:
+                self.rejected += 1
+                return
+            self.uploads += 1
+            self.spooled += spooled
+            self.largest_in_memory = max(self.largest_in_memory, in_memory)
+
+    def stats(self) -> dict:
+        return {
+            "uploads": self.uploads,
+            "spooled_to_disk": self.spooled,
+            "largest_in_memory": self.largest_in_memory,
+            "rejected": self.rejected,
+            "max_bytes": self.max_bytes,
+            "memory_bytes": self.memory_bytes,
+        }
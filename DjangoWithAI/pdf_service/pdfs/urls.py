@@ -1,6 +1,10 @@
 from django.urls import path
-from .views import PDFUploadView
+from .views import PDFMetadataView, PDFRawUploadView, PDFStatsView, PDFStreamView, PDFUploadView
 
 urlpatterns = [
     path('upload/', PDFUploadView.as_view(), name='pdf-upload'),
+    path('upload/stream/', PDFStreamView.as_view(), name='pdf-upload-stream'),
+    path('upload/raw/', PDFRawUploadView.as_view(), name='pdf-upload-raw'),
+    path('metadata/', PDFMetadataView.as_view(), name='pdf-metadata'),
+    path('stats/', PDFStatsView.as_view(), name='pdf-stats'),
 ]
@@ -1,14 +1,125 @@
-import fitz  # PyMuPDF
 import base64
+import itertools
+import json
+import time
+from django.conf import settings
+from django.http import StreamingHttpResponse
 from rest_framework.views import APIView
 from rest_framework.response import Response
 from rest_framework.parsers import MultiPartParser, FormParser, JSONParser
+from rest_framework.renderers import JSONRenderer
 from rest_framework import status
 
+from .deadlines import deadline_exceeded, request_deadline
+from .cache import ExtractionCache
+from .extraction import (EXTRACTOR_VERSION, DeadlineExceeded, ExtractionEngine, InvalidPageSelection,
+                         document_outline, select_pages, source_size)
+from .renderers import EventStreamRenderer, NDJSONRenderer
+from .uploads import IncompleteUpload, UploadReceiver, UploadTooLarge
+
+# Shared by every request, so the worker pool is started once
+extractor = ExtractionEngine(
+    workers=settings.PDF_EXTRACT_WORKERS,
+    reuse_pool=settings.PDF_EXTRACT_REUSE_POOL,
+    min_pages=settings.PDF_EXTRACT_PARALLEL_MIN_PAGES,
+)
+
+cache = ExtractionCache(
+    settings.PDF_CACHE_DIR,
+    version=EXTRACTOR_VERSION,
+    max_bytes=settings.PDF_CACHE_MAX_BYTES,
+    memory_bytes=settings.PDF_CACHE_MEMORY_BYTES,
+) if settings.PDF_CACHE_ENABLED else None
+
+raw_uploads = UploadReceiver(
+    max_bytes=settings.PDF_RAW_MAX_BYTES,
+    memory_bytes=settings.PDF_RAW_MEMORY_BYTES,
+)
+
+
+def extract_text(pdf_data, deadline, pages=None):
+    """
+    (page number, text) pairs of a PDF (bytes or a file path), for every page
+    or the `pages` selection ("10-25,40"). Served from the cache when the same
+    bytes were extracted before. Only whole documents are stored in the cache.
+    """
+    if cache is None:
+        return extractor.extract(pdf_data, deadline, pages)
+    key = cache.key(pdf_data)
+    page_texts = cache.get(key, source_size(pdf_data))
+    if page_texts is not None:
+        return [(number + 1, page_texts[number]) for number in select_pages(pages, len(page_texts))]
+    extracted = extractor.extract(pdf_data, deadline, pages)
+    if pages is None:
+        cache.put(key, [page_text for _, page_text in extracted])
+    return extracted
+
+
+def iter_text(pdf_data, deadline, pages=None):
+    """extract_text one page at a time"""
+    if cache is None:
+        yield from extractor.iter_pages(pdf_data, deadline, pages)
+        return
+    key = cache.key(pdf_data)
+    page_texts = cache.get(key, source_size(pdf_data))
+    if page_texts is not None:
+        for number in select_pages(pages, len(page_texts)):
+            yield number + 1, page_texts[number]
+        return
+    page_texts = []
+    for page_num, page_text in extractor.iter_pages(pdf_data, deadline, pages):
+        page_texts.append(page_text)
+        yield page_num, page_text
+    if pages is None:
+        cache.put(key, page_texts)
+
+
 class PDFUploadView(APIView):
     parser_classes = [MultiPartParser, FormParser, JSONParser]
 
     def post(self, request):
+        pdf_data, filename, error = self.read_upload(request)
+        if error is not None:
+            return error
+        
+        # Stop extracting once the caller has stopped waiting
+        deadline = request_deadline(request)
+        if deadline is not None and time.time() > deadline:
+            return deadline_exceeded()
+        return self.respond(pdf_data, filename, deadline)
+
+    def respond(self, pdf_data, filename, deadline):
+        # ?pages=10-25,40 extracts only those pages
+        pages = self.request.query_params.get("pages")
+        try:
+            # Extract text from PDF, in parallel for large documents
+            page_texts = extract_text(pdf_data, deadline, pages)
+            page_count = len(page_texts)
+            text = "".join(f"\n--- Page {page_num} ---\n{page_text}" for page_num, page_text in page_texts)
+            
+            result = {
+                "success": True,
+                "filename": filename,
+                "pages": page_count,
+                "extracted_text": text.strip(),
+                "preview": text.strip()[:500] + "..." if len(text) > 500 else text.strip()
+            }
+            if pages is not None:
+                result["page_numbers"] = [page_num for page_num, _ in page_texts]
+            return Response(result, status=status.HTTP_200_OK)
+            
+        except InvalidPageSelection as e:
+            return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        except DeadlineExceeded:
+            return deadline_exceeded()
+        except Exception as e:
+            return Response(
+                {"error": f"Failed to process PDF: {str(e)}"}, 
+                status=status.HTTP_500_INTERNAL_SERVER_ERROR
+            )
+
+    def read_upload(self, request):
+        """(pdf_data, filename, error response) from a form-data or base64 upload"""
         pdf_data = None
         filename = "document.pdf"
         
@@ -19,12 +130,16 @@ class PDFUploadView(APIView):
             
             # Validate file type
             if not pdf_file.name.endswith('.pdf'):
-                return Response(
+                return None, filename, Response(
                     {"error": "File must be a PDF"}, 
                     status=status.HTTP_400_BAD_REQUEST
                 )
             
-            pdf_data = pdf_file.read()
+            # Large uploads are already on disk - let fitz read them from there
+            if hasattr(pdf_file, 'temporary_file_path'):
+                pdf_data = pdf_file.temporary_file_path()
+            else:
+                pdf_data = pdf_file.read()
         
         # Handle base64 encoded PDF (JSON)
         elif 'file_base64' in request.data:
@@ -32,39 +147,148 @@ class PDFUploadView(APIView):
                 pdf_data = base64.b64decode(request.data['file_base64'])
                 filename = request.data.get('filename', filename)
             except Exception as e:
-                return Response(
+                return None, filename, Response(
                     {"error": f"Invalid base64 data: {str(e)}"}, 
                     status=status.HTTP_400_BAD_REQUEST
                 )
         
         else:
-            return Response(
+            return None, filename, Response(
                 {"error": "No file provided. Use 'file' for form-data or 'file_base64' for JSON"}, 
                 status=status.HTTP_400_BAD_REQUEST
             )
         
+        return pdf_data, filename, None
+
+
+class PDFStreamView(PDFUploadView):
+    """
+    Same uploads as PDFUploadView, but each page is sent as soon as it has
+    been extracted: one NDJSON line per page, or one SSE event per page when
+    the client accepts text/event-stream, and then a summary with the page count.
+    """
+    renderer_classes = [NDJSONRenderer, EventStreamRenderer, JSONRenderer]
+
+    def post(self, request):
+        pdf_data, filename, error = self.read_upload(request)
+        if error is not None:
+            return error
+        
+        deadline = request_deadline(request)
+        if deadline is not None and time.time() > deadline:
+            return deadline_exceeded()
+        
+        # The first page is extracted before the response starts, so an
+        # unreadable PDF or a bad ?pages= still gets a proper error status
+        pages = iter_text(pdf_data, deadline, request.query_params.get("pages"))
         try:
-            # Read and extract text from PDF
-            doc = fitz.open(stream=pdf_data, filetype="pdf")
-            text = ""
-            page_count = len(doc)  # Get page count before closing
-            
-            for page_num, page in enumerate(doc, 1):
-                page_text = page.get_text()
-                text += f"\n--- Page {page_num} ---\n{page_text}"
-            
-            doc.close()
-            
-            return Response({
-                "success": True,
-                "filename": filename,
-                "pages": page_count,
-                "extracted_text": text.strip(),
-                "preview": text.strip()[:500] + "..." if len(text) > 500 else text.strip()
-            }, status=status.HTTP_200_OK)
-            
+            first_page = next(pages, None)
+        except InvalidPageSelection as e:
+            return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        except DeadlineExceeded:
+            return deadline_exceeded()
         except Exception as e:
             return Response(
                 {"error": f"Failed to process PDF: {str(e)}"}, 
                 status=status.HTTP_500_INTERNAL_SERVER_ERROR
-            )
\ No newline at end of file
+            )
+        if first_page is not None:
+            pages = itertools.chain([first_page], pages)
+        
+        sse = isinstance(request.accepted_renderer, EventStreamRenderer)
+        response = StreamingHttpResponse(
+            self.stream_pages(pages, filename, sse),
+            content_type="text/event-stream" if sse else "application/x-ndjson"
+        )
+        response["Cache-Control"] = "no-cache"
+        response["X-Accel-Buffering"] = "no"
+        return response
+
+    def stream_pages(self, pages, filename, sse):
+        def message(event, payload):
+            data = json.dumps(payload)
+            return f"event: {event}\ndata: {data}\n\n" if sse else data + "\n"
+        
+        page_count = 0
+        try:
+            for page_num, page_text in pages:
+                page_count += 1
+                yield message("page", {"page": page_num, "text": page_text})
+        except DeadlineExceeded:
+            # The status line has gone out already, so errors end the stream instead
+            yield message("error", {"error": "Request deadline exceeded", "pages": page_count})
+            return
+        except Exception as e:
+            yield message("error", {"error": f"Failed to process PDF: {str(e)}", "pages": page_count})
+            return
+        yield message("done", {"success": True, "filename": filename, "pages": page_count})
+
+
+class PDFRawUploadView(PDFUploadView):
+    """
+    The PDF itself as the request body (Content-Type: application/pdf), with
+    the name in ?filename=. There is no base64 or multipart encoding to
+    inflate or decode, and the body is received with bounded memory (see
+    pdfs/uploads.py).
+    """
+    parser_classes = []
+
+    def post(self, request):
+        if request.content_type.split(";")[0].strip() != "application/pdf":
+            return Response(
+                {"error": "Content-Type must be application/pdf"},
+                status=status.HTTP_415_UNSUPPORTED_MEDIA_TYPE
+            )
+        if request.stream is None:
+            return Response({"error": "No file provided"}, status=status.HTTP_400_BAD_REQUEST)
+        filename = request.query_params.get("filename", "document.pdf")
+        
+        deadline = request_deadline(request)
+        if deadline is not None and time.time() > deadline:
+            return deadline_exceeded()
+        
+        length = request.META.get("CONTENT_LENGTH")
+        try:
+            with raw_uploads.receive(request.stream, int(length) if length else None) as pdf_source:
+                return self.respond(pdf_source, filename, deadline)
+        except UploadTooLarge as e:
+            return Response(
+                {"error": f"PDF too large. Maximum size is {e.limit} bytes."},
+                status=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE
+            )
+        except IncompleteUpload:
+            return Response({"error": "Incomplete upload"}, status=status.HTTP_400_BAD_REQUEST)
+
+
+class PDFMetadataView(PDFRawUploadView):
+    """
+    Page count, document metadata, table of contents and an estimate of the
+    characters on each page, read without extracting any text. Accepts the
+    same uploads as upload/ and upload/raw/.
+    """
+    parser_classes = PDFUploadView.parser_classes
+
+    def post(self, request):
+        if request.content_type.split(";")[0].strip() == "application/pdf":
+            return super().post(request)
+        return PDFUploadView.post(self, request)
+
+    def respond(self, pdf_data, filename, deadline):
+        try:
+            return Response({"success": True, "filename": filename, **document_outline(pdf_data)})
+        except Exception as e:
+            return Response(
+                {"error": f"Failed to process PDF: {str(e)}"},
+                status=status.HTTP_500_INTERNAL_SERVER_ERROR
+            )
+
+
+class PDFStatsView(APIView):
+    """Extraction pool, text cache and raw upload counters"""
+
+    def get(self, request):
+        return Response({
+            "extraction": extractor.stats(),
+            "cache": cache.stats() if cache is not None else None,
+            "raw_uploads": raw_uploads.stats(),
+        })